@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+"""Compare schedules on synthetic job mixes.
+
+The jobs aren't run, instead time is simulated. Each job has a random runtime,
+number of cores and amount of memory. For every schedule, the makespan and the
+average utilization of cores and memory are reported.
+
+Usage:
+    python benchmarks/bench_schedules.py [--n-jobs 2000] [--seed 42]
+"""
+
+import argparse
+import datetime
+import functools
+import heapq
+import random
+
+import scibs
+
+
+def synthetic_mix(mix, n_jobs, rng):
+    jobs = []
+    for _ in range(n_jobs):
+        if mix == "uniform":
+            n_cores = rng.randint(1, 8)
+            memory = rng.uniform(1, 16) * 10**9
+
+        elif mix == "bimodal":
+            if rng.random() < 0.8:
+                n_cores, memory = 1, rng.uniform(4, 24) * 10**9
+            else:
+                n_cores, memory = rng.randint(8, 24), rng.uniform(1, 8) * 10**9
+
+        else:
+            raise ValueError(f"Unknown mix: {mix}")
+
+        runtime = rng.uniform(1.0, 100.0)
+        r = scibs.JustCoresResource(
+            n_cores=n_cores,
+            total_memory=memory,
+            wall_clock=datetime.timedelta(seconds=runtime),
+        )
+        jobs.append(scibs.Job(["true"], r))
+
+    return jobs
+
+
+def simulate(make_schedule, jobs, cores, memory):
+    local_resources = scibs.LocalResources(cores=cores, memory=memory)
+    schedule = make_schedule(jobs, local_resources)
+
+    now = 0.0
+    running = []
+    core_seconds = 0.0
+    memory_seconds = 0.0
+
+    while not schedule.empty() or running:
+        while (next_job := schedule.next_job()) is not None:
+            job_id, job, _ = next_job
+            runtime = job.resources.wall_clock.total_seconds()
+            heapq.heappush(running, (now + runtime, job_id, job))
+
+        end, job_id, job = heapq.heappop(running)
+        for _, _, j in running + [(end, job_id, job)]:
+            demand = scibs.resource_demand(j.resources)
+            core_seconds += demand["cores"] * (end - now)
+            memory_seconds += demand["memory"] * (end - now)
+
+        now = end
+        schedule.complete(job_id)
+
+    return now, core_seconds / (cores * now), memory_seconds / (memory * now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--n-jobs", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    schedules = {
+        "greedy": scibs.GreedySchedule,
+        "best-fit": scibs.BestFitSchedule,
+        "dominant-resource": functools.partial(
+            scibs.BestFitSchedule, score=scibs.dominant_resource_score
+        ),
+    }
+
+    print(
+        f"{'mix':10s} {'schedule':20s} {'makespan':>10s} {'cores':>7s} {'memory':>7s}"
+    )
+    for mix in ["uniform", "bimodal"]:
+        jobs = synthetic_mix(mix, args.n_jobs, random.Random(args.seed))
+
+        for name, make_schedule in schedules.items():
+            makespan, cores, memory = simulate(make_schedule, jobs, 32, 128 * 10**9)
+            print(f"{mix:10s} {name:20s} {makespan:10.0f} {cores:7.1%} {memory:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+"""Measure submission throughput and polling cost against the emulator.
+
+Jobs are submitted to an emulated SLURM, see `scibs.emulator`, first one at a
+time and then concurrently with `submit_async`. Finally, the states of all
+jobs are polled once.
+
+Usage:
+    python benchmarks/bench_submission.py [--n-jobs 200] [--cores 8]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import scibs
+from scibs import emulator
+
+
+def make_jobs(n_jobs, cwd):
+    r = scibs.JustCoresResource()
+    return [scibs.Job(["true"], r, cwd=cwd) for _ in range(n_jobs)]
+
+
+def submit_sequentially(slurm, jobs):
+    return [slurm.submit(job) for job in jobs]
+
+
+def submit_concurrently(slurm, jobs):
+    async def _submit_all():
+        return await asyncio.gather(*[slurm.submit_async(job) for job in jobs])
+
+    return asyncio.run(_submit_all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--n-jobs", type=int, default=200)
+    parser.add_argument("--cores", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with emulator.Emulator(os.path.join(tmp_dir, "state"), cores=args.cores) as emu:
+            os.environ["PATH"] = f"{emu.bin_dir}:{os.environ['PATH']}"
+
+            slurm = scibs.ScriptSLURM(
+                submission_policy=scibs.SLURMSubmissionPolicy(),
+                script_dir=os.path.join(tmp_dir, "scripts"),
+            )
+
+            handles = []
+            for name, submit in [
+                ("sequential", submit_sequentially),
+                ("async", submit_concurrently),
+            ]:
+                start = time.perf_counter()
+                handles += submit(slurm, make_jobs(args.n_jobs, tmp_dir))
+                elapsed = time.perf_counter() - start
+                print(f"{name:12s} {args.n_jobs / elapsed:8.1f} jobs/s")
+
+            job_ids = [handle.job_id for handle in handles]
+            start = time.perf_counter()
+            slurm.query_states(job_ids)
+            elapsed = time.perf_counter() - start
+            print(f"{'poll':12s} {elapsed:8.3f} s for {len(job_ids)} jobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -51,9 +51,6 @@ setup(
         "Operating System :: Linux",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: Implementation :: CPython",
         # uncomment if you test on these interpreters:
@@ -71,7 +68,7 @@ setup(
     keywords=[
         # eg: 'keyword1', 'keyword2', 'keyword3',
     ],
-    python_requires="!=2.*, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, !=3.4.*, != 3.5.*",
+    python_requires=">=3.9",
     install_requires=[
         # 'click',
         # eg: 'aspectlib==1.1.1', 'six>=1.7',
@@ -82,8 +79,9 @@ setup(
         #   ':python_version=="2.6"': ['argparse'],
     },
     entry_points={
-        # 'console_scripts': [
-        #     'nameless = nameless.cli:main',
-        # ]
+        "console_scripts": [
+            "scibs = scibs.cli:main",
+            "scibs-emulator = scibs.emulator:main",
+        ]
     },
 )
@@ -1,29 +1,49 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
-from .job import Job
+from .job import Job, PythonJob
+from .job_handle import JobHandle, LocalJobHandle
+from .environment import Environment
 
 from .dependencies import Singleton, AfterOK, AfterAny
 from .dependency_policies import SLURMDependencyPolicy
 
 from .resources import Resource
 from .resources import MPIResource, OMPResource, CUResource, CU
-from .resources import JustCoresResource, JustGPUsResource
+from .resources import JustCoresResource, JustGPUsResource, SharedGPUResource
 
 from .utilities import hhmm, hhmmss
+from .journal import Journal
 
 from .submission_policies import SubmissionPolicy, StdOutSubmissionPolicy
 from .submission_policies import SubprocessSubmissionPolicy, DebugSubmissionPolicy
 from .submission_policies import MultiSubmissionPolicy, SLURMSubmissionPolicy
+from .submission_policies import LSFSubmissionPolicy, LSFPackSubmissionPolicy
+from .submission_policies import PartialSubmissionError
 from .wrap_policies import WrapPolicy, DefaultWrapPolicy, EulerWrapPolicy
-from .wrap_policies import SBatchWrapPolicy
+from .wrap_policies import SBatchWrapPolicy, StagingWrapPolicy, ModuleWrapPolicy
+from .wrap_policies import HybridWrapPolicy
 from .resource_policies import DefaultResourcePolicy, GPUResourcePolicy
+from .launch_policies import LaunchPolicy, ShellLaunchPolicy, SpawnLaunchPolicy
+from .launch_policies import LimitedLaunchPolicy
+from .admission_policies import AdmissionPolicy, PressureAdmissionPolicy
+from .failure_policies import FailurePolicy, FailFastPolicy, watch_failures
 
-from .schedules import Schedule, GreedySchedule
-from .schedules import LocalResources, LocalGPUResources
+from .gpu_topology import GPUTopology
+from .site_profiles import SiteProfile, NodeType, NodeLayout
+from .prefetch import Prefetcher
+from .schedules import Schedule, GreedySchedule, LookaheadSchedule
+from .schedules import FairShareSchedule
+from .schedules import BestFitSchedule, best_fit_score, dominant_resource_score
+from .schedules import LocalResources, LocalGPUResources, CombinedLocalResources
+from .schedules import resource_demand
 
 from .scibs import SciBS
 from .lsf import LSF, EulerLSF
 from .local_bs import LocalBS
 from .sequential_local_bs import SequentialLocalBS
+from .distributed_bs import DistributedBS, WorkerAgent, RemoteResources
 from .slurm import SLURM, BB5, SBatchBB5
+from .batch_scripts import BatchScriptMixin, ScriptSLURM, ScriptLSF
+
+from .accounting import RightSizing
@@ -0,0 +1,421 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+"""Right-size resource requests from the accounting data of finished jobs.
+
+The accounting data is read from the output of
+
+    sacct --parsable2 -o JobID,JobName,State,Elapsed,TotalCPU,AllocCPUS,MaxRSS
+
+see `sacct_cmd`, `bacct -l` or `bhist -l`. Then `summarize` computes percentiles of the
+memory, run time and CPU efficiency of the jobs with the same name, and
+`RightSizing` rewrites the resources of future jobs:
+
+    records = scibs.accounting.parse_sacct(text)
+    right_size = scibs.accounting.RightSizing(
+        scibs.accounting.summarize(records)
+    )
+
+    for job in jobs:
+        bs.submit(right_size(job))
+"""
+
+import copy
+import datetime
+import math
+import re
+
+import scibs
+
+SACCT_FIELDS = [
+    "JobID",
+    "JobName",
+    "State",
+    "Elapsed",
+    "TotalCPU",
+    "AllocCPUS",
+    "MaxRSS",
+]
+
+_BACCT_STATES = {"done": "COMPLETED", "exit": "FAILED"}
+
+_MEMORY_UNITS = {"": 1024, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+class JobRecord:
+    """Resources used by one finished job.
+
+    Times are in seconds, memory in bytes. `max_rss` is the peak resident
+    memory of the largest task, reported by SLURM. LSF only reports the peak
+    of the whole job, `total_rss`.
+    """
+
+    def __init__(
+        self,
+        job_id,
+        name,
+        state,
+        elapsed,
+        cpu_time=None,
+        n_cores=1,
+        max_rss=None,
+        total_rss=None,
+    ):
+        self.job_id = job_id
+        self.name = name
+        self.state = state
+        self.elapsed = elapsed
+        self.cpu_time = cpu_time
+        self.n_cores = n_cores
+        self.max_rss = max_rss
+        self.total_rss = total_rss
+
+    def __repr__(self):
+        return f"JobRecord({self.job_id}, {self.name!r}, {self.state})"
+
+    @property
+    def cpu_efficiency(self):
+        if self.cpu_time is None or not self.elapsed:
+            return None
+
+        return self.cpu_time / (self.elapsed * self.n_cores)
+
+
+def sacct_cmd(job_ids=None, start_time=None):
+    cmd = ["sacct", "--parsable2", "-o", ",".join(SACCT_FIELDS)]
+
+    if job_ids is not None:
+        cmd += ["-j", ",".join(map(str, job_ids))]
+
+    if start_time is not None:
+        cmd += ["-S", start_time]
+
+    return cmd
+
+
+def parse_sacct(text):
+    """Parse `sacct --parsable2` output, including its header.
+
+    The usage of the job steps, e.g. `1234.batch`, is merged into the record of
+    the job.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines:
+        return []
+
+    header = lines[0].split("|")
+    records = dict()
+
+    for line in lines[1:]:
+        row = dict(zip(header, line.split("|")))
+        job_id, _, step = row["JobID"].partition(".")
+
+        max_rss = parse_memory(row.get("MaxRSS", ""))
+
+        if not step:
+            state = row["State"].split(" ")[0]
+            records[job_id] = JobRecord(
+                job_id,
+                row["JobName"],
+                scibs.slurm._SLURM_STATES.get(state, "UNKNOWN"),
+                parse_duration(row["Elapsed"]),
+                cpu_time=parse_duration(row.get("TotalCPU", "")),
+                n_cores=int(row.get("AllocCPUS") or 1),
+                max_rss=max_rss,
+            )
+
+        elif job_id in records and max_rss is not None:
+            record = records[job_id]
+            record.max_rss = max(record.max_rss or 0, max_rss)
+
+    return list(records.values())
+
+
+def parse_bacct(text):
+    """Parse the output of `bacct -l`."""
+
+    records = []
+    for block in re.split(r"^-{20,}\s*$", text, flags=re.MULTILINE):
+        record = _parse_bacct_block(_unwrap(block))
+        if record is not None:
+            records.append(record)
+
+    return records
+
+
+def _unwrap(block):
+    # LSF wraps long lines, the continuation is indented by 21 spaces.
+    lines = []
+    for line in block.splitlines():
+        if lines and line.startswith(" " * 21) and lines[-1].strip():
+            lines[-1] += line.strip()
+        else:
+            lines.append(line)
+
+    return lines
+
+
+def _parse_bacct_block(lines):
+    text = "\n".join(lines)
+
+    m = re.search(r"Job <(\d+(?:\[\d+\])?)>", text)
+    if m is None:
+        return None
+
+    job_id = m.group(1)
+
+    m = re.search(r"Job Name <([^>]*)>", text)
+    name = m.group(1) if m else None
+
+    n_cores = _bacct_n_slots(text)
+
+    for k, line in enumerate(lines[:-1]):
+        if line.split()[:1] == ["CPU_T"]:
+            values = lines[k + 1].split()
+            break
+    else:
+        return None
+
+    cpu_time, wait, turnaround, status = values[:4]
+    memory = " ".join(values[5:7]) if len(values) >= 7 else values[5]
+
+    return JobRecord(
+        job_id,
+        name,
+        _BACCT_STATES.get(status.lower(), "UNKNOWN"),
+        float(turnaround) - float(wait),
+        cpu_time=float(cpu_time),
+        n_cores=n_cores,
+        total_rss=parse_memory(memory),
+    )
+
+
+def parse_bhist(text):
+    """Parse the output of `bhist -l`.
+
+    Jobs which haven't finished are skipped. The run time is the time spent
+    in the state `RUN`.
+    """
+
+    records = []
+    for block in re.split(r"^-{20,}\s*$", text, flags=re.MULTILINE):
+        record = _parse_bhist_block(_unwrap(block))
+        if record is not None:
+            records.append(record)
+
+    return records
+
+
+def _parse_bhist_block(lines):
+    text = "\n".join(lines)
+
+    m = re.search(r"Job <(\d+(?:\[\d+\])?)>", text)
+    if m is None:
+        return None
+
+    job_id = m.group(1)
+
+    m = re.search(r"Job Name <([^>]*)>", text)
+    name = m.group(1) if m else None
+
+    if re.search(r": Done successfully\.", text):
+        state = "COMPLETED"
+    elif re.search(r": Exited\b", text):
+        state = "FAILED"
+    else:
+        return None
+
+    m = re.search(r"The CPU time used is ([0-9.]+) seconds", text)
+    cpu_time = float(m.group(1)) if m else None
+
+    m = re.search(r"MAX MEM: ([^;]*)", text)
+    total_rss = parse_memory(m.group(1)) if m else None
+
+    return JobRecord(
+        job_id,
+        name,
+        state,
+        _bhist_time_in_state(lines, "RUN"),
+        cpu_time=cpu_time,
+        n_cores=_bacct_n_slots(text),
+        total_rss=total_rss,
+    )
+
+
+def _bhist_time_in_state(lines, state):
+    #   PEND     PSUSP    RUN      USUSP    SSUSP    UNKWN    TOTAL
+    #   30       0        1800     0        0        0        1830
+    for k, line in enumerate(lines[:-1]):
+        header = line.split()
+        if header[:1] == ["PEND"] and state in header:
+            values = lines[k + 1].split()
+            return float(values[header.index(state)])
+
+    return None
+
+
+def _bacct_n_slots(text):
+    # Depending on the version of LSF, either of:
+    #   Dispatched 4 Task(s) on Host(s) <4*host>, Allocated 4 Slot(s) on ...
+    #   Dispatched to 4 Hosts/Processors <4*host>
+    #   Dispatched to <host> <host>
+    for pattern in [
+        r"Allocated (\d+)\s*Slot\(s\)",
+        r"Dispatched (\d+)\s*Task\(s\)",
+        r"Dispatched to (\d+)\s*Hosts/Processors",
+    ]:
+        m = re.search(pattern, text)
+        if m is not None:
+            return int(m.group(1))
+
+    m = re.search(r"Dispatched to ((?:<[^>]*>\s*)+)", text)
+    if m is None:
+        return 1
+
+    hosts = re.findall(r"<(?:(\d+)\*)?[^>]*>", m.group(1))
+    return sum(int(n or 1) for n in hosts)
+
+
+def parse_duration(text):
+    """Seconds in `[DD-][HH:]MM:SS[.sss]`; `None` if empty."""
+
+    text = text.strip()
+    if not text or text in ("UNLIMITED", "INVALID"):
+        return None
+
+    days = 0
+    if "-" in text:
+        days, text = text.split("-")
+
+    parts = [float(part) for part in text.split(":")]
+    seconds = 0.0
+    for part in parts:
+        seconds = 60 * seconds + part
+
+    return 86400 * int(days) + seconds
+
+
+def parse_memory(text):
+    """Bytes in, e.g., `1234K`, `1.5G` or `1.2 Gbytes`; `None` if empty.
+
+    Numbers without a unit are in KiB.
+    """
+    m = re.match(r"^\s*([0-9.]+)\s*([KMGT]?)", text, flags=re.IGNORECASE)
+    if m is None:
+        return None
+
+    return int(float(m.group(1)) * _MEMORY_UNITS[m.group(2).upper()])
+
+
+def summarize(records, percentiles=(50, 95, 100), states=("COMPLETED",)):
+    """Percentiles of the usage of jobs with the same name.
+
+    Only jobs in one of `states` are considered. Returns a `dict` mapping the
+    job name to, e.g.,
+
+        {"n_jobs": 12,
+         "max_rss": {50: ..., 95: ..., 100: ...},
+         "total_rss": {...},
+         "elapsed": {...},
+         "cpu_efficiency": {...}}
+    """
+    by_name = dict()
+    for record in records:
+        if record.state in states:
+            by_name.setdefault(record.name, []).append(record)
+
+    summary = dict()
+    for name, group in by_name.items():
+        summary[name] = {"n_jobs": len(group)}
+
+        for key in ["max_rss", "total_rss", "elapsed", "cpu_efficiency"]:
+            values = [getattr(r, key) for r in group if getattr(r, key) is not None]
+            summary[name][key] = {
+                p: percentile(values, p) for p in percentiles if values
+            }
+
+    return summary
+
+
+def percentile(values, p):
+    """The `p`-th percentile, interpolated linearly."""
+
+    values = sorted(values)
+    x = (len(values) - 1) * p / 100
+    lo, hi = math.floor(x), math.ceil(x)
+
+    return values[lo] + (values[hi] - values[lo]) * (x - lo)
+
+
+class RightSizing:
+    """Rewrite the memory and wall-clock requests of jobs.
+
+    A job's request is replaced by the `percentile` of the jobs with the same
+    name, see `summarize`, times `margin`. Jobs with fewer than `min_jobs`
+    samples are left alone. The wall-clock time is rounded up to minutes.
+
+    If only the memory of the whole job is known, e.g. from LSF, it's split
+    evenly among the MPI tasks of the job.
+    """
+
+    def __init__(self, summary, percentile=95, margin=1.25, min_jobs=5):
+        for name, usage in summary.items():
+            for key, values in usage.items():
+                if key != "n_jobs" and values and percentile not in values:
+                    raise ValueError(
+                        f"The summary of '{name}' lacks the {percentile}-th"
+                        " percentile, see `summarize(..., percentiles=...)`."
+                    )
+
+        self._summary = summary
+        self._percentile = percentile
+        self._margin = margin
+        self._min_jobs = min_jobs
+
+    def __call__(self, job):
+        """Right-size `job` in place; returns `job`."""
+
+        usage = self._summary.get(job.name)
+        if usage is None or usage["n_jobs"] < self._min_jobs:
+            return job
+
+        resources = copy.copy(job.resources)
+
+        memory = _memory_per_task(usage, self._percentile, resources)
+        if memory is not None:
+            _set_memory_per_task(resources, memory * self._margin)
+
+        elapsed = usage["elapsed"].get(self._percentile)
+        if elapsed is not None:
+            minutes = math.ceil(elapsed * self._margin / 60)
+            resources.wall_clock = datetime.timedelta(minutes=max(1, minutes))
+
+        job.resources = resources
+        return job
+
+
+def _memory_per_task(usage, p, resources):
+    max_rss = usage.get("max_rss", {}).get(p)
+    if max_rss is not None:
+        return max_rss
+
+    total_rss = usage.get("total_rss", {}).get(p)
+    if total_rss is not None:
+        n_tasks = resources.n_mpi_tasks if resources.needs_mpi else 1
+        return total_rss / n_tasks
+
+    return None
+
+
+def _set_memory_per_task(resources, memory):
+    memory = int(memory)
+
+    if isinstance(resources, scibs.MPIResource):
+        resources.mem_per_task = memory
+
+    elif isinstance(resources, scibs.CUResource):
+        resources.mem_per_cu = memory * (resources.cu.n_mpi_tasks or 1)
+
+    else:
+        # Everything else is a single task.
+        resources.total_memory = memory
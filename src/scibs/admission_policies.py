@@ -0,0 +1,199 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import logging
+import os
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionPolicy:
+    """Decides whether `LocalBS` may launch further jobs right now.
+
+    Calling the policy returns `None` if jobs may be launched. Otherwise, it
+    returns a string explaining why jobs are being held. While jobs are held,
+    `LocalBS` waits for up to `poll_interval` seconds before asking again.
+
+    `LocalBS` passes the number of cores its own running jobs use as
+    `own_cores`, such that they aren't mistaken for other work.
+    """
+
+    poll_interval = 1.0
+
+    def __call__(self, own_cores=0):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `__call__`."
+        )
+
+
+class PressureAdmissionPolicy(AdmissionPolicy):
+    """Hold jobs while the machine is under pressure from other work.
+
+    The following is sampled:
+        - the Linux pressure stall information (PSI), i.e. the `avg10` of
+          `some` in `/proc/pressure/{cpu,memory,io}`, if available,
+        - the available memory,
+        - the 1-minute load average per CPU,
+        - the utilization of the busiest CPU.
+
+    Since `LocalBS` never oversubscribes the cores, its own jobs cause little
+    pressure; PSI rises once other work competes for the machine. Load and
+    CPU utilization can't tell the two apart, hence their thresholds are off
+    by default. If enabled, the cores used by `LocalBS` itself are subtracted
+    first. Since its jobs are assumed to keep the busiest cores busy, those
+    cores are left out when checking the CPU utilization. Hence, a few cores
+    saturated by other work hold jobs, even if the machine is mostly idle.
+    Note that the load average lags by about a minute.
+
+    Jobs are held once any metric exceeds its threshold. To avoid oscillating,
+    jobs are only admitted again once every metric is below its threshold by a
+    margin of `hysteresis` (relative).
+
+    The reason for holding jobs is available as `reason` and is logged
+    whenever it changes.
+    """
+
+    def __init__(
+        self,
+        max_load=None,
+        max_cpu_percent=None,
+        min_available_memory=None,
+        max_psi=None,
+        hysteresis=0.1,
+        poll_interval=1.0,
+        sample=None,
+    ):
+        """
+        Args:
+            max_load:             Maximum 1-minute load average per CPU,
+                                  excluding the jobs of `LocalBS`.
+            max_cpu_percent:      Maximum utilization in percent of any CPU,
+                                  excluding the CPUs used by `LocalBS`.
+            min_available_memory: Bytes of memory that must remain available.
+            max_psi:              A `dict`, e.g. `{"memory": 10.0, "io": 20.0}`,
+                                  of the maximum PSI `some avg10` in percent.
+            hysteresis:           Relative margin before jobs are admitted
+                                  again.
+            sample:               A callable returning the current metrics,
+                                  defaults to `sample_pressure`.
+        """
+        if max_psi is None:
+            max_psi = {"cpu": 50.0, "memory": 10.0, "io": 50.0}
+
+        if sample is None:
+            sample = sample_pressure
+
+        self._max_load = max_load
+        self._max_cpu_percent = max_cpu_percent
+        self._min_available_memory = min_available_memory
+        self._max_psi = max_psi
+        self._hysteresis = hysteresis
+        self._sample = sample
+        self.poll_interval = poll_interval
+
+        self.reason = None
+
+    def __call__(self, own_cores=0):
+        metrics = _without_own_cores(self._sample(), own_cores)
+
+        # While jobs are held, the thresholds are tightened.
+        margin = 1.0 - self._hysteresis if self.reason is not None else 1.0
+        reason = self._check(metrics, margin)
+
+        if reason != self.reason:
+            if reason is None:
+                logger.info("Admitting jobs again.")
+            else:
+                logger.info(f"Holding jobs: {reason}")
+
+        self.reason = reason
+        return reason
+
+    def _check(self, metrics, margin):
+        load = metrics.get("load")
+        if self._max_load is not None and load is not None:
+            if load > margin * self._max_load:
+                return f"load average per CPU is {load:.2f}"
+
+        cpu_percent = metrics.get("cpu_percent")
+        if self._max_cpu_percent is not None and cpu_percent is not None:
+            if cpu_percent > margin * self._max_cpu_percent:
+                return f"CPU utilization is {cpu_percent:.0f}% on some CPU"
+
+        available_memory = metrics.get("available_memory")
+        if self._min_available_memory is not None and available_memory is not None:
+            if available_memory * margin < self._min_available_memory:
+                return f"only {available_memory * 1e-9:.1f} GB of memory available"
+
+        for resource, max_psi in self._max_psi.items():
+            psi = metrics.get(f"psi_{resource}")
+            if psi is not None and psi > margin * max_psi:
+                return f"{resource} pressure (PSI) is {psi:.1f}%"
+
+        return None
+
+
+def _without_own_cores(metrics, own_cores):
+    cpu_percents = metrics.get("cpu_percents")
+    if cpu_percents is not None:
+        # The busiest CPUs are attributed to our own jobs.
+        n_others = max(0, len(cpu_percents) - int(own_cores))
+        metrics = dict(metrics)
+        metrics["cpu_percent"] = max(sorted(cpu_percents)[:n_others], default=0.0)
+
+    if not own_cores:
+        return metrics
+
+    n_cpus = metrics.get("n_cpus") or psutil.cpu_count() or 1
+    own_share = own_cores / n_cpus
+
+    metrics = dict(metrics)
+    if metrics.get("load") is not None:
+        metrics["load"] = max(0.0, metrics["load"] - own_share)
+
+    if cpu_percents is None and metrics.get("cpu_percent") is not None:
+        metrics["cpu_percent"] = max(0.0, metrics["cpu_percent"] - 100.0 * own_share)
+
+    return metrics
+
+
+def sample_pressure():
+    """Sample the metrics used by `PressureAdmissionPolicy`."""
+
+    n_cpus = psutil.cpu_count() or 1
+
+    metrics = {
+        "n_cpus": n_cpus,
+        "load": os.getloadavg()[0] / n_cpus,
+        "cpu_percents": psutil.cpu_percent(interval=None, percpu=True),
+        "available_memory": psutil.virtual_memory().available,
+    }
+
+    for resource in ["cpu", "memory", "io"]:
+        metrics[f"psi_{resource}"] = read_psi(f"/proc/pressure/{resource}")
+
+    return metrics
+
+
+def read_psi(path):
+    """The `avg10` of the `some` line of a PSI file, or `None`."""
+
+    try:
+        with open(path, "r") as f:
+            text = f.read()
+    except OSError:
+        return None
+
+    return parse_psi(text)
+
+
+def parse_psi(text):
+    for line in text.splitlines():
+        parts = line.split()
+        if parts and parts[0] == "some":
+            fields = dict(part.split("=") for part in parts[1:])
+            return float(fields["avg10"])
+
+    return None
@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+"""Start a `scibs.WorkerAgent` on this host.
+
+Usage:
+    python -m scibs.agent --host 0.0.0.0 --port 7453 [--cores 16]
+"""
+
+import argparse
+
+import scibs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a SciBS worker agent.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=7453)
+    parser.add_argument(
+        "--cores", type=int, default=None, help="Defaults to all cores."
+    )
+    args = parser.parse_args(argv)
+
+    local_resources = scibs.LocalResources(cores=args.cores)
+    agent = scibs.WorkerAgent(args.host, args.port, local_resources)
+
+    host, port = agent.address
+    print(f"SciBS worker agent listening on {host}:{port}.")
+
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        agent.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import copy
+import datetime
+import os
+import shlex
+import string
+
+import scibs
+
+
+class BatchScriptMixin:
+    """Submit jobs by generating batch scripts.
+
+    Instead of passing everything on the command line, every job (or group of
+    jobs) is rendered into a script, e.g.
+
+        #!/bin/bash
+        #SBATCH -J foo_bar
+        #SBATCH --time 01:00:00
+        #SBATCH --cpus-per-task=4
+
+        cd /path/to/cwd
+        export OMP_NUM_THREADS=4; foo --bar
+
+    which is then submitted with `sbatch script.sbatch`. The directives are
+    exactly the flags used by the plain batch system. The scripts are kept in
+    `script_dir` and double as a record of what was submitted.
+    """
+
+    directive_prefix = None
+    script_suffix = ".sh"
+
+    _template = string.Template("#!/bin/bash\n${directives}\n\n${body}\n")
+
+    def __init__(self, *args, script_dir=".", **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._script_dir = script_dir
+        self._n_scripts = 0
+
+    @property
+    def script_dir(self):
+        return self._script_dir
+
+    def cmdline(self, job, dependency=None):
+        """Writes the script for `job` and returns the command to submit it."""
+
+        path = self._write_script(self.render_script([job]), job.name)
+        return self.submit_cmd(path, dependency)
+
+    def submit(self, job, dependency=None):
+        key = self._journal_keys([job])[0]
+        if self._is_skipped(key):
+            return self._skipped_handle(key)
+
+        path = self._write_script(self.render_script([job]), job.name)
+        return self._submit_script(path, key, job.env, dependency)
+
+    async def submit_async(self, job, dependency=None):
+        """Like `submit`, but doesn't block the event loop."""
+
+        key = self._journal_keys([job])[0]
+        if self._is_skipped(key):
+            return self._skipped_handle(key)
+
+        path = self._write_script(self.render_script([job]), job.name)
+        async with self._semaphore():
+            job_id = await self._submission_policy.submit_async(
+                self.submit_cmd(path, dependency), cwd=None, env=job.env
+            )
+
+        return self._submitted(key, job_id)
+
+    def submit_all(self, jobs, dependency=None):
+        """Write all scripts in one go, then submit them; returns the handles."""
+
+        jobs = list(jobs)
+        keys = self._journal_keys(jobs)
+
+        todo = [job for job, key in zip(jobs, keys) if not self._is_skipped(key)]
+        paths = iter(self.write_scripts(todo))
+
+        return [
+            (
+                self._skipped_handle(key)
+                if self._is_skipped(key)
+                else self._submit_script(next(paths), key, job.env, dependency)
+            )
+            for job, key in zip(jobs, keys)
+        ]
+
+    def submit_group(self, jobs, dependency=None, name=None):
+        """Submit `jobs` as a single batch job.
+
+        The jobs are run one after the other, each in its own subshell. The
+        directives are those of the first job, with the wall-clock time of all
+        jobs combined. When resuming, jobs which are done are left out.
+        """
+
+        jobs = list(jobs)
+        keys = self._journal_keys(jobs)
+
+        todo = [(job, key) for job, key in zip(jobs, keys) if not self._is_skipped(key)]
+        if not todo:
+            return self._skipped_handle(keys[0])
+
+        jobs, keys = map(list, zip(*todo))
+
+        path = self._write_script(self.render_script(jobs, name=name), name)
+        job_id = self._submission_policy(
+            self.submit_cmd(path, dependency), cwd=None, env=jobs[0].env
+        )
+
+        return self._submitted_group(keys, job_id)
+
+    def write_scripts(self, jobs):
+        """Render and write the scripts of `jobs`; returns their paths."""
+        return [self._write_script(self.render_script([job]), job.name) for job in jobs]
+
+    def render_script(self, jobs, name=None):
+        representative = _representative_job(jobs, name)
+
+        directives = "\n".join(
+            f"{self.directive_prefix} {shlex.join(option)}"
+            for option in _group_options(self.options(representative))
+        )
+
+        # In a group, a `cd` mustn't leak into the jobs that follow.
+        in_subshell = len(jobs) > 1
+        body = "\n".join(self._render_job(job, in_subshell) for job in jobs)
+        return self._template.substitute(directives=directives, body=body)
+
+    def submit_cmd(self, path, dependency):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `submit_cmd`."
+        )
+
+    def _journal_keys(self, jobs):
+        if self._journal is None:
+            return [None] * len(jobs)
+
+        return [self._journal.key(job) for job in jobs]
+
+    def _is_skipped(self, key):
+        return key is not None and self._is_resuming and self._journal.is_done(key)
+
+    def _submit_script(self, path, key, env, dependency):
+        # The path of the script is absolute and the script changes into the
+        # working directory of the job itself.
+        cmd = self.submit_cmd(path, dependency)
+        job_id = self._submission_policy(cmd, cwd=None, env=env)
+
+        return self._submitted(key, job_id)
+
+    def _render_job(self, job, in_subshell=False):
+        cmd = " ".join(self.wrap(job))
+        if job.cwd is not None:
+            # The batch system doesn't start the script in the driver's `cwd`.
+            cmd = f"cd {shlex.quote(os.path.abspath(job.cwd))} && {cmd}"
+
+        return f"({cmd})" if in_subshell else cmd
+
+    def _write_script(self, text, name):
+        os.makedirs(self._script_dir, exist_ok=True)
+
+        while True:
+            self._n_scripts += 1
+            filename = f"{name or 'job'}-{self._n_scripts}{self.script_suffix}"
+            path = os.path.abspath(os.path.join(self._script_dir, filename))
+
+            # Never overwrite the record of a previous submission.
+            try:
+                with open(path, "x") as f:
+                    f.write(text)
+                return path
+
+            except FileExistsError:
+                continue
+
+
+class ScriptSLURM(BatchScriptMixin, scibs.SLURM):
+    """Submits jobs to SLURM as generated sbatch scripts."""
+
+    directive_prefix = "#SBATCH"
+    script_suffix = ".sbatch"
+
+    @property
+    def slurm_cmd(self):
+        return "sbatch"
+
+    def submit_cmd(self, path, dependency):
+        c = [self.slurm_cmd]
+        if dependency:
+            c += [self._dependency_policy(dependency)]
+
+        return c + [path]
+
+
+class ScriptLSF(BatchScriptMixin, scibs.LSF):
+    """Submits jobs to LSF as generated bsub scripts.
+
+    NOTE: LSF only reads the directives if the script is passed on stdin, hence
+          the submission command is `sh -c 'bsub < script.lsf'`.
+    """
+
+    directive_prefix = "#BSUB"
+    script_suffix = ".lsf"
+
+    def submit_cmd(self, path, dependency):
+        if dependency is not None:
+            raise NotImplementedError("LSF dependencies aren't supported.")
+
+        return ["sh", "-c", f"bsub < {shlex.quote(path)}"]
+
+    def pack_line(self, job):
+        raise NotImplementedError("Batch scripts can't be packed.")
+
+
+def _group_options(options):
+    """Turns `["-J", "foo", "--mem=1"]` into `[["-J", "foo"], ["--mem=1"]]`."""
+
+    groups = []
+    for option in options:
+        if groups and not option.startswith("-") and len(groups[-1]) == 1:
+            groups[-1].append(option)
+        else:
+            groups.append([option])
+
+    return groups
+
+
+def _representative_job(jobs, name):
+    job = jobs[0]
+    if len(jobs) == 1 and name is None:
+        return job
+
+    resources = copy.copy(job.resources)
+
+    wall_clocks = [j.resources.wall_clock for j in jobs]
+    if all(wall_clock is not None for wall_clock in wall_clocks):
+        resources.wall_clock = sum(wall_clocks, datetime.timedelta(0))
+
+    return scibs.Job(job.cmd, resources, cwd=job.cwd, env=job.env, name=name)
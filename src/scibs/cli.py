@@ -0,0 +1,151 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+"""Run the jobs described in a job spec file.
+
+Usage:
+    scibs run jobs.jsonl --backend local|lsf|slurm [--format jsonl|csv]
+
+See `scibs.job_specs` for the format of the file. The specs are read and
+submitted one at a time.
+"""
+
+import argparse
+import functools
+import os
+import sys
+
+import scibs
+from scibs import job_specs
+
+
+def make_backend(args, journal=None):
+    if args.backend == "local":
+        local_resources = scibs.LocalResources(cores=args.cores)
+        return scibs.LocalBS(
+            local_resources=local_resources,
+            journal=journal,
+            schedule=functools.partial(
+                scibs.LookaheadSchedule, lookahead=args.lookahead
+            ),
+        )
+
+    if args.backend == "lsf":
+        return scibs.LSF(submission_policy=scibs.LSFSubmissionPolicy(), journal=journal)
+
+    if args.backend == "slurm":
+        return scibs.ScriptSLURM(
+            submission_policy=scibs.SLURMSubmissionPolicy(),
+            journal=journal,
+            script_dir=os.path.abspath(args.script_dir),
+        )
+
+    raise ValueError(f"Unknown backend: {args.backend}")
+
+
+def submit_specs(bs, specs):
+    """Submit the jobs described by `specs` to `bs`.
+
+    Only the job IDs of named jobs are kept, such that later jobs can depend
+    on them. For `LocalBS` the specs are consumed lazily, while the jobs are
+    being run.
+    """
+    if isinstance(bs, scibs.LocalBS):
+        bs.submit_all(_local_jobs(specs))
+        return
+
+    job_ids = dict()
+
+    for spec in specs:
+        job = job_specs.job_from_spec(spec)
+
+        if job_specs.has_dependency(spec):
+            if not isinstance(bs, scibs.SLURM):
+                raise ValueError("Dependencies are only supported by SLURM.")
+
+            dependency = job_specs.dependency_from_spec(spec, job_ids)
+            handle = bs.submit(job, dependency=dependency)
+
+        else:
+            handle = bs.submit(job)
+
+        if job.name is not None:
+            job_ids[job.name] = handle.job_id
+
+
+def _local_jobs(specs):
+    for spec in specs:
+        if job_specs.has_dependency(spec):
+            raise ValueError("Dependencies are only supported by SLURM.")
+
+        yield job_specs.job_from_spec(spec)
+
+
+def _counted(specs, counter):
+    for spec in specs:
+        counter[0] += 1
+        yield spec
+
+
+def run(args):
+    counter = [0]
+    specs = _counted(job_specs.read_job_specs(args.path, format=args.format), counter)
+
+    journal = None
+    if args.journal is not None:
+        journal = scibs.Journal(args.journal)
+
+    try:
+        bs = make_backend(args, journal)
+        if journal is not None:
+            # Rerunning the same command continues where it stopped.
+            bs.resume()
+
+        with bs:
+            submit_specs(bs, specs)
+
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print(f"Processed {counter[0]} job specs.", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="scibs", description="Run jobs through SciBS."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the jobs in a spec file.")
+    run_parser.add_argument("path", help="A JSON-lines or CSV file of job specs.")
+    run_parser.add_argument(
+        "--backend", choices=["local", "lsf", "slurm"], default="local"
+    )
+    run_parser.add_argument(
+        "--format", choices=["jsonl", "csv"], default=None, help="Default: by suffix."
+    )
+    run_parser.add_argument(
+        "--cores", type=int, default=None, help="Local backend only, default: all."
+    )
+    run_parser.add_argument(
+        "--lookahead",
+        type=int,
+        default=1024,
+        help="Local backend only, the number of pending jobs kept in memory.",
+    )
+    run_parser.add_argument(
+        "--journal", default=None, help="Record the progress in this journal."
+    )
+    run_parser.add_argument(
+        "--script-dir", default=".", help="Where to write the sbatch scripts."
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
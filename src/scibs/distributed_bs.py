@@ -0,0 +1,362 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import subprocess
+import threading
+
+import scibs
+
+logger = logging.getLogger(__name__)
+
+# The protocol between coordinator and agents is newline delimited JSON. The
+# messages are:
+#
+#   agent -> coordinator:   {"type": "hello", "cores": 16}
+#   coordinator -> agent:   {"type": "launch", "job_id": 3, "cmd": "...",
+#                            "cwd": "...", "env": {...}}
+#   agent -> coordinator:   {"type": "complete", "job_id": 3, "returncode": 0}
+#
+# The coordinator ends the session by closing the connection.
+
+
+def _send_message(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _read_messages(sock):
+    with sock.makefile("r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class WorkerAgent:
+    """Runs jobs on behalf of a `DistributedBS` coordinator.
+
+    One agent is started on each host that should participate. It advertises
+    the resources of its host and then runs whatever the coordinator asks it
+    to run, reporting back once a job has completed.
+
+    NOTE: There is no authentication whatsoever. Anyone who can connect to the
+          agent can run arbitrary commands as the user running the agent.
+          Only use this on trusted networks.
+    """
+
+    def __init__(self, host="localhost", port=0, local_resources=None):
+        if local_resources is None:
+            local_resources = scibs.LocalResources()
+
+        self._local_resources = local_resources
+        self._server = socket.create_server((host, port))
+        self._is_running = True
+
+    @property
+    def address(self):
+        """The `(host, port)` the agent is listening on."""
+        return self._server.getsockname()[:2]
+
+    def serve_forever(self):
+        """Serve coordinators, one after the other, until `shutdown`."""
+        while self._is_running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                # The server socket was closed by `shutdown`.
+                break
+
+            with conn:
+                try:
+                    self._serve(conn)
+
+                except (OSError, ValueError) as e:
+                    # e.g. the coordinator crashed; wait for the next one.
+                    logger.warning(f"Lost the connection to the coordinator: {e}")
+
+    def shutdown(self):
+        self._is_running = False
+
+        # Closing alone doesn't wake up a thread blocked in `accept`.
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self._server.close()
+
+    def _serve(self, conn):
+        lock = threading.Lock()
+        waiters = []
+
+        def send(message):
+            with lock:
+                _send_message(conn, message)
+
+        try:
+            send({"type": "hello", "cores": self._local_resources.available_cores})
+
+            for message in _read_messages(conn):
+                if not _is_launch_message(message):
+                    logger.warning(f"Ignoring unexpected message: {message}")
+                    continue
+
+                waiter = threading.Thread(target=self._run, args=(message, send))
+                waiter.start()
+                waiters.append(waiter)
+
+        finally:
+            for waiter in waiters:
+                waiter.join()
+
+    def _run(self, message, send):
+        cwd = message["cwd"]
+        stdout_path = os.path.join("." if cwd is None else cwd, "cout")
+        stderr_path = os.path.join("." if cwd is None else cwd, "cerr")
+
+        try:
+            with open(stdout_path, "w") as stdout, open(stderr_path, "w") as stderr:
+                proc = subprocess.Popen(
+                    message["cmd"],
+                    cwd=cwd,
+                    stdout=stdout,
+                    stderr=stderr,
+                    env=message["env"],
+                    shell=True,
+                )
+                returncode = proc.wait()
+
+        except Exception as e:
+            # The coordinator waits for every job it launched, it must hear
+            # back even if the job couldn't be started.
+            returncode = 1
+            _write_error(stderr_path, e)
+
+        try:
+            send(
+                {
+                    "type": "complete",
+                    "job_id": message["job_id"],
+                    "returncode": returncode,
+                }
+            )
+        except OSError:
+            # The coordinator is gone, there's nobody left to tell.
+            pass
+
+
+def _is_launch_message(message):
+    keys = ["job_id", "cmd", "cwd", "env"]
+    return (
+        isinstance(message, dict)
+        and message.get("type") == "launch"
+        and all(key in message for key in keys)
+    )
+
+
+def _write_error(path, e):
+    try:
+        with open(path, "a") as f:
+            f.write(f"scibs: failed to launch the job: {e}\n")
+    except OSError:
+        # E.g. the `cwd` doesn't exist on this host.
+        pass
+
+
+class RemoteResources:
+    """Models the resources available on a collection of hosts.
+
+    Each host is represented by its own `LocalResources`. Jobs are placed on
+    the first host with sufficient resources, i.e. a job never spans multiple
+    hosts.
+    """
+
+    def __init__(self, hosts):
+        self._hosts = hosts
+
+    def acquire(self, resources):
+        for host, local_resources in enumerate(self._hosts):
+            acquired_resources = local_resources.acquire(resources)
+
+            if acquired_resources is not None:
+                acquired_resources["host"] = host
+                return acquired_resources
+
+        return None
+
+    def release(self, acquired_resources):
+        host = acquired_resources.pop("host")
+        self._hosts[host].release(acquired_resources)
+
+
+class DistributedBS(scibs.SciBS):
+    """A local batch system spanning several hosts.
+
+    This is `LocalBS` for a handful of workstations without a batch system.
+    Every host runs a `WorkerAgent`, e.g.
+
+        python -m scibs.agent --host 0.0.0.0 --port 7453
+
+    and the coordinator dispatches the jobs to the agents:
+
+        with scibs.DistributedBS([("ws1", 7453), ("ws2", 7453)]) as dbs:
+            for job in jobs:
+                dbs.submit(job)
+
+    NOTE: Like `LocalBS` the command is run with `shell=True` by the agent. The
+          `cwd` and `env` of the job must make sense on every host.
+    """
+
+    def __init__(self, agents, wrap_policy=None, resource_policy=None):
+        if wrap_policy is None:
+            wrap_policy = scibs.DefaultWrapPolicy()
+
+        if resource_policy is None:
+            resource_policy = scibs.DefaultResourcePolicy()
+
+        self._agents = agents
+        self._wrap_policy = wrap_policy
+        self._resource_policy = resource_policy
+        self._context = None
+
+    def __enter__(self):
+        self._context = {"jobs": [], "handles": {}, "running": {}}
+        return self
+
+    def __exit__(self, *args):
+        self._run_all()
+        self._context = None
+
+    def submit(self, job):
+        """Add `job` to the jobs to be run; returns a `scibs.LocalJobHandle`."""
+        self._ensure_with_context()
+
+        handle = scibs.LocalJobHandle(self, len(self._context["jobs"]))
+        self._context["jobs"].append(job)
+        self._context["handles"].setdefault(id(job), []).append(handle)
+
+        return handle
+
+    def cancel(self, handle):
+        """Cancel the job of `handle`, if it hasn't been started yet.
+
+        Jobs already running on an agent can't be cancelled.
+        """
+        with handle._lock:
+            if handle._state == "PENDING":
+                handle.is_cancelled = True
+
+    def _ensure_with_context(self):
+        if self._context is None:
+            raise RuntimeError(f"{__class__} is missing context.")
+
+    def _run_all(self):
+        self._ensure_with_context()
+
+        connections = [socket.create_connection(agent) for agent in self._agents]
+        try:
+            self._run_on(connections)
+
+        finally:
+            for conn in connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    # The agent already hung up.
+                    pass
+
+                conn.close()
+
+    def _run_on(self, connections):
+        completions = queue.Queue()
+        hosts = []
+        readers = []
+
+        for conn in connections:
+            messages = _read_messages(conn)
+            hello = next(messages)
+            assert hello["type"] == "hello", "Agent didn't introduce itself."
+
+            hosts.append(scibs.LocalResources(cores=hello["cores"]))
+            readers.append(
+                threading.Thread(
+                    target=_forward_completions,
+                    args=(messages, completions),
+                    daemon=True,
+                )
+            )
+
+        for reader in readers:
+            reader.start()
+
+        job_schedule = scibs.GreedySchedule(
+            self._context["jobs"], RemoteResources(hosts)
+        )
+
+        n_running = 0
+
+        def _wait():
+            completion = completions.get()
+            if completion is None:
+                raise RuntimeError("Lost the connection to an agent.")
+
+            job_id, returncode = completion
+            self._context["running"].pop(job_id)._set_complete(returncode)
+            job_schedule.complete(job_id)
+
+        while not job_schedule.empty():
+            next_job = job_schedule.next_job()
+
+            assert (
+                next_job or n_running
+            ), "It looks like there are no jobs pending and yet nothing can be submitted."
+
+            if next_job is None:
+                _wait()
+                n_running -= 1
+
+            else:
+                self._dispatch(connections, next_job, completions)
+                n_running += 1
+
+        while n_running:
+            _wait()
+            n_running -= 1
+
+    def _dispatch(self, connections, scheduled_job, completions):
+        job_id, job, acquired_resources = scheduled_job
+
+        handle = self._context["handles"][id(job)].pop(0)
+        self._context["running"][job_id] = handle
+
+        if handle.is_cancelled:
+            completions.put((job_id, -signal.SIGTERM))
+            return
+
+        handle._set_running()
+        self._resource_policy(job, acquired_resources)
+        cmd = self._wrap_policy(job)
+
+        message = {
+            "type": "launch",
+            "job_id": job_id,
+            "cmd": cmd,
+            "cwd": job.cwd,
+            "env": scibs.environment.materialize(job.env),
+        }
+        _send_message(connections[acquired_resources["host"]], message)
+
+
+def _forward_completions(messages, completions):
+    try:
+        for message in messages:
+            completions.put((message["job_id"], message["returncode"]))
+
+    except OSError:
+        pass
+
+    # The agent hung up, make sure the coordinator doesn't wait forever.
+    completions.put(None)
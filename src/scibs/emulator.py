@@ -0,0 +1,1177 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+"""Emulate SLURM and LSF on the local machine.
+
+The emulator consists of a daemon, which runs the jobs on the local machine,
+and stand-in executables `sbatch`, `squeue`, `sacct`, `scancel`, `bsub`,
+`bjobs` and `bkill`, which talk to the daemon. This allows testing `SLURM`
+and `LSF`, including their submission and dependency policies, without a
+cluster, and measuring submission throughput and the cost of polling.
+
+    with scibs.emulator.Emulator(state_dir, cores=8, queue_delay=1.0) as emu:
+        os.environ["PATH"] = f"{emu.bin_dir}:{os.environ['PATH']}"
+
+        with scibs.ScriptSLURM(
+            submission_policy=scibs.SLURMSubmissionPolicy()
+        ) as slurm:
+            ...
+
+or from the shell:
+
+    python -m scibs.emulator shims bin --state-dir state
+    python -m scibs.emulator daemon --state-dir state --cores 8 &
+    PATH="$PWD/bin:$PATH" sbatch --wrap "hostname"
+
+Like the real batch systems, the daemon runs jobs first-come-first-served,
+with backfilling, as long as enough cores are free. It honours dependencies,
+job arrays, wall-clock limits (jobs are sent `SIGTERM`) and memory limits
+(enforced with `RLIMIT_AS`). Jobs only become eligible after `queue_delay`
+seconds, and fail before starting with probability `failure_rate`;
+submissions fail with probability `submit_failure_rate`.
+
+Only the commonly used options are understood; the rest are ignored.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import re
+import resource
+import shlex
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SOCKET_NAME = "daemon.sock"
+_COMMANDS = ["sbatch", "squeue", "sacct", "scancel", "bsub", "bjobs", "bkill"]
+
+_FINAL_STATES = {
+    "COMPLETED",
+    "FAILED",
+    "CANCELLED",
+    "TIMEOUT",
+    "OUT_OF_MEMORY",
+    "NODE_FAIL",
+}
+
+_SQUEUE_STATES = {
+    "PENDING": "PD",
+    "RUNNING": "R",
+    "COMPLETED": "CD",
+    "FAILED": "F",
+    "CANCELLED": "CA",
+    "TIMEOUT": "TO",
+    "OUT_OF_MEMORY": "OOM",
+    "NODE_FAIL": "NF",
+}
+
+_LSF_STATES = {"PENDING": "PEND", "RUNNING": "RUN", "COMPLETED": "DONE"}
+
+_MEMORY_UNITS = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+class EmulatorDaemon:
+    """Runs the jobs submitted through the stand-in executables.
+
+    The daemon listens on a Unix socket in `state_dir`. Every request is a
+    single line of JSON, and so is the reply.
+    """
+
+    def __init__(
+        self,
+        state_dir,
+        cores=None,
+        queue_delay=0.0,
+        failure_rate=0.0,
+        submit_failure_rate=0.0,
+        seed=None,
+    ):
+        self.state_dir = os.path.abspath(state_dir)
+        self.socket_path = os.path.join(self.state_dir, _SOCKET_NAME)
+
+        self._cores = os.cpu_count() if cores is None else cores
+        self._queue_delay = queue_delay
+        self._failure_rate = failure_rate
+        self._submit_failure_rate = submit_failure_rate
+        self._random = random.Random(seed)
+
+        self._records = dict()
+        self._by_job_id = dict()
+        # The pending and running jobs, used by `--dependency=singleton`.
+        self._active_by_name = dict()
+        self._pending = []
+        self._next_job_id = 1000
+        self._used_cores = 0
+        self._is_running = False
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._server = None
+        self._threads = []
+
+    def start(self):
+        """Start serving requests and running jobs in the background."""
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        daemon = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline())
+                reply = daemon.handle(request)
+                self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+        self._server = socketserver.ThreadingUnixStreamServer(
+            self.socket_path, _Handler
+        )
+        self._server.daemon_threads = True
+        self._is_running = True
+
+        self._threads = [
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+            threading.Thread(target=self._schedule_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def shutdown(self):
+        """Kill all jobs and stop the daemon."""
+
+        self.cancel(None, None)
+
+        with self._cond:
+            self._is_running = False
+            self._cond.notify_all()
+
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def handle(self, request):
+        op = request["op"]
+
+        if op == "submit":
+            return self.submit(request["jobs"])
+
+        if op == "query":
+            return {"jobs": self.query(request.get("job_ids"))}
+
+        if op == "cancel":
+            n = self.cancel(request.get("job_ids"), request.get("states"))
+            return {"cancelled": n}
+
+        return {"error": f"Unknown request: {op}"}
+
+    def submit(self, specs):
+        """Queue the jobs `specs`; returns their job IDs, or an error."""
+
+        for spec in specs:
+            if spec["n_cores"] > self._cores:
+                return {"error": "Requested node configuration is not available"}
+
+        if self._random.random() < self._submit_failure_rate:
+            return {"error": "Socket timed out on send/recv operation"}
+
+        job_ids = []
+        with self._cond:
+            for spec in specs:
+                job_id = self._next_job_id
+                self._next_job_id += 1
+                job_ids.append(job_id)
+
+                indices = spec.get("array") or [None]
+                for index in indices:
+                    record = dict(spec)
+                    record.update(
+                        {
+                            "job_id": job_id,
+                            "index": index,
+                            "state": "PENDING",
+                            "submit_time": time.time(),
+                            "start_time": None,
+                            "end_time": None,
+                            "returncode": None,
+                            "cpu_time": None,
+                            "max_rss": None,
+                            "cancelled": False,
+                            "timed_out": False,
+                        }
+                    )
+                    self._records[(job_id, index)] = record
+                    self._by_job_id.setdefault(job_id, []).append(record)
+                    self._active_by_name.setdefault(record["name"], dict())[
+                        (job_id, index)
+                    ] = record
+                    self._pending.append(record)
+
+            self._cond.notify_all()
+
+        return {"job_ids": job_ids}
+
+    def query(self, job_ids=None):
+        keep = ["job_id", "index", "name", "state", "n_cores", "partition"]
+        keep += ["submit_time", "start_time", "end_time", "returncode"]
+        keep += ["cpu_time", "max_rss"]
+
+        with self._lock:
+            return [
+                {key: record.get(key) for key in keep}
+                for record in self._select(job_ids)
+            ]
+
+    def cancel(self, job_ids=None, states=None):
+        n_cancelled = 0
+
+        with self._cond:
+            for record in self._select(job_ids):
+                if states is not None and record["state"] not in states:
+                    continue
+
+                if record["state"] == "PENDING":
+                    self._finish(record, "CANCELLED")
+                    n_cancelled += 1
+
+                elif record["state"] == "RUNNING":
+                    record["cancelled"] = True
+                    if record["proc"] is not None:
+                        _kill(record["proc"])
+                    n_cancelled += 1
+
+            self._cond.notify_all()
+
+        return n_cancelled
+
+    def _select(self, job_ids):
+        if job_ids is None:
+            return list(self._records.values())
+
+        selected = []
+        for job_id in job_ids:
+            job_id, index = _split_job_id(job_id)
+            selected += [
+                record
+                for record in self._by_job_id.get(job_id, [])
+                if index is None or record["index"] == index
+            ]
+
+        return selected
+
+    def _schedule_loop(self):
+        with self._cond:
+            while self._is_running:
+                timeout, launches = self._schedule()
+                if not launches:
+                    self._cond.wait(timeout)
+                    continue
+
+                # Spawning is slow, it mustn't block queries and submissions.
+                self._lock.release()
+                try:
+                    for record in launches:
+                        try:
+                            self._launch(record)
+                        except Exception:
+                            # One broken job mustn't stop the scheduler.
+                            logger.exception(f"Failed to launch {record['job_id']}.")
+                            self._launch_failed(record)
+                finally:
+                    self._lock.acquire()
+
+    def _schedule(self):
+        # First-come-first-served with backfilling. Returns how long to wait
+        # before the next job could become eligible, and the jobs to launch.
+        now = time.time()
+        timeout = 1.0
+        launches = []
+
+        for record in self._pending:
+            if record["state"] != "PENDING":
+                continue
+
+            if self._used_cores >= self._cores:
+                break
+
+            eligible_time = record["submit_time"] + self._queue_delay
+            if now < eligible_time:
+                timeout = min(timeout, eligible_time - now)
+                continue
+
+            dependency = self._dependency_state(record)
+            if dependency == "never":
+                self._finish(record, "CANCELLED")
+                continue
+
+            if dependency == "waiting" or not self._below_array_limit(record):
+                continue
+
+            if self._used_cores + record["n_cores"] > self._cores:
+                continue
+
+            if self._random.random() < self._failure_rate:
+                record["start_time"] = now
+                self._finish(record, "NODE_FAIL", returncode=1)
+                continue
+
+            # The job is launched once the lock has been released.
+            record["proc"] = None
+            record["state"] = "RUNNING"
+            record["start_time"] = now
+            self._used_cores += record["n_cores"]
+            launches.append(record)
+
+        self._pending = [r for r in self._pending if r["state"] == "PENDING"]
+        return timeout, launches
+
+    def _dependency_state(self, record):
+        """Either "satisfied", "waiting" or "never"."""
+
+        if record.get("singleton"):
+            for other in self._active_by_name[record["name"]].values():
+                if other is record:
+                    continue
+
+                if other["state"] == "RUNNING":
+                    return "waiting"
+
+                if other["state"] == "PENDING" and other["job_id"] < record["job_id"]:
+                    return "waiting"
+
+        for kind, job_ids in record.get("dependency") or []:
+            others = self._select(job_ids)
+            states = [other["state"] for other in others]
+
+            if kind == "after":
+                if any(state == "PENDING" for state in states):
+                    return "waiting"
+                continue
+
+            if not all(state in _FINAL_STATES for state in states):
+                return "waiting"
+
+            if kind == "afterok" and any(state != "COMPLETED" for state in states):
+                return "never"
+
+            if kind == "afternotok" and all(state == "COMPLETED" for state in states):
+                return "never"
+
+        return "satisfied"
+
+    def _below_array_limit(self, record):
+        limit = record.get("max_concurrent")
+        if limit is None:
+            return True
+
+        n_running = sum(
+            1
+            for other in self._by_job_id[record["job_id"]]
+            if other["state"] == "RUNNING"
+        )
+        return n_running < limit
+
+    def _launch(self, record):
+        # Called without holding the lock, the cores have been reserved.
+        env = dict(record["env"])
+        env.update(_job_env(record))
+
+        stdout = _expand_pattern(record["stdout"], record)
+        stderr = _expand_pattern(record["stderr"], record)
+
+        memory = record["memory"]
+        cmd = record["cmd"]
+        if memory is not None:
+            # The shell stops itself until the memory limit has been set,
+            # which is inherited by the command it `exec`s.
+            cmd = ["/bin/sh", "-c", 'kill -STOP $$; exec "$@"', "sh"] + cmd
+
+        try:
+            with open(stdout, "ab") as out, open(stderr, "ab") as err:
+                proc = subprocess.Popen(
+                    cmd,
+                    cwd=record["cwd"],
+                    env=env,
+                    stdout=out,
+                    stderr=err,
+                    stdin=subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+
+            if memory is not None:
+                _limit_memory(proc, memory)
+
+        except OSError as e:
+            try:
+                with open(stderr, "a") as err:
+                    print(f"slurmstepd: error: {e}", file=err)
+            except OSError:
+                # e.g. the `cwd` of the job doesn't exist.
+                logger.error(f"Failed to launch {record['job_id']}: {e}")
+
+            self._launch_failed(record)
+            return
+
+        with self._cond:
+            record["proc"] = proc
+            if record["cancelled"]:
+                _kill(proc)
+
+        if memory is not None:
+            os.kill(proc.pid, signal.SIGCONT)
+
+        thread = threading.Thread(target=self._wait, args=(record,), daemon=True)
+        thread.start()
+
+    def _launch_failed(self, record):
+        with self._cond:
+            self._used_cores -= record["n_cores"]
+            self._finish(record, "FAILED", returncode=1)
+            self._cond.notify_all()
+
+    def _wait(self, record):
+        proc = record["proc"]
+
+        timer = None
+        if record["time_limit"] is not None:
+            timer = threading.Timer(record["time_limit"], self._time_out, (record,))
+            timer.daemon = True
+            timer.start()
+
+        # `wait4` also reports the resources used by the job.
+        _, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        if timer is not None:
+            timer.cancel()
+
+        with self._cond:
+            self._used_cores -= record["n_cores"]
+            record["cpu_time"] = rusage.ru_utime + rusage.ru_stime
+            record["max_rss"] = rusage.ru_maxrss * 1024
+
+            if record["cancelled"]:
+                state = "CANCELLED"
+            elif record["timed_out"]:
+                state = "TIMEOUT"
+            elif proc.returncode == 0:
+                state = "COMPLETED"
+            else:
+                state = "FAILED"
+
+            self._finish(record, state, returncode=proc.returncode)
+            self._cond.notify_all()
+
+    def _time_out(self, record):
+        with self._lock:
+            if record["state"] == "RUNNING":
+                record["timed_out"] = True
+                _kill(record["proc"])
+
+    def _finish(self, record, state, returncode=None):
+        record["state"] = state
+        record["returncode"] = returncode
+        record["end_time"] = time.time()
+        record.pop("proc", None)
+
+        active = self._active_by_name[record["name"]]
+        active.pop((record["job_id"], record["index"]), None)
+        if not active:
+            del self._active_by_name[record["name"]]
+
+
+class Emulator:
+    """Runs an `EmulatorDaemon` and provides the stand-in executables.
+
+    The executables are written to `bin_dir`, by default `state_dir/bin`; it
+    must be prepended to `PATH`.
+    """
+
+    def __init__(self, state_dir, bin_dir=None, **kwargs):
+        if bin_dir is None:
+            bin_dir = os.path.join(state_dir, "bin")
+
+        self.bin_dir = os.path.abspath(bin_dir)
+        self.daemon = EmulatorDaemon(state_dir, **kwargs)
+
+    def __enter__(self):
+        self.daemon.start()
+        install_shims(self.bin_dir, self.daemon.state_dir)
+        return self
+
+    def __exit__(self, *args):
+        self.daemon.shutdown()
+
+    def query(self, job_ids=None):
+        return self.daemon.query(job_ids)
+
+
+def install_shims(bin_dir, state_dir):
+    """Write the stand-in executables, e.g. `sbatch`, to `bin_dir`."""
+
+    os.makedirs(bin_dir, exist_ok=True)
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    for command in _COMMANDS:
+        path = os.path.join(bin_dir, command)
+        with open(path, "w") as f:
+            f.write(
+                "#!/bin/sh\n"
+                f"SCIBS_EMULATOR_DIR={shlex.quote(os.path.abspath(state_dir))}\n"
+                f'PYTHONPATH={shlex.quote(package_dir)}"${{PYTHONPATH:+:$PYTHONPATH}}"\n'
+                "export SCIBS_EMULATOR_DIR PYTHONPATH\n"
+                f'exec {shlex.quote(sys.executable)} -m scibs.emulator {command} "$@"\n'
+            )
+        os.chmod(path, 0o755)
+
+
+def _request(message):
+    state_dir = os.environ.get("SCIBS_EMULATOR_DIR")
+    if state_dir is None:
+        raise RuntimeError("SCIBS_EMULATOR_DIR isn't set.")
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.path.join(state_dir, _SOCKET_NAME))
+        sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+        with sock.makefile("r", encoding="utf-8") as f:
+            return json.loads(f.readline())
+
+
+def _kill(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _limit_memory(proc, memory):
+    # Waits for the shell of `proc` to stop itself.
+    _, status = os.waitpid(proc.pid, os.WUNTRACED)
+    if not os.WIFSTOPPED(status):
+        raise OSError(f"The job exited before starting, status {status}.")
+
+    try:
+        resource.prlimit(proc.pid, resource.RLIMIT_AS, (memory, memory))
+    except OSError:
+        os.kill(proc.pid, signal.SIGKILL)
+        os.waitpid(proc.pid, 0)
+        raise
+
+
+def _job_env(record):
+    job_id, index = str(record["job_id"]), record["index"]
+
+    if record["system"] == "lsf":
+        return {"LSB_JOBID": job_id, "LSB_JOBINDEX": str(index or 0)}
+
+    env = {
+        "SLURM_JOB_ID": job_id,
+        "SLURM_JOBID": job_id,
+        "SLURM_JOB_NAME": record["name"],
+        "SLURM_NTASKS": str(record["n_tasks"]),
+        "SLURM_CPUS_PER_TASK": str(record["cpus_per_task"]),
+    }
+    if index is not None:
+        env.update({"SLURM_ARRAY_JOB_ID": job_id, "SLURM_ARRAY_TASK_ID": str(index)})
+
+    return env
+
+
+def _expand_pattern(pattern, record):
+    job_id, index = str(record["job_id"]), record["index"]
+    full_id = job_id if index is None else f"{job_id}_{index}"
+
+    replacements = {
+        "%j": full_id,
+        "%A": job_id,
+        "%a": str(index),
+        "%x": record["name"],
+        "%J": job_id,
+        "%I": str(index or 0),
+    }
+    path = re.sub("%[jAaxJI]", lambda m: replacements[m.group(0)], pattern)
+
+    return os.path.join(record["cwd"], path)
+
+
+def _split_job_id(job_id):
+    """Turns `"12_3"` or `"12[3]"` into `(12, 3)`, and `"12"` into `(12, None)`."""
+
+    m = re.match(r"^(\d+)(?:_(\d+)|\[(\d+)\])?$", str(job_id))
+    if m is None:
+        raise ValueError(f"Invalid job ID: {job_id}")
+
+    index = m.group(2) or m.group(3)
+    return int(m.group(1)), None if index is None else int(index)
+
+
+def _format_job_id(job, system="slurm"):
+    if job["index"] is None:
+        return str(job["job_id"])
+
+    if system == "lsf":
+        return f"{job['job_id']}[{job['index']}]"
+
+    return f"{job['job_id']}_{job['index']}"
+
+
+def parse_slurm_time(text):
+    """Seconds in any of the formats accepted by `sbatch --time`."""
+
+    if text in ("UNLIMITED", "INFINITE"):
+        return None
+
+    days = 0
+    if "-" in text:
+        days, text = text.split("-")
+        parts = [int(p) for p in text.split(":")] + [0, 0]
+        hours, minutes, seconds = parts[:3]
+
+    else:
+        parts = [int(p) for p in text.split(":")]
+        if len(parts) == 1:
+            hours, minutes, seconds = 0, parts[0], 0
+        elif len(parts) == 2:
+            hours, (minutes, seconds) = 0, parts
+        else:
+            hours, minutes, seconds = parts
+
+    return ((int(days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def parse_memory(text, default_unit="M"):
+    m = re.match(r"^([0-9.]+)([KMGT]?)B?$", text.strip(), flags=re.IGNORECASE)
+    if m is None:
+        raise ValueError(f"Invalid memory specification: {text}")
+
+    unit = (m.group(2) or default_unit).upper()
+    return int(float(m.group(1)) * _MEMORY_UNITS[unit])
+
+
+def parse_array(text):
+    """Parses `0-9`, `1,3,5-7`, `0-10:2` and `0-9%2`; returns the indices and
+    the maximum number of concurrently running tasks."""
+
+    max_concurrent = None
+    if "%" in text:
+        text, max_concurrent = text.split("%")
+        max_concurrent = int(max_concurrent)
+
+    indices = []
+    for part in text.split(","):
+        step = 1
+        if ":" in part:
+            part, step = part.split(":")
+            step = int(step)
+
+        if "-" in part:
+            first, last = part.split("-")
+            indices += list(range(int(first), int(last) + 1, step))
+        else:
+            indices.append(int(part))
+
+    return indices, max_concurrent
+
+
+def parse_slurm_dependency(text):
+    """Parses `afterok:1:2,afterany:3` or `singleton`."""
+
+    dependency, singleton = [], False
+    for part in re.split("[,?]", text):
+        kind, *job_ids = part.split(":")
+        if kind == "singleton":
+            singleton = True
+        else:
+            dependency.append((kind, job_ids))
+
+    return dependency, singleton
+
+
+def parse_lsf_dependency(text):
+    """Parses, e.g., `done(1) && ended(2)`."""
+
+    kinds = {"done": "afterok", "ended": "afterany", "exit": "afternotok"}
+    kinds["started"] = "after"
+
+    return [
+        (kinds[kind], [job_id])
+        for kind, job_id in re.findall(
+            r"(done|ended|exit|started)\(\s*([^)\s]+)\s*\)", text
+        )
+    ]
+
+
+def _directives(path, prefix):
+    """The options in the `#SBATCH` or `#BSUB` lines of the script."""
+
+    options = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(prefix):
+                options += shlex.split(line[len(prefix) :])
+            elif line and not line.startswith("#"):
+                break
+
+    return options
+
+
+def _interpreter(path):
+    with open(path, "r") as f:
+        first_line = f.readline()
+
+    if first_line.startswith("#!"):
+        return shlex.split(first_line[2:])
+
+    return ["/bin/sh"]
+
+
+def _sbatch_parser():
+    parser = argparse.ArgumentParser(prog="sbatch", allow_abbrev=False)
+    parser.add_argument("-J", "--job-name")
+    parser.add_argument("-t", "--time")
+    parser.add_argument("--mem")
+    parser.add_argument("--mem-per-cpu")
+    parser.add_argument("-n", "--ntasks", type=int, default=1)
+    parser.add_argument("-c", "--cpus-per-task", type=int, default=1)
+    parser.add_argument("-N", "--nodes")
+    parser.add_argument("--ntasks-per-node")
+    parser.add_argument("-d", "--dependency")
+    parser.add_argument("-a", "--array")
+    parser.add_argument("-o", "--output")
+    parser.add_argument("-e", "--error")
+    parser.add_argument("-p", "--partition")
+    parser.add_argument("-A", "--account")
+    parser.add_argument("-D", "--chdir")
+    parser.add_argument("--wrap")
+    parser.add_argument("--parsable", action="store_true")
+    parser.add_argument("--exclusive", action="store_true")
+    parser.add_argument("script", nargs="?")
+    parser.add_argument("script_args", nargs=argparse.REMAINDER)
+
+    return parser
+
+
+def sbatch(argv):
+    parser = _sbatch_parser()
+    args, _ = parser.parse_known_args(argv)
+
+    if args.wrap is not None:
+        cmd = ["/bin/sh", "-c", args.wrap]
+    elif args.script is not None:
+        # Options on the command line override the directives.
+        args, _ = parser.parse_known_args(_directives(args.script, "#SBATCH") + argv)
+        script = os.path.abspath(args.script)
+        cmd = _interpreter(script) + [script] + args.script_args
+    else:
+        raise ValueError("sbatch: error: Script or --wrap is required.")
+
+    n_cores = args.ntasks * args.cpus_per_task
+
+    memory = None
+    if args.mem is not None:
+        memory = parse_memory(args.mem)
+    elif args.mem_per_cpu is not None:
+        memory = parse_memory(args.mem_per_cpu) * n_cores
+
+    array, max_concurrent = None, None
+    if args.array is not None:
+        array, max_concurrent = parse_array(args.array)
+
+    dependency, singleton = [], False
+    if args.dependency is not None:
+        dependency, singleton = parse_slurm_dependency(args.dependency)
+
+    output = args.output or ("slurm-%A_%a.out" if array else "slurm-%j.out")
+    name = args.job_name or os.path.basename(args.script or "wrap")
+
+    spec = {
+        "system": "slurm",
+        "name": name,
+        "cmd": cmd,
+        "cwd": os.path.abspath(args.chdir or os.getcwd()),
+        "env": dict(os.environ),
+        "n_tasks": args.ntasks,
+        "cpus_per_task": args.cpus_per_task,
+        "n_cores": n_cores,
+        "memory": memory,
+        "time_limit": None if args.time is None else parse_slurm_time(args.time),
+        "dependency": dependency,
+        "singleton": singleton,
+        "array": array,
+        "max_concurrent": max_concurrent,
+        "stdout": output,
+        "stderr": args.error or output,
+        "partition": args.partition or "normal",
+    }
+
+    reply = _request({"op": "submit", "jobs": [spec]})
+    if "error" in reply:
+        print(
+            f"sbatch: error: Batch job submission failed: {reply['error']}",
+            file=sys.stderr,
+        )
+        return 1
+
+    job_id = reply["job_ids"][0]
+    print(job_id if args.parsable else f"Submitted batch job {job_id}")
+    return 0
+
+
+def _job_ids_arg(text):
+    return [job_id for job_id in re.split("[, ]", text) if job_id]
+
+
+def squeue(argv):
+    parser = argparse.ArgumentParser(prog="squeue", allow_abbrev=False)
+    parser.add_argument("-h", "--noheader", action="store_true")
+    parser.add_argument("-j", "--jobs", type=_job_ids_arg)
+    parser.add_argument("-o", "--format", default="%.18i %.9P %.8j %.2t %.10M")
+    parser.add_argument("-t", "--states")
+    args, _ = parser.parse_known_args(argv)
+
+    jobs = _request({"op": "query", "job_ids": args.jobs})["jobs"]
+    jobs = [job for job in jobs if job["state"] in ("PENDING", "RUNNING")]
+
+    if args.states is not None:
+        states = args.states.upper().split(",")
+        jobs = [
+            job
+            for job in jobs
+            if job["state"] in states or _SQUEUE_STATES[job["state"]] in states
+        ]
+
+    fields = {
+        "i": ("JOBID", lambda job: _format_job_id(job)),
+        "P": ("PARTITION", lambda job: job["partition"]),
+        "j": ("NAME", lambda job: job["name"]),
+        "t": ("ST", lambda job: _SQUEUE_STATES[job["state"]]),
+        "T": ("STATE", lambda job: job["state"]),
+        "M": ("TIME", lambda job: _format_duration(_elapsed(job))),
+        "C": ("CPUS", lambda job: str(job["n_cores"])),
+    }
+
+    def render(row):
+        return re.sub(
+            r"%\.?\d*([A-Za-z])",
+            lambda m: row(fields[m.group(1)]) if m.group(1) in fields else "",
+            args.format,
+        )
+
+    if not args.noheader:
+        print(render(lambda field: field[0]))
+
+    for job in jobs:
+        print(render(lambda field: field[1](job)))
+
+    return 0
+
+
+def sacct(argv):
+    parser = argparse.ArgumentParser(prog="sacct", allow_abbrev=False)
+    parser.add_argument("-n", "--noheader", action="store_true")
+    parser.add_argument("-P", "--parsable2", action="store_true")
+    parser.add_argument("-p", "--parsable", action="store_true")
+    parser.add_argument("-X", "--allocations", action="store_true")
+    parser.add_argument("-j", "--jobs", type=_job_ids_arg)
+    parser.add_argument(
+        "-o", "--format", default="JobID,JobName,Partition,AllocCPUS,State,ExitCode"
+    )
+    args, _ = parser.parse_known_args(argv)
+
+    jobs = _request({"op": "query", "job_ids": args.jobs})["jobs"]
+
+    fields = {
+        "jobid": lambda job: _format_job_id(job),
+        "jobname": lambda job: job["name"],
+        "partition": lambda job: job["partition"],
+        "state": lambda job: job["state"],
+        "alloccpus": lambda job: str(job["n_cores"]),
+        "exitcode": lambda job: f"{max(job['returncode'] or 0, 0)}:0",
+        "elapsed": lambda job: _format_duration(_elapsed(job)),
+        "totalcpu": lambda job: _format_optional_duration(job["cpu_time"]),
+        "maxrss": lambda job: _format_optional_memory(job["max_rss"]),
+    }
+    columns = args.format.split(",")
+
+    separator = "|" if args.parsable or args.parsable2 else " "
+    end = "|" if args.parsable else ""
+
+    rows = []
+    if not args.noheader:
+        rows.append(columns)
+
+    for job in jobs:
+        rows.append([fields.get(c.lower(), lambda job: "")(job) for c in columns])
+
+    for row in rows:
+        print(separator.join(row) + end)
+
+    return 0
+
+
+def scancel(argv):
+    parser = argparse.ArgumentParser(prog="scancel", allow_abbrev=False)
+    parser.add_argument("-t", "--state")
+    parser.add_argument("job_ids", nargs="*")
+    args, _ = parser.parse_known_args(argv)
+
+    states = None if args.state is None else args.state.upper().split(",")
+    _request({"op": "cancel", "job_ids": args.job_ids, "states": states})
+
+    return 0
+
+
+def _bsub_parser():
+    parser = argparse.ArgumentParser(prog="bsub", allow_abbrev=False)
+    parser.add_argument("-J")
+    parser.add_argument("-W")
+    parser.add_argument("-n", type=int, default=1)
+    parser.add_argument("-R", action="append", default=[])
+    parser.add_argument("-q", default="normal")
+    parser.add_argument("-w")
+    parser.add_argument("-o")
+    parser.add_argument("-oo")
+    parser.add_argument("-e")
+    parser.add_argument("-eo")
+    parser.add_argument("-M")
+    parser.add_argument("-P")
+    parser.add_argument("-G")
+    parser.add_argument("-cwd")
+    parser.add_argument("-pack")
+    parser.add_argument("cmd", nargs=argparse.REMAINDER)
+
+    return parser
+
+
+def _bsub_spec(args, script=None):
+    if script is not None:
+        cmd = ["/bin/sh", script]
+    else:
+        cmd = ["/bin/sh", "-c", " ".join(args.cmd)]
+
+    name = args.J or " ".join(args.cmd) or "script"
+    array, max_concurrent = None, None
+    m = re.match(r"^(.*)\[([0-9,:\-]+)\](?:%(\d+))?$", name)
+    if m is not None:
+        name = m.group(1)
+        array, _ = parse_array(m.group(2))
+        max_concurrent = None if m.group(3) is None else int(m.group(3))
+
+    memory = None
+    for requirement in args.R:
+        m = re.search(r"rusage\[.*mem=([0-9.]+)", requirement)
+        if m is not None:
+            memory = int(float(m.group(1)) * _MEMORY_UNITS["M"]) * args.n
+
+    time_limit = None
+    if args.W is not None:
+        parts = [int(p) for p in args.W.split(":")]
+        time_limit = 60 * (parts[0] if len(parts) == 1 else 60 * parts[0] + parts[1])
+
+    output = args.oo or args.o or os.devnull
+    error = args.eo or args.e or output
+
+    return {
+        "system": "lsf",
+        "name": name,
+        "cmd": cmd,
+        "cwd": os.path.abspath(args.cwd or os.getcwd()),
+        "env": dict(os.environ),
+        "n_tasks": args.n,
+        "cpus_per_task": 1,
+        "n_cores": args.n,
+        "memory": memory,
+        "time_limit": time_limit,
+        "dependency": [] if args.w is None else parse_lsf_dependency(args.w),
+        "singleton": False,
+        "array": array,
+        "max_concurrent": max_concurrent,
+        "stdout": output,
+        "stderr": error,
+        "partition": args.q,
+    }
+
+
+def bsub(argv):
+    parser = _bsub_parser()
+    args = parser.parse_args(argv)
+
+    if args.pack is not None:
+        with open(args.pack, "r") as f:
+            lines = [line.strip() for line in f]
+
+        specs = [
+            _bsub_spec(parser.parse_args(shlex.split(line)))
+            for line in lines
+            if line and not line.startswith("#")
+        ]
+
+    elif args.cmd:
+        specs = [_bsub_spec(args)]
+
+    else:
+        # The script is passed on stdin.
+        state_dir = os.environ["SCIBS_EMULATOR_DIR"]
+        script = os.path.join(state_dir, f"bsub-{os.getpid()}-{time.time_ns()}.sh")
+        with open(script, "w") as f:
+            f.write(sys.stdin.read())
+
+        args = parser.parse_args(_directives(script, "#BSUB") + argv)
+        specs = [_bsub_spec(args, script=script)]
+
+    reply = _request({"op": "submit", "jobs": specs})
+    if "error" in reply:
+        print(f"{reply['error']}. Job not submitted.", file=sys.stderr)
+        return 1
+
+    for job_id, spec in zip(reply["job_ids"], specs):
+        print(f"Job <{job_id}> is submitted to queue <{spec['partition']}>.")
+
+    return 0
+
+
+def bjobs(argv):
+    parser = argparse.ArgumentParser(prog="bjobs", allow_abbrev=False)
+    parser.add_argument("-noheader", action="store_true")
+    parser.add_argument("-a", action="store_true")
+    parser.add_argument("-o", default="jobid stat queue job_name")
+    parser.add_argument("job_ids", nargs="*")
+    args, _ = parser.parse_known_args(argv)
+
+    jobs = _request({"op": "query", "job_ids": args.job_ids or None})["jobs"]
+    if not args.a and not args.job_ids:
+        jobs = [job for job in jobs if job["state"] in ("PENDING", "RUNNING")]
+
+    if not jobs:
+        print("No unfinished job found", file=sys.stderr)
+
+    fields = {
+        "jobid": lambda job: str(job["job_id"]),
+        "stat": lambda job: _LSF_STATES.get(job["state"], "EXIT"),
+        "queue": lambda job: job["partition"],
+        "job_name": lambda job: _format_job_id(dict(job, job_id=job["name"]), "lsf"),
+        "slots": lambda job: str(job["n_cores"]),
+        "exit_code": lambda job: str(max(job["returncode"] or 0, 0)),
+    }
+    columns = args.o.split()
+
+    if not args.noheader and jobs:
+        print(" ".join(column.upper() for column in columns))
+
+    for job in jobs:
+        print(" ".join(fields.get(c.lower(), lambda job: "-")(job) for c in columns))
+
+    return 0
+
+
+def bkill(argv):
+    parser = argparse.ArgumentParser(prog="bkill", allow_abbrev=False)
+    parser.add_argument("job_ids", nargs="*")
+    args, _ = parser.parse_known_args(argv)
+
+    job_ids = None if args.job_ids == ["0"] else args.job_ids
+    for job_id in args.job_ids:
+        print(f"Job <{job_id}> is being terminated")
+
+    _request({"op": "cancel", "job_ids": job_ids})
+    return 0
+
+
+def _elapsed(job):
+    if job["start_time"] is None:
+        return 0
+
+    return (job["end_time"] or time.time()) - job["start_time"]
+
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hhmmss = str(datetime.timedelta(seconds=seconds)).zfill(8)
+
+    return f"{days}-{hhmmss}" if days else hhmmss
+
+
+def _format_optional_duration(seconds):
+    return "" if seconds is None else _format_duration(seconds)
+
+
+def _format_optional_memory(memory):
+    return "" if memory is None else f"{memory // 1024}K"
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if argv and argv[0] in _COMMANDS:
+        command = globals()[argv[0]]
+        try:
+            return command(argv[1:])
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"{argv[0]}: error: {e}", file=sys.stderr)
+            return 1
+
+    parser = argparse.ArgumentParser(
+        prog="scibs-emulator", description="Emulate SLURM and LSF locally."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    daemon_parser = subparsers.add_parser("daemon", help="Run the daemon.")
+    daemon_parser.add_argument("--state-dir", required=True)
+    daemon_parser.add_argument("--cores", type=int)
+    daemon_parser.add_argument("--queue-delay", type=float, default=0.0)
+    daemon_parser.add_argument("--failure-rate", type=float, default=0.0)
+    daemon_parser.add_argument("--submit-failure-rate", type=float, default=0.0)
+    daemon_parser.add_argument("--seed", type=int)
+
+    shims_parser = subparsers.add_parser("shims", help="Install the executables.")
+    shims_parser.add_argument("bin_dir")
+    shims_parser.add_argument("--state-dir", required=True)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "daemon":
+        EmulatorDaemon(
+            args.state_dir,
+            cores=args.cores,
+            queue_delay=args.queue_delay,
+            failure_rate=args.failure_rate,
+            submit_failure_rate=args.submit_failure_rate,
+            seed=args.seed,
+        ).serve_forever()
+
+    elif args.command == "shims":
+        install_shims(args.bin_dir, args.state_dir)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
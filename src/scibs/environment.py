@@ -0,0 +1,170 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import collections
+import collections.abc
+import os
+import threading
+
+
+class Environment(collections.abc.MutableMapping):
+    """A copy-on-write environment.
+
+    An `Environment` consists of a shared `base`, which is never modified, and
+    a small per-job delta. This way, thousands of jobs can have their own
+    environment without each holding a copy of a large HPC environment.
+    Modifications only affect the delta; deleted variables are recorded as
+    `None`.
+
+    By default the base is `os.environ` itself, i.e. changes to `os.environ`
+    made after creating the `Environment` are seen, just like for jobs
+    without an environment.
+
+    Use `materialize` to obtain a plain `dict`, e.g. right before launching
+    the job. Since it's a `Mapping`, it can also be passed directly to
+    `subprocess`.
+    """
+
+    def __init__(self, base=None, delta=None):
+        """
+        Args:
+            base: A `Mapping` which isn't modified, by default `os.environ`.
+            delta: Changes relative to `base`.
+        """
+        if base is None:
+            base = os.environ
+
+        self._base = base
+        self._delta = dict() if delta is None else dict(delta)
+
+    @staticmethod
+    def on_top_of(env):
+        """A new layer on top of `env`, which is not modified.
+
+        If `env` is `None` the layer is on top of `os.environ`. A plain `dict`
+        is frozen once and the frozen copy is shared by all layers on top of
+        the same, unchanged `dict`.
+        """
+        if isinstance(env, Environment):
+            return Environment(env._base, env._delta)
+
+        if env is None:
+            return Environment()
+
+        return Environment(_frozen(env))
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def delta(self):
+        """The changes relative to `base`, `None` means unset."""
+        return self._delta
+
+    def __getitem__(self, key):
+        if key in self._delta:
+            value = self._delta[key]
+            if value is None:
+                raise KeyError(key)
+
+            return value
+
+        return self._base[key]
+
+    def __setitem__(self, key, value):
+        self._delta[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+
+        self._delta[key] = None
+
+    def __iter__(self):
+        for key in self._base:
+            if self._delta.get(key, "") is not None:
+                yield key
+
+        for key, value in self._delta.items():
+            if key not in self._base and value is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Environment(<{len(self._base)} base variables>, {self._delta})"
+
+    def update_delta(self, delta):
+        """Apply changes like those returned by `WrapPolicy.argv`."""
+        self._delta.update(delta)
+
+    def materialize(self):
+        """The environment as a plain `dict`."""
+
+        env = dict(self._base)
+        for key, value in self._delta.items():
+            if value is None:
+                env.pop(key, None)
+            else:
+                env[key] = value
+
+        return env
+
+
+def materialize(env):
+    """Turns `env` into something `json` and `os.posix_spawn` understand."""
+
+    if isinstance(env, Environment):
+        return env.materialize()
+
+    return env
+
+
+_FROZEN_CACHE_SIZE = 16
+_frozen_cache = collections.OrderedDict()
+_frozen_cache_lock = threading.Lock()
+
+
+def _frozen(env):
+    # Jobs commonly share one `dict`; only freeze it once. The `dict` is kept
+    # alive by the cache, hence its `id` can't be reused.
+    with _frozen_cache_lock:
+        entry = _frozen_cache.get(id(env))
+        if entry is not None and entry[0] is env and entry[1] == env:
+            _frozen_cache.move_to_end(id(env))
+            return entry[1]
+
+    frozen = _FrozenDict(env)
+
+    with _frozen_cache_lock:
+        _frozen_cache[id(env)] = (env, frozen)
+        _frozen_cache.move_to_end(id(env))
+        while len(_frozen_cache) > _FROZEN_CACHE_SIZE:
+            _frozen_cache.popitem(last=False)
+
+    return frozen
+
+
+class _FrozenDict(collections.abc.Mapping):
+    def __init__(self, mapping):
+        self._dict = dict(mapping)
+
+    def __getitem__(self, key):
+        return self._dict[key]
+
+    def __iter__(self):
+        return iter(self._dict)
+
+    def __len__(self):
+        return len(self._dict)
+
+    def __contains__(self, key):
+        return key in self._dict
+
+    def __eq__(self, other):
+        if isinstance(other, _FrozenDict):
+            other = other._dict
+
+        return self._dict == other
@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class FailurePolicy:
+    """Decides what to do after a job has finished.
+
+    The policy is called with `failed=True` or `failed=False` once for every
+    job that finished, i.e. cancelled jobs are not reported. It returns
+    `None` to carry on, "cancel_pending" to cancel all jobs which haven't
+    started yet, or "cancel_all" to also cancel the running jobs.
+    """
+
+    def __call__(self, failed):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `__call__`."
+        )
+
+
+class FailFastPolicy(FailurePolicy):
+    """Stop wasting resources once too many jobs have failed.
+
+    Jobs are cancelled after `max_failures` failures, or once the fraction of
+    failed jobs exceeds `max_failure_ratio`. The ratio is only considered
+    after `min_finished` jobs have finished, such that one early failure
+    doesn't cancel everything.
+    """
+
+    def __init__(
+        self,
+        max_failures=1,
+        max_failure_ratio=None,
+        min_finished=10,
+        cancel_running=False,
+    ):
+        self._max_failures = max_failures
+        self._max_failure_ratio = max_failure_ratio
+        self._min_finished = min_finished
+        self._action = "cancel_all" if cancel_running else "cancel_pending"
+
+        self.n_finished = 0
+        self.n_failed = 0
+
+    def __call__(self, failed):
+        self.n_finished += 1
+        self.n_failed += int(failed)
+
+        if self._max_failures is not None and self.n_failed >= self._max_failures:
+            return self._action
+
+        if self._max_failure_ratio is not None:
+            if self.n_finished >= self._min_finished:
+                if self.n_failed / self.n_finished > self._max_failure_ratio:
+                    return self._action
+
+        return None
+
+
+def watch_failures(
+    backend,
+    handles,
+    failure_policy,
+    poll_interval=60.0,
+    max_unknown_polls=3,
+    timeout=None,
+):
+    """Apply `failure_policy` to jobs submitted to a cluster.
+
+    The states of the jobs `handles` are polled every `poll_interval` seconds
+    using `backend.query_states`. If the policy asks for it, the jobs are
+    cancelled with `backend.cancel_all`.
+
+    Jobs which are "UNKNOWN", or missing from the answer, for
+    `max_unknown_polls` consecutive polls are given up on, e.g. LSF forgets
+    finished jobs after a while. They aren't reported to the policy, since
+    it's not known whether they failed. After `timeout` seconds, watching
+    stops regardless.
+
+    Returns the action taken, or `None` once all jobs have finished.
+    """
+
+    remaining = {handle.job_id for handle in handles if handle.job_id is not None}
+    n_unknown = {job_id: 0 for job_id in remaining}
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    while remaining:
+        states = backend.query_states(sorted(remaining, key=str))
+
+        for job_id in sorted(remaining, key=str):
+            state = states.get(job_id, "UNKNOWN")
+
+            if state == "UNKNOWN":
+                n_unknown[job_id] += 1
+                if n_unknown[job_id] >= max_unknown_polls:
+                    logger.warning(f"Lost track of job {job_id}.")
+                    remaining.discard(job_id)
+
+                continue
+
+            n_unknown[job_id] = 0
+            if state not in ["COMPLETED", "FAILED"]:
+                continue
+
+            remaining.discard(job_id)
+
+            action = failure_policy(state == "FAILED")
+            if action is not None:
+                logger.warning(f"Too many jobs failed, {action.replace('_', ' ')}.")
+                backend.cancel_all(running=action == "cancel_all")
+                return action
+
+        if remaining:
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                logger.warning(f"Stopped watching {len(remaining)} unfinished jobs.")
+                return None
+
+            time.sleep(poll_interval)
+
+    return None
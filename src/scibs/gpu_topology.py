@@ -0,0 +1,143 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import itertools
+import json
+import re
+import subprocess
+
+# How far apart two GPUs are, see the legend of `nvidia-smi topo -m`. Lower
+# is better. NVLink connections, `NV#`, are better the more links there are.
+_NVIDIA_SMI_DISTANCES = {
+    "X": 0,
+    "PIX": 20,
+    "PXB": 30,
+    "PHB": 40,
+    "NODE": 50,
+    "SYS": 60,
+}
+
+
+class GPUTopology:
+    """Describes how closely the GPUs of a node are connected.
+
+    The topology consists of the pairwise distance between GPUs, smaller is
+    better. It can be obtained from `nvidia-smi topo -m`, or from a JSON file
+    listing groups of closely connected GPUs, e.g. NVLink islands:
+
+        {"groups": [[0, 1, 2, 3], [4, 5, 6, 7]]}
+
+    GPUs in the same group are at distance 1, all others at distance 2.
+    """
+
+    def __init__(self, distances):
+        """
+        Args:
+            distances: A `dict` mapping pairs `(i, j)` of GPU IDs to their
+                       distance. Missing pairs are considered to be far apart.
+        """
+        self._distances = dict()
+        for (i, j), d in distances.items():
+            self._distances[(i, j)] = d
+            self._distances[(j, i)] = d
+
+        self._far = max(self._distances.values(), default=0) + 1
+
+    def distance(self, i, j):
+        if i == j:
+            return 0
+
+        return self._distances.get((i, j), self._far)
+
+    def span(self, gpu_ids):
+        """The largest distance between any two of `gpu_ids`."""
+        return max(
+            (self.distance(i, j) for i, j in itertools.combinations(gpu_ids, 2)),
+            default=0,
+        )
+
+    @staticmethod
+    def linear(gpu_ids):
+        """GPUs are closer the closer they are in the list `gpu_ids`.
+
+        This is the fallback if nothing is known about the topology, and
+        results in contiguous allocations.
+        """
+        return GPUTopology(
+            {
+                (i, j): abs(ki - kj)
+                for (ki, i), (kj, j) in itertools.combinations(enumerate(gpu_ids), 2)
+            }
+        )
+
+    @staticmethod
+    def from_groups(groups):
+        distances = dict()
+        for group in groups:
+            for i, j in itertools.combinations(group, 2):
+                distances[(i, j)] = 1
+
+        all_gpus = [gpu_id for group in groups for gpu_id in group]
+        for i, j in itertools.combinations(all_gpus, 2):
+            distances.setdefault((i, j), 2)
+
+        return GPUTopology(distances)
+
+    @staticmethod
+    def from_nvidia_smi_output(text):
+        """Parse the matrix printed by `nvidia-smi topo -m`."""
+
+        lines = [line for line in text.splitlines() if line.strip()]
+        header = lines[0].split()
+        columns = [c for c in header if re.match(r"^GPU[0-9]+$", c)]
+
+        distances = dict()
+        for line in lines[1:]:
+            parts = line.split()
+            if not parts or not re.match(r"^GPU[0-9]+$", parts[0]):
+                continue
+
+            i = int(parts[0][3:])
+            for column, link in zip(columns, parts[1 : len(columns) + 1]):
+                j = int(column[3:])
+                if i != j:
+                    distances[(i, j)] = _parse_link(link)
+
+        return GPUTopology(distances)
+
+    @staticmethod
+    def from_nvidia_smi():
+        cp = subprocess.run(
+            ["nvidia-smi", "topo", "-m"],
+            check=True,
+            capture_output=True,
+            encoding="utf-8",
+        )
+        return GPUTopology.from_nvidia_smi_output(cp.stdout)
+
+    @staticmethod
+    def from_file(path):
+        """Read either a JSON file with groups or saved `nvidia-smi topo -m`
+        output."""
+
+        with open(path, "r") as f:
+            text = f.read()
+
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return GPUTopology.from_nvidia_smi_output(text)
+
+        if not isinstance(data, dict) or "groups" not in data:
+            raise ValueError(f"The GPU topology file {path} lacks the key 'groups'.")
+
+        return GPUTopology.from_groups(data["groups"])
+
+
+def _parse_link(link):
+    m = re.match(r"^NV([0-9]+)$", link)
+    if m:
+        # More NVLinks is better, but anything NVLink beats PCIe.
+        return 10 - min(int(m.group(1)), 9)
+
+    return _NVIDIA_SMI_DISTANCES.get(link, max(_NVIDIA_SMI_DISTANCES.values()))
@@ -7,12 +7,31 @@ import os
 class Job:
     """A job without the decorations required by the BS."""
 
-    def __init__(self, cmd, resources, cwd=None, env=None, name=None):
+    def __init__(
+        self,
+        cmd,
+        resources,
+        cwd=None,
+        env=None,
+        name=None,
+        account=None,
+        priority=0,
+        stage_in=None,
+        stage_out=None,
+        inputs=None,
+        submit_time=None,
+    ):
         self._cwd = os.path.expandvars(cwd) if cwd is not None else None
         self._cmd = cmd
         self._env = env
         self._resources = resources
         self._name = name
+        self._account = account
+        self._priority = priority
+        self._stage_in = list(stage_in) if stage_in is not None else []
+        self._stage_out = list(stage_out) if stage_out is not None else []
+        self._inputs = list(inputs) if inputs is not None else []
+        self._submit_time = submit_time
 
     @property
     def cwd(self):
@@ -32,7 +51,10 @@ class Job:
 
     @property
     def env(self):
-        """The shell environment that should be used."""
+        """The shell environment that should be used.
+
+        Either `None`, a `dict` or a `scibs.Environment`.
+        """
 
         return self._env
 
@@ -50,11 +72,97 @@ class Job:
         """
         return self._resources
 
+    @resources.setter
+    def resources(self, resources):
+        self._resources = resources
+
     @property
     def name(self):
         """Human-friendly name of the job."""
         return self._name
 
+    @property
+    def account(self):
+        """The account (or queue) the job is charged to, e.g. the user."""
+        return self._account
+
+    @property
+    def priority(self):
+        """Higher priority jobs are preferred by schedules that support it."""
+        return self._priority
+
+    @property
+    def submit_time(self):
+        """When the job was submitted, as measured by `time.monotonic`.
+
+        Schedules which age jobs, e.g. `scibs.FairShareSchedule`, use it to
+        compute how long a job has been waiting. `LocalBS.submit` sets it,
+        unless it's already set.
+        """
+        return self._submit_time
+
+    @submit_time.setter
+    def submit_time(self, submit_time):
+        self._submit_time = submit_time
+
+    @property
+    def stage_in(self):
+        """Files or directories, relative to `cwd`, the job reads.
+
+        See `scibs.StagingWrapPolicy`.
+        """
+        return self._stage_in
+
+    @property
+    def stage_out(self):
+        """Shell patterns, relative to `cwd`, of the files the job writes.
+
+        See `scibs.StagingWrapPolicy`.
+        """
+        return self._stage_out
+
+    @property
+    def inputs(self):
+        """Large files or directories, relative to `cwd`, the job reads.
+
+        See `scibs.Prefetcher`.
+        """
+        return self._inputs
+
     def relative_to_cwd(self, relative_path):
         cwd = "." if self.cwd is None else self.cwd
         return os.path.join(cwd, relative_path)
+
+
+class PythonJob(Job):
+    """A job that calls a Python function instead of running a command.
+
+    The callable and its arguments must be picklable, since the job is run in
+    a separate process, e.g.
+
+        job = scibs.PythonJob(numpy.linalg.svd, resources, args=(A,))
+
+    Currently, only `LocalBS` knows how to run these jobs.
+    """
+
+    def __init__(self, func, resources, args=None, kwargs=None, **job_kwargs):
+        super().__init__(cmd=None, resources=resources, **job_kwargs)
+
+        self._func = func
+        self._args = tuple(args) if args is not None else tuple()
+        self._kwargs = dict(kwargs) if kwargs is not None else dict()
+
+    @property
+    def func(self):
+        """The callable to be run."""
+        return self._func
+
+    @property
+    def args(self):
+        """Positional arguments passed to `func`."""
+        return self._args
+
+    @property
+    def kwargs(self):
+        """Keyword arguments passed to `func`."""
+        return self._kwargs
@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import threading
+import time
+
+_FINAL_STATES = {"COMPLETED", "FAILED"}
+
+
+class JobHandle:
+    """A job that has been submitted to a batch system.
+
+    The state is one of "PENDING", "RUNNING", "COMPLETED", "FAILED" or
+    "UNKNOWN", as reported by `backend.query_states`. The `job_id` can be
+    `None`, e.g. if the submission policy doesn't report job IDs, or if the
+    job is buffered in an LSF pack which hasn't been submitted yet.
+    """
+
+    def __init__(self, backend, job_id, submit_time=None):
+        if submit_time is None:
+            submit_time = time.time()
+
+        self.backend = backend
+        self.job_id = job_id
+        self.submit_time = submit_time
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}({self.backend.__class__.__name__}, "
+            f"job_id={self.job_id})"
+        )
+
+    def status(self):
+        if self.job_id is None:
+            return "UNKNOWN"
+
+        states = self.backend.query_states([self.job_id])
+        return states.get(self.job_id, "UNKNOWN")
+
+    def wait(self, poll_interval=30.0, timeout=None):
+        """Block until the job has completed or failed; returns its state.
+
+        Returns the current state if `timeout` seconds have passed before.
+        Raises a `RuntimeError` if the job ID isn't known, since the job could
+        never be observed to finish.
+        """
+        if self.job_id is None:
+            raise RuntimeError(f"Can't wait for {self}, its job ID isn't known.")
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            state = self.status()
+            if state in _FINAL_STATES:
+                return state
+
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                return state
+
+            time.sleep(poll_interval)
+
+    def cancel(self):
+        self.backend.cancel(self)
+
+
+class LocalJobHandle(JobHandle):
+    """A job submitted to `LocalBS`.
+
+    The state is tracked in-process. For a `PythonJob`, `future` holds the
+    return value, or exception, of the callable, see also `result`.
+    """
+
+    def __init__(self, backend, job_id, future=None, state="PENDING"):
+        super().__init__(backend, job_id)
+
+        self.future = future
+        self.returncode = None
+        self.is_cancelled = False
+
+        self._state = state
+        self._proc = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+        if state not in ["PENDING", "RUNNING"]:
+            self._done.set()
+
+    def status(self):
+        return self._state
+
+    def wait(self, poll_interval=None, timeout=None):
+        """Block until the job has completed or failed; returns its state.
+
+        NOTE: Jobs only run once the `with` block of `LocalBS` is left.
+        """
+        self._done.wait(timeout)
+        return self._state
+
+    def result(self, timeout=None):
+        """The return value of a `PythonJob`."""
+        return self.future.result(timeout)
+
+    def _set_running(self):
+        with self._lock:
+            self._state = "RUNNING"
+
+    def _attach_process(self, proc):
+        with self._lock:
+            # The process might have completed already.
+            if self._state == "RUNNING":
+                self._proc = proc
+
+    def _set_complete(self, returncode):
+        with self._lock:
+            self.returncode = returncode
+            self._state = "COMPLETED" if returncode == 0 else "FAILED"
+            self._proc = None
+
+        self._done.set()
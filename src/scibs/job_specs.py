@@ -0,0 +1,227 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+"""Declarative job specifications.
+
+A job spec describes one job, e.g. as a line of a JSON-lines file:
+
+    {"cmd": ["foo", "--bar"], "cwd": "run-1", "name": "foo-1",
+     "resources": {"type": "omp", "n_omp_threads": 4, "wall_clock": "01:00:00"},
+     "after_ok": "prepare"}
+
+or as a row of a CSV file, where the resource parameters are columns and
+`cmd` is split like a shell would:
+
+    cmd,cwd,name,resources,n_omp_threads,wall_clock,after_ok
+    foo --bar,run-1,foo-1,omp,4,01:00:00,prepare
+
+In CSV files, `env` and `cu` are JSON objects, e.g. `{"n_mpi_tasks": 1,
+"n_omp_threads": 4}`.
+
+Dependencies, `after_ok`, `after_any` or `singleton`, refer to the `name` of
+an earlier job.
+
+Specs are read lazily, one at a time, such that arbitrarily large files can
+be processed with constant memory.
+"""
+
+import csv
+import datetime
+import json
+import shlex
+
+import scibs
+
+_RESOURCE_TYPES = {
+    "cores": scibs.JustCoresResource,
+    "omp": scibs.OMPResource,
+    "mpi": scibs.MPIResource,
+    "gpus": scibs.JustGPUsResource,
+    "shared_gpu": scibs.SharedGPUResource,
+    "cu": scibs.CUResource,
+}
+
+_INT_PARAMETERS = {"n_cores", "n_omp_threads", "n_mpi_tasks", "n_gpus", "n_cus"}
+_FLOAT_PARAMETERS = {
+    "total_memory",
+    "mem_per_task",
+    "mem_per_cu",
+    "gpu_fraction",
+    "gpu_memory",
+}
+_JOB_FIELDS = {
+    "cmd",
+    "cwd",
+    "env",
+    "name",
+    "account",
+    "priority",
+    "stage_in",
+    "stage_out",
+    "inputs",
+}
+_DEPENDENCY_FIELDS = {"after_ok", "after_any", "singleton"}
+
+
+def read_job_specs(path, format=None):
+    """Yield the job specs in `path`, one `dict` at a time.
+
+    The `format` is either "jsonl" or "csv"; by default it's deduced from the
+    file extension.
+    """
+    if format is None:
+        format = "csv" if str(path).endswith(".csv") else "jsonl"
+
+    with open(path, "r", newline="") as f:
+        if format == "jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+        elif format == "csv":
+            for row in csv.DictReader(f):
+                yield csv_row_to_spec(row)
+
+        else:
+            raise ValueError(f"Unknown format: {format}")
+
+
+def csv_row_to_spec(row):
+    """Turn a (flat) CSV row into a (nested) job spec."""
+
+    row = {key: value for key, value in row.items() if value not in (None, "")}
+
+    spec = {key: row.pop(key) for key in _JOB_FIELDS | _DEPENDENCY_FIELDS if key in row}
+    spec["cmd"] = shlex.split(spec["cmd"])
+
+    if "env" in spec:
+        spec["env"] = json.loads(spec["env"])
+
+    for key in ["stage_in", "stage_out", "inputs"]:
+        if key in spec:
+            spec[key] = shlex.split(spec[key])
+
+    if "singleton" in spec:
+        spec["singleton"] = spec["singleton"].lower() in ("1", "true", "yes")
+
+    resources = {"type": row.pop("resources", "cores")}
+    resources.update(row)
+    spec["resources"] = resources
+
+    return spec
+
+
+def resources_from_spec(spec):
+    spec = dict(spec)
+    resource_type = spec.pop("type", "cores")
+
+    if resource_type not in _RESOURCE_TYPES:
+        raise ValueError(f"Unknown resource type: {resource_type}")
+
+    kwargs = dict()
+    for key, value in spec.items():
+        if key in _INT_PARAMETERS:
+            kwargs[key] = int(value)
+
+        elif key in _FLOAT_PARAMETERS:
+            kwargs[key] = float(value)
+
+        elif key == "wall_clock":
+            kwargs[key] = parse_wall_clock(value)
+
+        elif key == "cu":
+            kwargs[key] = parse_cu(value)
+
+        else:
+            raise ValueError(f"Unknown resource parameter: {key}")
+
+    return _RESOURCE_TYPES[resource_type](**kwargs)
+
+
+def job_from_spec(spec):
+    unknown = set(spec) - _JOB_FIELDS - _DEPENDENCY_FIELDS - {"resources"}
+    if unknown:
+        raise ValueError(f"Unknown fields in job spec: {sorted(unknown)}")
+
+    cmd = spec["cmd"]
+    if isinstance(cmd, str):
+        cmd = shlex.split(cmd)
+
+    return scibs.Job(
+        cmd,
+        resources_from_spec(spec.get("resources", {})),
+        cwd=spec.get("cwd"),
+        env=spec.get("env"),
+        name=spec.get("name"),
+        account=spec.get("account"),
+        priority=int(spec.get("priority", 0)),
+        stage_in=spec.get("stage_in"),
+        stage_out=spec.get("stage_out"),
+        inputs=spec.get("inputs"),
+    )
+
+
+def dependency_from_spec(spec, job_ids):
+    """The dependency of the spec, if any.
+
+    Dependencies refer to jobs by name, `job_ids` maps the names of already
+    submitted jobs to their job IDs.
+    """
+    if spec.get("singleton"):
+        return scibs.Singleton()
+
+    for key, dependency_type in [
+        ("after_ok", scibs.AfterOK),
+        ("after_any", scibs.AfterAny),
+    ]:
+        if key in spec:
+            name = spec[key]
+            if job_ids.get(name) is None:
+                raise ValueError(f"The job '{name}' hasn't been submitted (yet).")
+
+            return dependency_type(job_ids[name])
+
+    return None
+
+
+def has_dependency(spec):
+    return any(spec.get(key) for key in _DEPENDENCY_FIELDS)
+
+
+def parse_cu(value):
+    """The `CU` described by a dict, or a JSON object, of its parameters."""
+
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid CU, expected a JSON object: {value!r}") from e
+
+    if not isinstance(value, dict):
+        raise ValueError(f"Invalid CU, expected an object: {value!r}")
+
+    unknown = set(value) - {"n_mpi_tasks", "n_omp_threads", "n_gpus"}
+    if unknown:
+        raise ValueError(f"Unknown CU parameters: {sorted(unknown)}")
+
+    return scibs.CU(**{key: int(n) for key, n in value.items()})
+
+
+def parse_wall_clock(value):
+    """Either seconds or `[DD-]HH:MM[:SS]`."""
+
+    if isinstance(value, (int, float)):
+        return datetime.timedelta(seconds=value)
+
+    days = 0
+    if "-" in value:
+        days, value = value.split("-")
+
+    parts = [int(p) for p in value.split(":")]
+    if len(parts) == 1:
+        return datetime.timedelta(days=int(days), seconds=parts[0])
+
+    hours, minutes, seconds = (parts + [0])[:3]
+    return datetime.timedelta(
+        days=int(days), hours=hours, minutes=minutes, seconds=seconds
+    )
@@ -0,0 +1,197 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import hashlib
+import json
+import os
+import pickle
+import time
+
+
+class Journal:
+    """An append-only record of what happened to each job.
+
+    The journal is a JSON-lines file. Every line is one event, e.g.
+
+        {"event": "submit", "key": "3f2a...-0", "job_id": 408469, "time": ...}
+
+    The events are `submit`, `start`, `complete` and `adopt`. Lines are flushed
+    immediately, but only `fsync`ed every `fsync_every` events or
+    `fsync_interval` seconds, whichever comes first. Hence a machine crash
+    can lose the last few events; a crash of the Python driver can't.
+
+    Jobs are identified by a key derived from their command, working directory,
+    environment and name. Submitting the same job multiple times is fine, the
+    n-th submission of a job gets the same key each time the driver is run.
+
+    When the driver is restarted, the journal is read back and the batch
+    systems use it to skip jobs that have already been dealt with, see
+    `resume` of the batch systems.
+    """
+
+    def __init__(self, path, fsync_every=64, fsync_interval=1.0):
+        self._path = path
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+
+        self._state = _read_journal(path) if os.path.exists(path) else dict()
+        self._occurrences = dict()
+        self._adopted = set()
+
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0 and not _ends_with_newline(path):
+            # Don't glue the next event onto a torn write.
+            self._file.write("\n")
+
+        self._n_unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    @property
+    def path(self):
+        return self._path
+
+    def key(self, job):
+        """The key used to identify the next submission of `job`."""
+
+        digest = _job_digest(job)
+        n = self._occurrences.get(digest, 0)
+        self._occurrences[digest] = n + 1
+
+        return f"{digest}-{n}"
+
+    def record(self, event, key, **fields):
+        """Append an event to the journal."""
+
+        entry = {"event": event, "key": key, "time": time.time(), **fields}
+
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+        self._state[key] = entry
+        self._n_unsynced += 1
+
+        now = time.monotonic()
+        is_due = now - self._last_fsync >= self._fsync_interval
+        if self._n_unsynced >= self._fsync_every or is_due:
+            self.sync()
+
+    def sync(self):
+        """Force everything recorded so far to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._n_unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def last_event(self, key):
+        """The most recent event recorded for `key`, or `None`."""
+        return self._state.get(key)
+
+    def is_finished(self, key):
+        """Did the job complete successfully in a previous run?"""
+
+        entry = self._state.get(key)
+        return (
+            entry is not None
+            and entry["event"] == "complete"
+            and entry.get("returncode") == 0
+        )
+
+    def is_done(self, key):
+        """Must the job with `key` be skipped?
+
+        This is the case if it either finished successfully or has been
+        re-adopted by `reconcile`.
+        """
+        return key in self._adopted or self.is_finished(key)
+
+    def submitted_job_ids(self):
+        """Maps the key of every job that was submitted to a batch system to
+        its job ID."""
+
+        return {
+            key: entry["job_id"]
+            for key, entry in self._state.items()
+            if entry["event"] in ["submit", "adopt"] and entry.get("job_id") is not None
+        }
+
+    def reconcile(self, query_states):
+        """Re-adopt jobs the batch system still knows about.
+
+        Args:
+            query_states: Callable which accepts a list of job IDs and returns
+                          a `dict` mapping those IDs to one of "PENDING",
+                          "RUNNING", "COMPLETED", "FAILED" or "UNKNOWN".
+
+        Jobs which are pending, running or completed are adopted, i.e. they
+        won't be submitted again. Everything else is redone.
+
+        Raises a `RuntimeError` if jobs were submitted, but none of them with a
+        known job ID, since they would all be submitted again.
+        """
+
+        job_ids = self.submitted_job_ids()
+        if not job_ids:
+            if any(entry["event"] == "submit" for entry in self._state.values()):
+                raise RuntimeError(
+                    "The journal doesn't contain any job IDs; resuming requires a"
+                    " submission policy that reports them."
+                )
+
+            return
+
+        states = query_states(list(job_ids.values()))
+
+        for key, job_id in job_ids.items():
+            if states.get(job_id) in ["PENDING", "RUNNING", "COMPLETED"]:
+                self._adopted.add(key)
+                self.record("adopt", key, job_id=job_id, state=states[job_id])
+
+
+def _job_digest(job):
+    env = None if job.env is None else sorted(dict(job.env).items())
+
+    if job.cmd is not None:
+        blob = json.dumps([list(job.cmd), job.cwd, job.name, env]).encode("utf-8")
+    else:
+        # A `PythonJob`. The `repr` of the arguments isn't good enough, e.g.
+        # large numpy arrays are abbreviated.
+        func = job.func
+        what = [f"{func.__module__}.{func.__qualname__}", job.cwd, job.name, env]
+        blob = json.dumps(what).encode("utf-8") + pickle.dumps(
+            (job.args, sorted(job.kwargs.items()))
+        )
+
+    return hashlib.sha1(blob).hexdigest()
+
+
+def _read_journal(path):
+    state = dict()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn write at the very end of the journal.
+                continue
+
+            state[entry["key"]] = entry
+
+    return state
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
@@ -0,0 +1,477 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import itertools
+import logging
+import os
+import re
+import resource
+import signal
+import subprocess
+import threading
+
+import scibs
+
+logger = logging.getLogger(__name__)
+
+
+class LaunchPolicy:
+    """Start the process of a job on the local machine.
+
+    Launch policies are used by `LocalBS` to turn a job into a running
+    process. They return an object with a `pid` and a blocking `wait()`, which
+    returns the exit code, e.g. a `subprocess.Popen`.
+
+    The process must be started in a new session, i.e. its own process group,
+    such that the job can be cancelled including all its children.
+
+    `LocalBS` enters the policy before launching the first job and exits it
+    once all jobs have finished, which gives it the chance to clean up.
+    """
+
+    def __call__(self, job, wrap_policy, stdout, stderr):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `__call__`."
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class ShellLaunchPolicy(LaunchPolicy):
+    """Runs `wrap_policy(job)` through `/bin/sh`."""
+
+    def __call__(self, job, wrap_policy, stdout, stderr):
+        cmd = wrap_policy(job)
+
+        return subprocess.Popen(
+            cmd,
+            cwd=job.cwd,
+            stdout=stdout,
+            stderr=stderr,
+            env=scibs.environment.materialize(job.env),
+            shell=True,
+            start_new_session=True,
+        )
+
+
+class SpawnLaunchPolicy(LaunchPolicy):
+    """Launch jobs without going through a shell.
+
+    The command is obtained from `wrap_policy.argv(job)` and is executed
+    directly, which avoids the cost of starting `/bin/sh` for every job and
+    passes arguments containing spaces unchanged.
+
+    If the job doesn't specify a `cwd`, the process is created with
+    `os.posix_spawnp`. Since `posix_spawn` can't change the working directory,
+    jobs with a `cwd` use `subprocess.Popen` without a shell, which CPython
+    implements with `vfork` where possible.
+
+    Commands that genuinely need a shell, see `needs_shell`, are run by the
+    `fallback` launch policy.
+    """
+
+    _shell_syntax = re.compile(r"[$;|&<>`*?()~!{}\n]")
+    _shell_expansion = re.compile(r"[$`]")
+    _shell_operators = {";", "|", "||", "&", "&&", "<", ">", ">>", "2>", "2>&1"}
+
+    def __init__(self, fallback=None):
+        if fallback is None:
+            fallback = ShellLaunchPolicy()
+
+        self._fallback = fallback
+
+    def __enter__(self):
+        self._fallback.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        self._fallback.__exit__(*args)
+
+    def __call__(self, job, wrap_policy, stdout, stderr):
+        if self.needs_shell(job):
+            return self._fallback(job, wrap_policy, stdout, stderr)
+
+        argv, env_delta = wrap_policy.argv(job)
+        env = _apply_env_delta(job.env, env_delta)
+
+        if job.cwd is None:
+            file_actions = [
+                (os.POSIX_SPAWN_DUP2, stdout.fileno(), 1),
+                (os.POSIX_SPAWN_DUP2, stderr.fileno(), 2),
+            ]
+            pid = os.posix_spawnp(
+                argv[0], argv, env, file_actions=file_actions, setsid=True
+            )
+            return SpawnedProcess(pid)
+
+        return subprocess.Popen(
+            argv,
+            cwd=job.cwd,
+            stdout=stdout,
+            stderr=stderr,
+            env=env,
+            start_new_session=True,
+        )
+
+    def needs_shell(self, job):
+        """Does `job.cmd` rely on the shell to be interpreted correctly?
+
+        A command consisting of a single string with spaces or shell syntax,
+        e.g. `["ls -l"]`, is assumed to be meant for the shell. So are commands
+        with parts that need expanding, e.g. `"${HOME}"`, or parts which are
+        shell operators, e.g. `">"` or `"&&"`.
+        """
+        cmd = job.cmd
+
+        if len(cmd) == 1:
+            c = cmd[0]
+            return len(c.split()) > 1 or bool(self._shell_syntax.search(c))
+
+        return any(
+            c in self._shell_operators or self._shell_expansion.search(c) for c in cmd
+        )
+
+
+class LimitedLaunchPolicy(LaunchPolicy):
+    """Enforce the resources a job asked for.
+
+    Otherwise nothing prevents a job that asked for two cores from starting 64
+    threads, or a job that asked for 4 GB from allocating 100 GB.
+
+    If cgroups v2 are delegated to us, each job is placed in a transient
+    cgroup below `cgroup_root` with `cpu.max` and `memory.max` derived from
+    its resources. Jobs killed by the OOM killer are reported in `cerr` and
+    logged, and the returned process has `oom_killed` set.
+
+    By default, the job cgroups are created in the driver's own cgroup. Since
+    cgroups v2 only allow enabling controllers in cgroups without processes,
+    the driver first moves itself into the leaf cgroup `scibs-<pid>-driver`.
+    This happens when the first job is launched. If the driver shares its
+    cgroup with other processes, e.g. the shell that started it, it's moved
+    back and rlimits are used instead. Leaving the policy, e.g. when `LocalBS`
+    has run all jobs, moves the driver back and removes its leaf.
+
+    Otherwise, the job is limited with `RLIMIT_AS` and pinned to as many cores
+    as it asked for. Note that `RLIMIT_AS` limits virtual memory, i.e. it's
+    stricter than the amount of RAM actually used.
+
+    The limits are applied by the driver, while the job's shell waits for them
+    to be in place. No Python code runs in the child between `fork` and
+    `exec`, which isn't safe in multi-threaded programs like `LocalBS`.
+
+    Like `ShellLaunchPolicy`, the command is run through `/bin/sh`.
+    """
+
+    def __init__(self, cgroup_root=None, use_cgroups=True):
+        self._use_cgroups = use_cgroups
+        self._requested_cgroup_root = cgroup_root if use_cgroups else None
+        self._cgroup_root = self._requested_cgroup_root
+        self._needs_setup = use_cgroups
+        self._is_delegated = False
+        self._counter = itertools.count()
+
+        self._lock = threading.Lock()
+        self._free_cpus = sorted(os.sched_getaffinity(0))
+
+    @property
+    def uses_cgroups(self):
+        return self._setup_cgroups() is not None
+
+    def __exit__(self, *args):
+        # Leave the driver's cgroup as it was, the next run delegates it again.
+        with self._lock:
+            if self._is_delegated:
+                _restore_own_cgroup(self._cgroup_root)
+
+            self._cgroup_root = self._requested_cgroup_root
+            self._needs_setup = self._use_cgroups
+            self._is_delegated = False
+
+    def __call__(self, job, wrap_policy, stdout, stderr):
+        # The shell stops itself until the limits have been applied.
+        cmd = f"kill -STOP $$; {wrap_policy(job)}"
+        demand = scibs.resource_demand(job.resources)
+
+        if self._setup_cgroups() is not None:
+            cgroup = self._make_cgroup(demand)
+            limit = lambda pid: _write(cgroup, "cgroup.procs", str(pid))
+            release = lambda: _remove_cgroup(cgroup)
+
+        else:
+            cgroup = None
+            cpus = self._acquire_cpus(demand["cores"])
+            limit = lambda pid: _set_rlimits(pid, demand["memory"], cpus)
+            release = lambda: self._release_cpus(cpus)
+
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                cwd=job.cwd,
+                stdout=stdout,
+                stderr=stderr,
+                env=scibs.environment.materialize(job.env),
+                shell=True,
+                start_new_session=True,
+            )
+        except BaseException:
+            release()
+            raise
+
+        try:
+            if _wait_until_stopped(proc):
+                limit(proc.pid)
+                os.kill(proc.pid, signal.SIGCONT)
+
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            release()
+            raise
+
+        return LimitedProcess(proc, cgroup, stderr, release)
+
+    def _setup_cgroups(self):
+        with self._lock:
+            if self._needs_setup:
+                self._needs_setup = False
+
+                if self._cgroup_root is None:
+                    self._cgroup_root = _delegate_own_cgroup()
+                    self._is_delegated = self._cgroup_root is not None
+
+                elif not _enable_controllers(self._cgroup_root):
+                    self._cgroup_root = None
+
+                if self._cgroup_root is None:
+                    logger.info("cgroups v2 aren't delegated, falling back to rlimits.")
+
+            return self._cgroup_root
+
+    def _make_cgroup(self, demand):
+        name = f"scibs-{os.getpid()}-{next(self._counter)}"
+        cgroup = os.path.join(self._cgroup_root, name)
+        os.mkdir(cgroup)
+
+        period = 100000
+        _write(cgroup, "cpu.max", f"{int(demand['cores'] * period)} {period}")
+
+        if demand["memory"]:
+            _write(cgroup, "memory.max", str(int(demand["memory"])))
+            _write(cgroup, "memory.swap.max", "0", missing_ok=True)
+
+        return cgroup
+
+    def _acquire_cpus(self, n_cores):
+        with self._lock:
+            if len(self._free_cpus) < n_cores:
+                # Oversubscribed, e.g. by a custom `LocalResources`. Don't pin.
+                return None
+
+            cpus = self._free_cpus[:n_cores]
+            del self._free_cpus[:n_cores]
+            return cpus
+
+    def _release_cpus(self, cpus):
+        if cpus is not None:
+            with self._lock:
+                self._free_cpus = sorted(self._free_cpus + cpus)
+
+
+def _wait_until_stopped(proc):
+    """Wait until the shell of `proc` has stopped itself.
+
+    Returns `False` if it exited instead, e.g. because it was killed.
+    """
+    _, status = os.waitpid(proc.pid, os.WUNTRACED)
+    if os.WIFSTOPPED(status):
+        return True
+
+    # The status has been reaped, `Popen.wait` can't obtain it anymore.
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return False
+
+
+class LimitedProcess:
+    """The process of a job launched by `LimitedLaunchPolicy`."""
+
+    def __init__(self, proc, cgroup, stderr, release):
+        self._proc = proc
+        self._cgroup = cgroup
+        self._stderr = stderr
+        self._release = release
+
+        self.pid = proc.pid
+        self.returncode = None
+        self.oom_killed = False
+
+    def wait(self):
+        if self.returncode is not None:
+            return self.returncode
+
+        self.returncode = self._proc.wait()
+
+        if self._cgroup is not None:
+            self.oom_killed = _count_oom_kills(self._cgroup) > 0
+
+        if self.oom_killed:
+            message = f"Killed by the OOM killer (pid {self.pid})."
+            logger.warning(message)
+            print(f"scibs: {message}", file=self._stderr, flush=True)
+
+        self._release()
+        return self.returncode
+
+
+def _own_cgroup():
+    try:
+        with open("/proc/self/cgroup", "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+
+    for line in lines:
+        if line.startswith("0::"):
+            return os.path.join("/sys/fs/cgroup", line[3:].lstrip("/"))
+
+    return None
+
+
+def _delegate_own_cgroup():
+    """Prepare the driver's own cgroup to hold the cgroups of the jobs.
+
+    Returns the cgroup, or `None` if that's not possible.
+    """
+    cgroup = _own_cgroup()
+    if cgroup is None:
+        return None
+
+    try:
+        with open(os.path.join(cgroup, "cgroup.controllers"), "r") as f:
+            controllers = f.read().split()
+    except OSError:
+        return None
+
+    if "cpu" not in controllers or "memory" not in controllers:
+        return None
+
+    # Only cgroups without processes may enable controllers for their
+    # children. Hence, the driver moves into a leaf first.
+    leaf = _driver_cgroup(cgroup)
+    try:
+        os.mkdir(leaf)
+        _write(leaf, "cgroup.procs", str(os.getpid()))
+    except OSError:
+        _remove_cgroup(leaf, missing_ok=True)
+        return None
+
+    if _enable_controllers(cgroup):
+        return cgroup
+
+    # Other processes share the cgroup, e.g. the shell that started the
+    # driver. Leave everything as it was.
+    try:
+        _write(cgroup, "cgroup.procs", str(os.getpid()))
+    except OSError:
+        return None
+
+    _remove_cgroup(leaf)
+    return None
+
+
+def _restore_own_cgroup(cgroup):
+    """Undo `_delegate_own_cgroup`, i.e. move the driver back into `cgroup`."""
+
+    # Processes may only live in cgroups that don't control their children.
+    try:
+        _write(cgroup, "cgroup.subtree_control", "-cpu -memory")
+        _write(cgroup, "cgroup.procs", str(os.getpid()))
+    except OSError:
+        logger.warning(f"Failed to move the driver back into the cgroup {cgroup}.")
+        return
+
+    _remove_cgroup(_driver_cgroup(cgroup))
+
+
+def _driver_cgroup(cgroup):
+    return os.path.join(cgroup, f"scibs-{os.getpid()}-driver")
+
+
+def _enable_controllers(cgroup_root):
+    try:
+        _write(cgroup_root, "cgroup.subtree_control", "+cpu +memory")
+        with open(os.path.join(cgroup_root, "cgroup.subtree_control"), "r") as f:
+            controllers = f.read().split()
+
+    except OSError:
+        return False
+
+    return "cpu" in controllers and "memory" in controllers
+
+
+def _write(cgroup, filename, value, missing_ok=False):
+    try:
+        with open(os.path.join(cgroup, filename), "w") as f:
+            f.write(value)
+
+    except FileNotFoundError:
+        if not missing_ok:
+            raise
+
+
+def _remove_cgroup(cgroup, missing_ok=False):
+    try:
+        os.rmdir(cgroup)
+    except FileNotFoundError:
+        if not missing_ok:
+            logger.warning(f"The cgroup {cgroup} has disappeared.")
+    except OSError:
+        # Some descendant of the job is still alive.
+        logger.warning(f"Failed to remove the cgroup {cgroup}.")
+
+
+def _count_oom_kills(cgroup):
+    try:
+        with open(os.path.join(cgroup, "memory.events"), "r") as f:
+            for line in f:
+                key, value = line.split()
+                if key == "oom_kill":
+                    return int(value)
+
+    except OSError:
+        pass
+
+    return 0
+
+
+def _set_rlimits(pid, memory, cpus):
+    if memory:
+        resource.prlimit(pid, resource.RLIMIT_AS, (int(memory), int(memory)))
+
+    if cpus is not None:
+        os.sched_setaffinity(pid, cpus)
+
+
+class SpawnedProcess:
+    """The minimal `Popen` interface for processes created by `posix_spawn`."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def wait(self):
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self.returncode = os.waitstatus_to_exitcode(status)
+
+        return self.returncode
+
+
+def _apply_env_delta(env, env_delta):
+    env = scibs.Environment.on_top_of(env)
+    env.update_delta(env_delta)
+
+    return env.materialize()
@@ -1,12 +1,21 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import concurrent.futures
+import functools
+import itertools
+import logging
+import multiprocessing
 import os
-import subprocess
-import datetime
+import queue
+import signal
+import threading
+import time
 
 import scibs
 
+logger = logging.getLogger(__name__)
+
 
 class LocalBS(scibs.SciBS):
     """An ad hoc local batch system for when no batch system is present.
@@ -15,27 +24,80 @@ class LocalBS(scibs.SciBS):
     be run on the same computer. If there are sufficient resources available,
     multiple jobs will be run in parallel.
 
+    The order in which jobs are run is decided by the `schedule`, a callable
+    `schedule(jobs, local_resources)` returning a `scibs.Schedule`, e.g.
+
+        functools.partial(scibs.FairShareSchedule, shares={"alice": 2})
+
+    By default, `scibs.GreedySchedule` is used. For very many jobs, see
+    `submit_all` and `scibs.LookaheadSchedule`.
+
+    On shared machines, pass an `admission_policy`, e.g.
+    `scibs.PressureAdmissionPolicy()`, to hold back jobs while the machine is
+    busy with other work.
+
+    To stop once jobs start failing, pass a `failure_policy`, e.g.
+    `scibs.FailFastPolicy(max_failures=3)`.
+
+    Jobs which read large `inputs` benefit from a `scibs.Prefetcher`.
+
     NOTE: This will, in the simplest case, run
              subprocess.run(" ".join(job.cmd), shell=True, check=False)
 
-          The important thing to observe is the `shell=True` part.
+          The important thing to observe is the `shell=True` part. Pass
+          `launch_policy=scibs.SpawnLaunchPolicy()` to avoid the shell.
 
+    NOTE: A `PythonJob` is run in a pool of warm Python processes instead. It
+          shares the resources, and therefore the core budget, with all other
+          jobs.
     """
 
-    def __init__(self, wrap_policy=None, resource_policy=None, local_resources=None):
+    def __init__(
+        self,
+        wrap_policy=None,
+        resource_policy=None,
+        local_resources=None,
+        launch_policy=None,
+        journal=None,
+        schedule=None,
+        admission_policy=None,
+        failure_policy=None,
+        prefetcher=None,
+    ):
         if wrap_policy is None:
             wrap_policy = scibs.DefaultWrapPolicy()
 
         if resource_policy is None:
             resource_policy = scibs.DefaultResourcePolicy()
 
+        if launch_policy is None:
+            launch_policy = scibs.ShellLaunchPolicy()
+
+        if schedule is None:
+            schedule = scibs.GreedySchedule
+
         self._local_resources = local_resources
         self._wrap_policy = wrap_policy
         self._resource_policy = resource_policy
+        self._launch_policy = launch_policy
+        self._journal = journal
+        self._schedule = schedule
+        self._admission_policy = admission_policy
+        self._failure_policy = failure_policy
+        self._prefetcher = prefetcher
+        self._is_resuming = False
         self._context = None
 
     def __enter__(self):
-        self._context = {"jobs": []}
+        self._context = {
+            "jobs": [],
+            "streams": [],
+            "handles": {},
+            "keys": {},
+            "running": {},
+            "job_ids": itertools.count(),
+            "is_cancelled": False,
+        }
         return self
 
     def __exit__(self, *args):
@@ -43,8 +105,97 @@ class LocalBS(scibs.SciBS):
         self._context = None
 
     def submit(self, job):
+        """Add `job` to the jobs to be run; returns a `scibs.LocalJobHandle`.
+
+        For a `PythonJob` the handle holds the return value (or exception) of
+        the callable, once the `with` block has been left, see `result`.
+        """
         self._ensure_with_context()
+
+        handle = self._register(job)
+        if handle is None:
+            return scibs.LocalJobHandle(self, None, state="COMPLETED")
+
+        if job.submit_time is None:
+            job.submit_time = time.monotonic()
+
         self._context["jobs"].append(job)
+        return handle
+
+    def submit_all(self, jobs):
+        """Add all jobs of the iterable `jobs` to the jobs to be run.
+
+        The iterable is only consumed while the jobs are being run, after all
+        jobs passed to `submit`. Combined with a schedule that consumes its
+        jobs lazily, e.g. `scibs.LookaheadSchedule`, arbitrarily many jobs can
+        be run with bounded memory.
+
+        Since nothing is returned, the results of a `PythonJob` are lost.
+        """
+        self._ensure_with_context()
+        self._context["streams"].append(jobs)
+
+    def cancel(self, handle):
+        """Cancel the job of `handle`.
+
+        Pending jobs won't be started. Running command jobs are terminated,
+        including all their child processes; a running `PythonJob` can't be
+        cancelled.
+        """
+        with handle._lock:
+            if handle._state == "PENDING":
+                handle.is_cancelled = True
+                if handle.future is not None:
+                    handle.future.cancel()
+
+            elif handle._state == "RUNNING" and handle._proc is not None:
+                handle.is_cancelled = True
+                _kill_process_group(handle._proc)
+
+    def cancel_all(self, running=True):
+        """Cancel all pending jobs and, if `running`, also the running jobs.
+
+        Jobs from `submit_all` that haven't been taken from the iterable yet,
+        won't be.
+        """
+        self._ensure_with_context()
+        self._context["is_cancelled"] = True
+
+        # Copying builtin containers doesn't release the GIL. Hence, this is
+        # safe, even if the jobs are being launched concurrently.
+        pending = list(self._context["handles"].values())
+        for handle in itertools.chain.from_iterable(list(h) for h in pending):
+            self.cancel(handle)
+
+        if running:
+            for handle in list(self._context["running"].values()):
+                self.cancel(handle)
+
+    def _register(self, job):
+        # Returns `None` if the job should be skipped.
+        if self._journal is not None:
+            key = self._journal.key(job)
+            if self._is_resuming and self._journal.is_finished(key):
+                return None
+
+            self._context["keys"].setdefault(id(job), []).append(key)
+
+        future = None
+        if isinstance(job, scibs.PythonJob):
+            future = concurrent.futures.Future()
+
+        handle = scibs.LocalJobHandle(self, next(self._context["job_ids"]), future)
+        self._context["handles"].setdefault(id(job), []).append(handle)
+
+        return handle
+
+    def _stream(self, jobs):
+        for job in jobs:
+            if self._context["is_cancelled"]:
+                return
+
+            if self._register(job) is not None:
+                yield job
 
     def _ensure_with_context(self):
         if self._context is None:
@@ -57,69 +208,342 @@ class LocalBS(scibs.SciBS):
             #        local_bs.submit(...)
             raise RuntimeError(f"{__class__} is missing context.")
 
+    def resume(self):
+        """Skip jobs which completed successfully according to the journal.
+
+        Jobs that were started but didn't complete, e.g. because the driver
+        was killed, are run again.
+        """
+        if self._journal is None:
+            raise RuntimeError("Resuming requires a journal.")
+
+        self._is_resuming = True
+
     def _run_all(self):
         self._ensure_with_context()
 
-        job_schedule = scibs.GreedySchedule(
-            self._context["jobs"], self._local_resources
+        if self._local_resources is None:
+            self._local_resources = scibs.LocalResources()
+
+        jobs = self._context["jobs"]
+        streams = self._context["streams"]
+        if streams:
+            jobs = itertools.chain(jobs, *(self._stream(s) for s in streams))
+
+        job_schedule = self._schedule(jobs, self._local_resources)
+
+        has_python_jobs = any(
+            isinstance(job, scibs.PythonJob) for job in self._context["jobs"]
         )
-        _schedule_jobs(self._wrap_policy, self._resource_policy, job_schedule)
 
+        pool = None
+        if has_python_jobs or streams:
+            pool = _make_process_pool(self._local_resources)
 
-def _launch_job(wrap_policy, resource_policy, scheduled_job):
-    job_id, job, acquired_resources = scheduled_job
+        try:
+            launch = functools.partial(
+                _launch_job,
+                self._launch_policy,
+                self._wrap_policy,
+                self._resource_policy,
+                pool,
+                self._context["handles"],
+                self._context["running"],
+            )
 
-    resource_policy(job, acquired_resources)
-    cmd = wrap_policy(job)
+            on_complete = None
+            if self._journal is not None:
+                launch, on_complete = _journaled(
+                    self._journal, self._context["keys"], launch
+                )
 
-    stdout = open(job.relative_to_cwd("cout"), "w")
-    stderr = open(job.relative_to_cwd("cerr"), "w")
+            on_complete = self._with_failure_policy(on_complete)
+
+            self._launch_policy.__enter__()
+
+            if self._prefetcher is not None:
+                self._prefetcher.__enter__()
+                launch = _prefetching(self._prefetcher, job_schedule, launch)
+
+            try:
+                _schedule_jobs(
+                    launch, job_schedule, on_complete, self._admission_policy
+                )
+
+            except KeyboardInterrupt:
+                # The jobs run in their own sessions and don't see the Ctrl-C.
+                self.cancel_all()
+                raise
+
+        finally:
+            if self._prefetcher is not None:
+                self._prefetcher.__exit__(None, None, None)
+
+            self._launch_policy.__exit__(None, None, None)
+
+            if pool is not None:
+                pool.shutdown()
+
+    def _with_failure_policy(self, on_complete):
+        running = self._context["running"]
+        failure_policy = self._failure_policy
+
+        def _on_complete(job_id, returncode):
+            handle = running.pop(job_id)
+
+            if on_complete is not None:
+                on_complete(job_id, returncode)
+
+            if failure_policy is None or handle.is_cancelled:
+                return
+
+            action = failure_policy(returncode != 0)
+            if action is not None and not self._context["is_cancelled"]:
+                logger.warning(f"Too many jobs failed, {action.replace('_', ' ')}.")
+                self.cancel_all(running=action == "cancel_all")
+
+        return _on_complete
+
+
+def _prefetching(prefetcher, job_schedule, launch):
+    prefetcher(job_schedule.upcoming(prefetcher.lookahead))
+
+    def _launch(scheduled_job, on_completion):
+        launch(scheduled_job, on_completion)
+        prefetcher(job_schedule.upcoming(prefetcher.lookahead))
+
+    return _launch
+
+
+def _kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # Already gone.
+        pass
 
-    proc = subprocess.Popen(
-        cmd, cwd=job.cwd, stdout=stdout, stderr=stderr, env=job.env, shell=True
+
+def _make_process_pool(local_resources):
+    # The pool is sized such that every core could run a Python job. The
+    # `Schedule` makes sure that jobs only run if there are sufficient
+    # resources, i.e. the core budget is shared with the shell jobs.
+    n_workers = getattr(local_resources, "available_cores", None)
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("forkserver")
+    else:
+        mp_context = None
+
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max(1, n_workers), mp_context=mp_context
     )
 
-    return proc, [stdout, stderr]
 
+def _journaled(journal, keys, launch):
+    running_keys = dict()
+
+    def _launch(scheduled_job, on_completion):
+        job_id, job, _ = scheduled_job
+
+        key = _pop_first(keys, id(job))
+        running_keys[job_id] = key
+        journal.record("start", key)
+
+        launch(scheduled_job, on_completion)
+
+    def _on_complete(job_id, returncode):
+        key = running_keys.pop(job_id)
+        journal.record("complete", key, returncode=returncode)
+
+    return _launch, _on_complete
+
+
+def _call_python_job(cwd, env, func, args, kwargs):
+    # Runs inside the pool worker. Workers are reused, hence everything
+    # that's changed needs to be restored.
+    old_cwd = os.getcwd()
+    old_env = dict(os.environ)
+
+    try:
+        if cwd is not None:
+            os.chdir(cwd)
+
+        if env is not None:
+            os.environ.clear()
+            os.environ.update(env)
+
+        return func(*args, **kwargs)
+
+    finally:
+        os.chdir(old_cwd)
+        os.environ.clear()
+        os.environ.update(old_env)
+
+
+def _launch_python_job(pool, future, job, on_completion):
+    if not future.set_running_or_notify_cancel():
+        # Cancelled through `future.cancel()`, still releases the resources.
+        on_completion(-signal.SIGTERM)
+        return
+
+    def _done(pool_future):
+        returncode = 1
+        try:
+            if pool_future.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+
+            elif pool_future.exception() is not None:
+                future.set_exception(pool_future.exception())
+
+            else:
+                future.set_result(pool_future.result())
+                returncode = 0
+
+        finally:
+            on_completion(returncode)
+
+    try:
+        pool_future = pool.submit(
+            _call_python_job,
+            job.cwd,
+            scibs.environment.materialize(job.env),
+            job.func,
+            job.args,
+            job.kwargs,
+        )
+
+    except Exception as e:
+        # E.g. a broken pool, the job fails.
+        future.set_exception(e)
+        on_completion(1)
+        return
+
+    pool_future.add_done_callback(_done)
+
+
+def _launch_command_job(launch_policy, wrap_policy, job, on_completion):
+    stdout = open(job.relative_to_cwd("cout"), "w")
+    stderr = open(job.relative_to_cwd("cerr"), "w")
 
-def _schedule_jobs(wrap_policy, resource_policy, job_schedule):
-    pending = {}
-    processes = {}
+    proc = launch_policy(job, wrap_policy, stdout, stderr)
 
     def _wait():
-        pid, _ = os.wait()
-        assert pid in pending, "`os.wait` returned a PID that's not ours."
+        returncode = proc.wait()
 
-        job_id = pending.pop(pid)
-        proc, files = processes.pop(pid)
+        stdout.close()
+        stderr.close()
 
-        assert proc.pid == pid
+        on_completion(returncode)
 
-        for f in files:
-            f.close()
+    threading.Thread(target=_wait, daemon=True).start()
+    return proc
 
+
+def _launch_job(
+    launch_policy,
+    wrap_policy,
+    resource_policy,
+    pool,
+    handles,
+    running,
+    scheduled_job,
+    on_completion,
+):
+    job_id, job, acquired_resources = scheduled_job
+    handle = _pop_first(handles, id(job))
+    running[job_id] = handle
+
+    def _on_completion(returncode):
+        handle._set_complete(returncode)
+        on_completion(returncode)
+
+    if handle.is_cancelled:
+        # Still goes through `on_completion` to release the resources.
+        _on_completion(-signal.SIGTERM)
+        return
+
+    resource_policy(job, acquired_resources)
+
+    handle._set_running()
+
+    if isinstance(job, scibs.PythonJob):
+        _launch_python_job(pool, handle.future, job, _on_completion)
+
+    else:
+        proc = _launch_command_job(launch_policy, wrap_policy, job, _on_completion)
+        handle._attach_process(proc)
+
+
+def _pop_first(lists, key):
+    # Empty lists are removed, such that streamed jobs don't leak memory.
+    values = lists[key]
+    value = values.pop(0)
+    if not values:
+        del lists[key]
+
+    return value
+
+
+def _put_completion(completions, job_id, returncode):
+    completions.put((job_id, returncode))
+
+
+def _schedule_jobs(launch, job_schedule, on_complete=None, admission_policy=None):
+    """Run all jobs of `job_schedule`.
+
+    The callable `launch(scheduled_job, on_completion)` must start the job and
+    arrange for `on_completion(returncode)` to be called once the job has
+    finished. It may be called from any thread.
+
+    The optional `on_complete(job_id, returncode)` is called from this thread
+    whenever a job has completed.
+
+    If the `admission_policy` holds, no further jobs are launched until it
+    admits jobs again. It's told how many cores the running jobs use.
+    """
+    completions = queue.Queue()
+    n_running = 0
+
+    # The cores used by the running jobs, per job.
+    own_cores = dict()
+
+    def _wait(timeout=None):
+        nonlocal n_running
+
+        try:
+            job_id, returncode = completions.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        n_running -= 1
+        own_cores.pop(job_id)
         job_schedule.complete(job_id)
 
+        if on_complete is not None:
+            on_complete(job_id, returncode)
+
     while not job_schedule.empty():
+        if admission_policy is not None:
+            if admission_policy(sum(own_cores.values())) is not None:
+                _wait(timeout=admission_policy.poll_interval)
+                continue
+
         next_job = job_schedule.next_job()
 
         assert (
-            next_job or pending
+            next_job or n_running
         ), "It looks like there are no jobs pending and yet nothing can be submitted."
 
         if next_job is None:
             _wait()
 
         else:
-            proc, files = _launch_job(wrap_policy, resource_policy, next_job)
-            pid = proc.pid
-
-            assert (
-                pid not in processes
-            ), "The OS reused a PID and we can't deal with it."
-
-            pending[pid] = next_job[0]
-            processes[pid] = (proc, files)
+            job_id, job = next_job[:2]
+            own_cores[job_id] = job.resources.n_cores
+            launch(next_job, functools.partial(_put_completion, completions, job_id))
+            n_running += 1
 
-    while pending:
+    while n_running:
         _wait()
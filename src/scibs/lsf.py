@@ -1,15 +1,78 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import asyncio
+import os
+import shlex
+import subprocess
+import tempfile
+import weakref
+
 import scibs
 from scibs import SciBS
 
+# Keeps the command line well below `ARG_MAX`.
+_MAX_IDS_PER_CALL = 5000
+
+_LSF_STATES = {
+    "PEND": "PENDING",
+    "WAIT": "PENDING",
+    "PSUSP": "PENDING",
+    "RUN": "RUNNING",
+    "USUSP": "RUNNING",
+    "SSUSP": "RUNNING",
+    "DONE": "COMPLETED",
+    "EXIT": "FAILED",
+}
+
+
+def parse_bjobs_states(text):
+    """Parse `bjobs -noheader -o "jobid stat"` output."""
+
+    states = dict()
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) != 2 or not parts[0].isdigit():
+            continue
+
+        states[int(parts[0])] = _LSF_STATES.get(parts[1], "UNKNOWN")
+
+    return states
+
 
 class LSF(SciBS):
-    def __init__(self, submission_policy=None, wrap_policy=None):
+    """Submits jobs via `bsub`.
+
+    With `pack_size` set, jobs are submitted in bulk using `bsub -pack`. The
+    jobs are buffered and submitted once `pack_size` jobs have accumulated, or
+    when `flush` is called, e.g. on leaving the `with` block:
+
+        with scibs.LSF(pack_size=500) as lsf:
+            for job in jobs:
+                lsf.submit(job)
+
+        lsf.job_ids  # maps the jobs to their LSF job IDs.
+
+    The handles returned by `submit` receive their job ID once the pack has
+    been submitted. Since all jobs of a pack share the environment of `bsub`,
+    jobs with different environments are submitted in separate packs.
+    """
+
+    max_concurrent_submissions = 16
+
+    def __init__(
+        self,
+        submission_policy=None,
+        wrap_policy=None,
+        journal=None,
+        pack_size=None,
+        pack_submission_policy=None,
+        site_profile=None,
+        queue=None,
+    ):
         if submission_policy is None:
             submission_policy = scibs.MultiSubmissionPolicy(
-                [scibs.StdOutSubmissionPolicy(), scibs.SubprocessSubmissionPolicy()]
+                [scibs.StdOutSubmissionPolicy(), scibs.LSFSubmissionPolicy()]
             )
 
         if wrap_policy is None:
@@ -17,14 +80,259 @@ class LSF(SciBS):
 
         self._submission_policy = submission_policy
         self._wrap_policy = wrap_policy
+        self._journal = journal
+        self._is_resuming = False
+
+        if pack_size is not None and pack_submission_policy is None:
+            pack_submission_policy = scibs.MultiSubmissionPolicy(
+                [scibs.StdOutSubmissionPolicy(), scibs.LSFPackSubmissionPolicy()]
+            )
+
+        self._site_profile = site_profile
+        self._queue = queue
+        self._pack_size = pack_size
+        self._pack_submission_policy = pack_submission_policy
+        self._pack = []
+        self.job_ids = []
+        self._submission_semaphores = weakref.WeakKeyDictionary()
+        self._submitted_job_ids = scibs.utilities.ActiveJobIDs(self.query_states)
+
+    def __exit__(self, *args):
+        self.flush()
 
     def submit(self, job):
+        key = None
+        if self._journal is not None:
+            key = self._journal.key(job)
+            if self._is_resuming and self._journal.is_done(key):
+                return self._skipped_handle(key)
+
+        if self._pack_size is not None:
+            # The job ID is filled in once the pack has been submitted.
+            handle = scibs.JobHandle(self, None)
+            self._pack.append((job, key, handle))
+            if len(self._pack) >= self._pack_size:
+                self.flush()
+
+            return handle
+
+        cmd = self.cmdline(job)
+        job_id = self._submission_policy(cmd, cwd=job.cwd, env=job.env)
+
+        return self._submitted(key, job_id)
+
+    async def submit_async(self, job):
+        """Like `submit`, but doesn't block the event loop.
+
+        Jobs are always submitted individually, i.e. `pack_size` is ignored.
+        At most `max_concurrent_submissions` submissions run concurrently.
+        """
+        key = None
+        if self._journal is not None:
+            key = self._journal.key(job)
+            if self._is_resuming and self._journal.is_done(key):
+                return self._skipped_handle(key)
+
         cmd = self.cmdline(job)
-        self._submission_policy(cmd, cwd=job.cwd, env=job.env)
+        async with self._semaphore():
+            job_id = await self._submission_policy.submit_async(
+                cmd, cwd=job.cwd, env=job.env
+            )
+
+        return self._submitted(key, job_id)
+
+    def cancel(self, handles):
+        """Cancel the jobs of `handles`, a handle or a list of handles.
+
+        All jobs are cancelled with a single call to `bkill`.
+        """
+        if isinstance(handles, scibs.JobHandle):
+            handles = [handles]
+
+        job_ids = [handle.job_id for handle in handles if handle.job_id is not None]
+        self._cancel_job_ids(job_ids)
+
+    def cancel_all(self, running=True):
+        """Cancel all jobs submitted through this object, including any jobs
+        buffered for `bsub -pack`.
+
+        Unless `running`, only jobs that haven't started are cancelled.
+        """
+        self._pack = []
+
+        job_ids = list(self._submitted_job_ids)
+        if not running and job_ids:
+            states = self.query_states(job_ids)
+            job_ids = [job_id for job_id in job_ids if states.get(job_id) == "PENDING"]
+
+        self._cancel_job_ids(job_ids)
+
+    def _cancel_job_ids(self, job_ids):
+        # Jobs which have finished already, only cause a warning.
+        for k in range(0, len(job_ids), _MAX_IDS_PER_CALL):
+            ids = [str(job_id) for job_id in job_ids[k : k + _MAX_IDS_PER_CALL]]
+            subprocess.run(["bkill"] + ids, check=False)
+
+    def _submitted(self, key, job_id):
+        return self._submitted_group([key], job_id)
+
+    def _submitted_group(self, keys, job_id):
+        # The jobs of `keys` were submitted as the single job `job_id`.
+        if job_id is not None:
+            self._submitted_job_ids.append(job_id)
+
+        if self._journal is not None:
+            for key in keys:
+                self._journal.record("submit", key, job_id=job_id)
+
+        return scibs.JobHandle(self, job_id)
+
+    def _skipped_handle(self, key):
+        # The job was either adopted or completed before.
+        job_id = self._journal.last_event(key).get("job_id")
+        return scibs.JobHandle(self, job_id)
+
+    def _semaphore(self):
+        # A semaphore is bound to the event loop it's first used in.
+        loop = asyncio.get_running_loop()
+        if loop not in self._submission_semaphores:
+            self._submission_semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrent_submissions
+            )
+
+        return self._submission_semaphores[loop]
+
+    def flush(self):
+        """Submit all buffered jobs with `bsub -pack`.
+
+        Jobs with different environments are submitted in separate packs.
+        """
+
+        pack, self._pack = self._pack, []
+
+        groups = []
+        for entry in pack:
+            env = entry[0].env
+            for group_env, group in groups:
+                if group_env == env:
+                    group.append(entry)
+                    break
+            else:
+                groups.append((env, [entry]))
+
+        for k, (env, group) in enumerate(groups):
+            try:
+                self._submit_pack(group, env)
+            except BaseException:
+                # Don't lose the jobs that haven't been attempted yet.
+                self._pack = [entry for _, g in groups[k + 1 :] for entry in g]
+                raise
+
+    def _submit_pack(self, pack, env):
+        with tempfile.NamedTemporaryFile(
+            "w", prefix="scibs-", suffix=".pack", delete=False
+        ) as f:
+            for job, _, _ in pack:
+                f.write(self.pack_line(job) + "\n")
+
+        try:
+            cmd = ["bsub", "-pack", f.name]
+            job_ids = self._pack_submission_policy(cmd, cwd=None, env=env)
+
+        except scibs.PartialSubmissionError as e:
+            # Journal what was submitted, such that `resume` knows about it.
+            self._submitted_pack(pack, e.job_ids)
+            raise
+
+        finally:
+            os.remove(f.name)
+
+        if job_ids is None:
+            job_ids = [None] * len(pack)
+
+        self._submitted_pack(pack, job_ids)
+
+        if len(job_ids) != len(pack):
+            raise scibs.PartialSubmissionError(
+                f"Submitted {len(pack)} jobs, but got {len(job_ids)} job IDs back.",
+                job_ids,
+            )
+
+    def _submitted_pack(self, pack, job_ids):
+        for (job, key, handle), job_id in zip(pack, job_ids):
+            handle.job_id = job_id
+            self.job_ids.append((job, job_id))
+            self._submitted(key, job_id)
+
+    def pack_line(self, job):
+        """The line describing `job` in a pack file.
+
+        This is the `bsub` command line without `bsub` itself. Since the pack
+        is submitted from a single directory, the `cwd` is passed via `-cwd`.
+        """
+        c = self.cmdline(job)[1:]
+        if job.cwd is not None:
+            c = ["-cwd", job.cwd] + c
+
+        return shlex.join(c)
+
+    def resume(self):
+        """Continue where a previous driver, using the same journal, stopped.
+
+        Jobs still known to LSF are re-adopted; subsequent calls to `submit`
+        skip them. Requires a submission policy that reports job IDs.
+        """
+        if self._journal is None:
+            raise RuntimeError("Resuming requires a journal.")
+
+        self._journal.reconcile(self.query_states)
+        self._is_resuming = True
+
+    def query_states(self, job_ids):
+        """Ask LSF about the state of the jobs `job_ids`.
+
+        Returns a `dict` mapping job IDs to "PENDING", "RUNNING", "COMPLETED",
+        "FAILED" or "UNKNOWN".
+        """
+        cp = subprocess.run(
+            self._query_cmd(job_ids),
+            check=False,
+            capture_output=True,
+            encoding="utf-8",
+        )
+
+        return parse_bjobs_states(cp.stdout)
+
+    async def query_states_async(self, job_ids):
+        # `bjobs` fails if any job is unknown, but still reports the others.
+        proc = await asyncio.create_subprocess_exec(
+            *self._query_cmd(job_ids),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        stdout, _ = await proc.communicate()
+
+        return parse_bjobs_states(stdout.decode("utf-8"))
+
+    def poll_states(self, job_ids, interval=30.0):
+        """An async iterator of `(job_id, state)`, see `scibs.utilities.poll_states`.
+
+        async for job_id, state in lsf.poll_states(job_ids):
+            ...
+        """
+        return scibs.utilities.poll_states(self.query_states_async, job_ids, interval)
+
+    def _query_cmd(self, job_ids):
+        cmd = ["bjobs", "-noheader", "-o", "jobid stat"]
+        return cmd + [str(job_id) for job_id in job_ids]
 
     def cmdline(self, job):
+        return ["bsub"] + self.options(job) + self.wrap(job)
+
+    def options(self, job):
+        """The flags describing the resources of `job`."""
         r = job.resources
-        c = ["bsub"]
+        c = []
 
         if job.name is not None:
             c += ["-J", job.name]
@@ -44,8 +352,14 @@ class LSF(SciBS):
         if r.needs_gpus:
             c += ["-R", f"rusage[ngpus_excl_p={r.n_gpus_per_process}]"]
 
+        if self._queue is not None:
+            c += ["-q", self._queue]
+
+        if self._site_profile is not None:
+            layout = self._site_profile.layout(r, partition=self._queue)
+            c += ["-R", f"span[ptile={layout.ptile}]"]
+
         c += self.site_specific_flags(job)
-        c += self.wrap(job)
 
         return c
 
@@ -59,13 +373,21 @@ class LSF(SciBS):
 class EulerLSF(LSF):
     """The ETH cluster Euler uses LSF."""
 
-    def __init__(self, submission_policy=None, wrap_policy=None):
+    def __init__(
+        self, submission_policy=None, wrap_policy=None, site_profile=None, **kwargs
+    ):
         if wrap_policy is None:
             wrap_policy = scibs.EulerWrapPolicy()
 
-        super().__init__(submission_policy=submission_policy, wrap_policy=wrap_policy)
+        if site_profile is None:
+            # The part I want to target has 2x64 cores.
+            site_profile = scibs.SiteProfile(
+                [scibs.NodeType("euler", n_cores=128, n_sockets=2)]
+            )
 
-    def site_specific_flags(self, job):
-        # The part I want to target has 2x64 cores.
-        ptile = min(128, job.resources.n_cores)
-        return ["-R", f"span[ptile={ptile}]"]
+        super().__init__(
+            submission_policy=submission_policy,
+            wrap_policy=wrap_policy,
+            site_profile=site_profile,
+            **kwargs,
+        )
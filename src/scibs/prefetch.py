@@ -0,0 +1,188 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import concurrent.futures
+import logging
+import os
+import threading
+import weakref
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Warm the page cache with the inputs of the jobs about to be started.
+
+    While earlier jobs are still running, the files `job.inputs` of the next
+    `lookahead` jobs, see `Schedule.upcoming`, are read into the page cache
+    in the background using `posix_fadvise(..., POSIX_FADV_WILLNEED)`.
+
+    The inputs of upcoming jobs are prefetched in schedule order, until they
+    would exceed the `memory_budget` in bytes. By default the budget is a
+    quarter of the memory available when `LocalBS` starts the first job. The
+    budget is reduced whenever less memory is available, such that the
+    working set of the running jobs isn't evicted.
+
+    Finding and sizing the inputs, which may involve walking directories, is
+    done by the prefetch threads as well; the scheduler only hands over the
+    list of upcoming jobs. If the scheduler is faster than the prefetcher,
+    outdated lists are skipped.
+
+    Use with `LocalBS`, e.g.
+
+        scibs.LocalBS(prefetcher=scibs.Prefetcher(lookahead=4))
+    """
+
+    def __init__(self, lookahead=4, memory_budget=None, n_threads=2):
+        self.lookahead = lookahead
+
+        self._memory_budget = memory_budget
+        self._n_threads = n_threads
+        self._pool = None
+        self._prefetched = dict()
+
+        self._lock = threading.Lock()
+        self._upcoming = None
+        self._is_planning = False
+        self._planning = None
+        self._input_files = weakref.WeakKeyDictionary()
+
+    def __enter__(self):
+        if self._memory_budget is None:
+            self._memory_budget = psutil.virtual_memory().available // 4
+
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self._n_threads, thread_name_prefix="scibs-prefetch"
+        )
+        return self
+
+    def __exit__(self, *args):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+        with self._lock:
+            self._pool = None
+            self._upcoming = None
+            self._is_planning = False
+            self._planning = None
+
+        self._prefetched = dict()
+        self._input_files = weakref.WeakKeyDictionary()
+
+    def __call__(self, upcoming_jobs):
+        """Prefetch the inputs of `upcoming_jobs`, in order.
+
+        This doesn't block, the work is done by the prefetch threads.
+        """
+
+        with self._lock:
+            self._upcoming = list(upcoming_jobs)
+
+            if not self._is_planning:
+                self._is_planning = True
+                self._planning = self._pool.submit(self._plan)
+
+    def _plan(self):
+        is_planning = True
+        try:
+            while True:
+                with self._lock:
+                    pool = self._pool
+                    upcoming_jobs, self._upcoming = self._upcoming, None
+                    if upcoming_jobs is None or pool is None:
+                        self._is_planning = is_planning = False
+                        return
+
+                self._prefetch(pool, upcoming_jobs)
+
+        except RuntimeError as e:
+            # Most likely, the pool was shut down.
+            logger.debug(f"Stopped prefetching: {e}")
+
+        except Exception:
+            logger.exception("Failed to prefetch the inputs of upcoming jobs.")
+
+        finally:
+            # Otherwise, no later call would plan again.
+            if is_planning:
+                with self._lock:
+                    self._is_planning = False
+
+    def _prefetch(self, pool, upcoming_jobs):
+        # Leave at least half of the available memory to the running jobs.
+        budget = min(self._memory_budget, psutil.virtual_memory().available // 2)
+
+        wanted = dict()
+        total = 0
+        for job in upcoming_jobs:
+            paths = self._cached_input_files(job)
+            size = sum(paths.values())
+
+            if total + size > budget:
+                break
+
+            wanted.update(paths)
+            total += size
+
+        for path, size in wanted.items():
+            if path not in self._prefetched:
+                pool.submit(_prefetch_file, path)
+
+        # Files of jobs that started are forgotten, should they be needed
+        # again they'll be prefetched again, at the cost of a `fadvise`.
+        self._prefetched = wanted
+
+    def _cached_input_files(self, job):
+        # A job is usually upcoming for several calls in a row.
+        if job not in self._input_files:
+            self._input_files[job] = self.input_files(job)
+
+        return self._input_files[job]
+
+    def input_files(self, job):
+        """The files, and their size, of `job.inputs`."""
+
+        files = dict()
+        for path in job.inputs:
+            path = job.relative_to_cwd(path)
+
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    for filename in filenames:
+                        _add_file(files, os.path.join(dirpath, filename))
+            else:
+                _add_file(files, path)
+
+        return files
+
+
+def _add_file(files, path):
+    try:
+        files[path] = os.stat(path).st_size
+    except OSError:
+        # Maybe it'll exist by the time the job is started.
+        pass
+
+
+def _prefetch_file(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        if hasattr(os, "posix_fadvise"):
+            # Asks the kernel to start reading in the background.
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+
+        else:
+            while os.read(fd, 1 << 20):
+                pass
+
+    except OSError as e:
+        logger.debug(f"Failed to prefetch {path}: {e}")
+
+    finally:
+        os.close(fd)
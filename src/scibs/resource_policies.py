@@ -1,7 +1,7 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
-import os
+import scibs
 
 
 class ResourcePolicy:
@@ -28,11 +28,37 @@ class DefaultResourcePolicy(ResourcePolicy):
 
 
 class GPUResourcePolicy(ResourcePolicy):
+    """Restrict the job to the GPUs allocated to it.
+
+    When several jobs share a GPU and `mps=True`, the job is also limited to
+    its share of the GPU through the environment variables of the CUDA
+    Multi-Process Service (MPS). Note, that the MPS daemon must be started
+    separately.
+    """
+
+    def __init__(self, mps=False, mps_pipe_directory=None):
+        self._mps = mps
+        self._mps_pipe_directory = mps_pipe_directory
+
     def __call__(self, job, acquired_resources):
         gpu_ids = acquired_resources["gpu_ids"]
         gpu_ids = ",".join(map(str, gpu_ids))
 
-        if job.env is None:
-            job.env = dict(os.environ)
-
+        # Only the changes are stored, the (large) rest of the environment is
+        # shared by all jobs.
+        job.env = scibs.Environment.on_top_of(job.env)
         job.env["CUDA_VISIBLE_DEVICES"] = gpu_ids
+
+        gpu_fraction = acquired_resources.get("gpu_fraction")
+        if self._mps and gpu_fraction is not None:
+            percentage = max(1, int(100 * gpu_fraction))
+            job.env["CUDA_MPS_ACTIVE_THREAD_PERCENTAGE"] = str(percentage)
+
+            gpu_memory = getattr(job.resources, "gpu_memory", None)
+            if gpu_memory is not None:
+                # The GPU is always device 0 due to `CUDA_VISIBLE_DEVICES`.
+                mem = int(gpu_memory * 1e-6)
+                job.env["CUDA_MPS_PINNED_DEVICE_MEM_LIMIT"] = f"0={mem}M"
+
+            if self._mps_pipe_directory is not None:
+                job.env["CUDA_MPS_PIPE_DIRECTORY"] = self._mps_pipe_directory
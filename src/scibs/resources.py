@@ -39,6 +39,10 @@ class Resource:
     def needs_gpus(self):
         return hasattr(self, "n_gpus_per_process") and self.n_gpus_per_process
 
+    @property
+    def needs_shared_gpu(self):
+        return hasattr(self, "gpu_fraction") or hasattr(self, "gpu_memory")
+
 
 class MPIResource(Resource):
     """A simple MPI job."""
@@ -52,6 +56,14 @@ class MPIResource(Resource):
     def n_cores(self):
         return self.n_mpi_tasks
 
+    @property
+    def mem_per_task(self):
+        return self._mem_per_task
+
+    @mem_per_task.setter
+    def mem_per_task(self, mem_per_task):
+        self._mem_per_task = mem_per_task
+
     @property
     def memory_per_core(self):
         return self._mem_per_task
@@ -77,8 +89,19 @@ class OMPResource(Resource):
     def n_cores(self):
         return self.n_omp_threads
 
+    @property
+    def total_memory(self):
+        return self._total_memory
+
+    @total_memory.setter
+    def total_memory(self, total_memory):
+        self._total_memory = total_memory
+
     @property
     def memory_per_core(self):
+        if self._total_memory is None:
+            return None
+
         return self._total_memory / self.n_omp_threads
 
 
@@ -152,6 +175,9 @@ class CUResource(Resource):
 
     @property
     def memory_per_core(self):
+        if self.mem_per_cu is None:
+            return None
+
         total_memory = self.mem_per_cu * self.n_cus
         return total_memory / self.n_cores
 
@@ -174,6 +200,14 @@ class JustGPUsResource(Resource):
     def n_gpus_per_process(self):
         return self._n_gpus
 
+    @property
+    def total_memory(self):
+        return self._total_memory
+
+    @total_memory.setter
+    def total_memory(self, total_memory):
+        self._total_memory = total_memory
+
     @property
     def memory_per_core(self):
         if self._total_memory is None:
@@ -182,6 +216,62 @@ class JustGPUsResource(Resource):
         return self._total_memory // self._n_cores
 
 
+class SharedGPUResource(Resource):
+    """A core and part of one GPU.
+
+    Small jobs, e.g. inference, often only use a fraction of a GPU. These jobs
+    can request either a fraction of the GPU, or the amount of GPU memory they
+    need. Locally, several such jobs are packed onto one GPU.
+
+    On a cluster, the job requests one whole GPU.
+    """
+
+    def __init__(
+        self, gpu_fraction=None, gpu_memory=None, total_memory=None, wall_clock=None
+    ):
+        """
+        Args:
+            gpu_fraction: fraction of the GPU required, e.g. `0.25`.
+            gpu_memory:   bytes of GPU memory required.
+            total_memory: total bytes of (host) RAM.
+            wall_clock:   wall-clock runtime allowance.
+        """
+        assert (gpu_fraction is None) != (
+            gpu_memory is None
+        ), "Request either a fraction of a GPU or GPU memory."
+
+        assert gpu_fraction is None or 0.0 < gpu_fraction <= 1.0
+
+        self.wall_clock = wall_clock
+
+        if gpu_fraction is not None:
+            self.gpu_fraction = gpu_fraction
+        else:
+            self.gpu_memory = gpu_memory
+
+        self._total_memory = total_memory
+
+    @property
+    def n_cores(self):
+        return 1
+
+    @property
+    def n_gpus_per_process(self):
+        return 1
+
+    @property
+    def total_memory(self):
+        return self._total_memory
+
+    @total_memory.setter
+    def total_memory(self, total_memory):
+        self._total_memory = total_memory
+
+    @property
+    def memory_per_core(self):
+        return self._total_memory
+
+
 class JustCoresResource(Resource):
     def __init__(self, n_cores=1, total_memory=None, wall_clock=None):
         self.wall_clock = wall_clock
@@ -193,6 +283,14 @@ class JustCoresResource(Resource):
     def n_cores(self):
         return self._n_cores
 
+    @property
+    def total_memory(self):
+        return self._total_memory
+
+    @total_memory.setter
+    def total_memory(self, total_memory):
+        self._total_memory = total_memory
+
     @property
     def memory_per_core(self):
         if self._total_memory is None:
@@ -4,6 +4,12 @@
 import psutil
 import os
 import datetime
+import heapq
+import itertools
+import math
+import time
+
+import scibs
 
 
 class Schedule:
@@ -29,6 +35,14 @@ class Schedule:
             f"{self.__class__.__name__} hasn't implemented `complete`."
         )
 
+    def upcoming(self, k):
+        """The (at most) `k` jobs most likely to be started next, in order.
+
+        This is only a hint, e.g. for prefetching. Schedules which can't tell
+        return an empty list.
+        """
+        return []
+
 
 class GreedySchedule(Schedule):
     """The most simple, i.e. greedy, scheduling possible."""
@@ -81,7 +95,11 @@ class GreedySchedule(Schedule):
         self._job_info[job_id]["complete"] = True
         self._local_resources.release(self._job_info[job_id]["resources"])
 
-    def _job_order(self, job):
+    def upcoming(self, k):
+        return [self._jobs[job_id] for job_id in self._unscheduled_jobs[:k]]
+
+    @staticmethod
+    def _job_order(job):
         # Longer jobs have high priority over shorter jobs. Ties are broken by
         # the number of resources used. Finally, no wall-clock requirements
         # indicates fast jobs, since otherwise these jobs would need to ask
@@ -93,6 +111,408 @@ class GreedySchedule(Schedule):
         return (-wall_clock, -n_cores)
 
 
+class LookaheadSchedule(Schedule):
+    """Greedy scheduling of a stream of jobs.
+
+    Unlike `GreedySchedule`, `jobs` can be any iterable, e.g. a generator.
+    Only a window of `lookahead` pending jobs is kept in memory; it's refilled
+    from `jobs` as jobs are started. Within the window, jobs are ordered like
+    in `GreedySchedule`. Hence, memory is proportional to `lookahead` plus the
+    number of running jobs, regardless of the number of jobs.
+    """
+
+    def __init__(self, jobs, local_resources=None, lookahead=64):
+        if local_resources is None:
+            local_resources = LocalResources()
+
+        self._local_resources = local_resources
+        self._jobs = iter(jobs)
+        self._lookahead = lookahead
+        self._job_ids = itertools.count()
+
+        self._pending = []
+        self._running = dict()
+        self._is_exhausted = False
+
+    def empty(self):
+        self._refill()
+        return self._pending == []
+
+    def next_job(self):
+        self._refill()
+
+        for k, (_, job_id, job) in enumerate(self._pending):
+            acquired_resources = self._local_resources.acquire(job.resources)
+
+            if acquired_resources is not None:
+                del self._pending[k]
+                self._running[job_id] = acquired_resources
+                return job_id, job, acquired_resources
+
+        return None
+
+    def complete(self, job_id):
+        self._local_resources.release(self._running.pop(job_id))
+
+    def upcoming(self, k):
+        self._refill()
+        return [job for _, _, job in self._pending[:k]]
+
+    def _refill(self):
+        if self._is_exhausted or len(self._pending) >= self._lookahead:
+            return
+
+        for job in itertools.islice(self._jobs, self._lookahead - len(self._pending)):
+            job_id = next(self._job_ids)
+            self._pending.append((GreedySchedule._job_order(job), job_id, job))
+
+        if len(self._pending) < self._lookahead:
+            self._is_exhausted = True
+
+        self._pending.sort(key=lambda entry: entry[:2])
+
+
+def best_fit_score(demand, available, capacity):
+    """Prefer the job which leaves the least resources unused.
+
+    The left-over resources of each kind are normalized by the capacity, the
+    score is the negative sum over all kinds of resources.
+    """
+    return -sum(
+        (available[kind] - demand.get(kind, 0)) / capacity[kind]
+        for kind in capacity
+        if capacity[kind] > 0
+    )
+
+
+def dominant_resource_score(demand, available, capacity):
+    """Prefer the job with the largest dominant share.
+
+    The dominant share is the largest fraction of any one kind of resource
+    requested by the job. Starting big jobs first is the multi-dimensional
+    version of first-fit decreasing.
+    """
+    return max(
+        (
+            demand.get(kind, 0) / capacity[kind]
+            for kind in capacity
+            if capacity[kind] > 0
+        ),
+        default=0.0,
+    )
+
+
+class BestFitSchedule(Schedule):
+    """Pack jobs onto the local resources as tightly as possible.
+
+    Each time a job can be started, every pending job that fits into the
+    available resources (cores, memory and GPUs, as far as they are modelled by
+    `local_resources`) is scored by `score(demand, available, capacity)` and
+    the highest scoring job is started. The arguments are `dict`s, see
+    `resource_demand` and `LocalResources.capacity`.
+
+    The default score is `best_fit_score`, alternatively consider
+    `dominant_resource_score`.
+
+    Note: The `local_resources` must implement `available` and `capacity`.
+    """
+
+    def __init__(self, jobs, local_resources=None, score=None):
+        if local_resources is None:
+            local_resources = LocalResources()
+
+        if score is None:
+            score = best_fit_score
+
+        self._local_resources = local_resources
+        self._score = score
+        self._jobs = list(jobs)
+        self._demands = [resource_demand(job.resources) for job in self._jobs]
+        self._acquired = dict()
+
+        # Ties are broken in favour of larger jobs.
+        capacity = self._local_resources.capacity()
+        self._pending = sorted(
+            range(len(self._jobs)),
+            key=lambda job_id: -dominant_resource_score(
+                self._demands[job_id], capacity, capacity
+            ),
+        )
+
+    def empty(self):
+        return self._pending == []
+
+    def next_job(self):
+        capacity = self._local_resources.capacity()
+        available = self._local_resources.available()
+
+        def fits(demand):
+            return all(demand.get(kind, 0) <= available[kind] for kind in available)
+
+        candidates = sorted(
+            (job_id for job_id in self._pending if fits(self._demands[job_id])),
+            key=lambda job_id: -self._score(self._demands[job_id], available, capacity),
+        )
+
+        for job_id in candidates:
+            job = self._jobs[job_id]
+            acquired_resources = self._local_resources.acquire(job.resources)
+
+            if acquired_resources is not None:
+                self._pending.remove(job_id)
+                self._acquired[job_id] = acquired_resources
+                return job_id, job, acquired_resources
+
+        return None
+
+    def complete(self, job_id):
+        self._local_resources.release(self._acquired.pop(job_id))
+
+    def upcoming(self, k):
+        # Which job fits best depends on what's available at the time.
+        # Approximate by the order in which ties are broken.
+        return [self._jobs[job_id] for job_id in self._pending[:k]]
+
+
+class FairShareSchedule(Schedule):
+    """Share the resources fairly among several accounts.
+
+    Jobs are charged to their `job.account`, e.g. a user or project. Each
+    account has a share; accounts which have recently used less than their
+    share of the core-seconds are preferred. Usage decays with a half-life,
+    such that past usage is forgotten eventually.
+
+    The priority of a pending job is
+
+        fair_share_weight * 2**(-usage / share)
+            + priority_weight * job.priority
+            + age_weight * waiting_time_in_hours
+
+    where `usage` and `share` are the normalized usage and share of the
+    account. The waiting time is measured from `job.submit_time`, or from
+    when the schedule was created. Aging makes sure that low-priority jobs
+    eventually run, ahead of high-priority jobs submitted sufficiently later.
+
+    The highest priority job that fits is started next.
+    """
+
+    def __init__(
+        self,
+        jobs,
+        local_resources=None,
+        shares=None,
+        half_life=datetime.timedelta(hours=1),
+        fair_share_weight=1.0,
+        priority_weight=1.0,
+        age_weight=1.0,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            shares: A `dict` mapping accounts to their (relative) share.
+                    Accounts not mentioned have a share of `1`.
+            clock:  The clock in which `job.submit_time` is measured.
+        """
+        if local_resources is None:
+            local_resources = LocalResources()
+
+        self._local_resources = local_resources
+        self._shares = dict() if shares is None else dict(shares)
+        self._half_life = half_life.total_seconds()
+        self._weights = (fair_share_weight, priority_weight, age_weight)
+        self._clock = clock
+
+        now = self._clock()
+        self._jobs = list(jobs)
+        self._job_info = [
+            {
+                "submitted": now if job.submit_time is None else job.submit_time,
+                "started": None,
+                "resources": None,
+            }
+            for job in self._jobs
+        ]
+
+        # The waiting time grows equally for all pending jobs, hence only the
+        # fair-share factor of the account changes the order of pending jobs.
+        # Each account keeps its jobs in a heap ordered by the rest of the
+        # priority.
+        self._queues = dict()
+        for job_id, job in enumerate(self._jobs):
+            queue = self._queues.setdefault(self._account(job), [])
+            queue.append((-self._static_priority(job_id), job_id))
+
+        for queue in self._queues.values():
+            heapq.heapify(queue)
+
+        self._n_pending = len(self._jobs)
+        self._n_pending_by_account = {
+            account: len(queue) for account, queue in self._queues.items()
+        }
+        self._running = set()
+
+        self._usage = {self._account(job): 0.0 for job in self._jobs}
+        self._completed = {account: 0 for account in self._usage}
+        self._total_wait = {account: 0.0 for account in self._usage}
+        self._last_update = now
+
+    def empty(self):
+        return self._n_pending == 0
+
+    def next_job(self):
+        now = self._clock()
+        self._update_usage(now)
+
+        for job_id in self._by_priority():
+            job = self._jobs[job_id]
+            acquired_resources = self._local_resources.acquire(job.resources)
+
+            if acquired_resources is not None:
+                info = self._job_info[job_id]
+                info["resources"] = acquired_resources
+                info["started"] = now
+
+                self._remove_pending(job_id)
+                self._running.add(job_id)
+                self._total_wait[self._account(job)] += now - info["submitted"]
+
+                return job_id, job, acquired_resources
+
+        return None
+
+    def complete(self, job_id):
+        self._update_usage(self._clock())
+
+        self._running.remove(job_id)
+        self._completed[self._account(self._jobs[job_id])] += 1
+        self._local_resources.release(self._job_info[job_id]["resources"])
+
+    def upcoming(self, k):
+        return [
+            self._jobs[job_id] for job_id in itertools.islice(self._by_priority(), k)
+        ]
+
+    def fair_share_factors(self):
+        """The fair-share factor `2**(-usage / share)` of every account."""
+
+        total_usage = sum(self._usage.values())
+        total_shares = sum(self._share(account) for account in self._usage)
+
+        factors = dict()
+        for account, usage in self._usage.items():
+            usage = usage / total_usage if total_usage > 0 else 0.0
+            share = self._share(account) / total_shares
+            factors[account] = 2.0 ** (-usage / share)
+
+        return factors
+
+    def stats(self):
+        """Per account statistics of the queue."""
+
+        factors = self.fair_share_factors()
+        stats = {
+            account: {
+                "pending": self._n_pending_by_account[account],
+                "running": 0,
+                "completed": self._completed[account],
+                "usage": self._usage[account],
+                "share": self._share(account),
+                "fair_share_factor": factors[account],
+                "total_wait": self._total_wait[account],
+            }
+            for account in self._usage
+        }
+
+        for job_id in self._running:
+            stats[self._account(self._jobs[job_id])]["running"] += 1
+
+        return stats
+
+    def _account(self, job):
+        return job.account
+
+    def _share(self, account):
+        return self._shares.get(account, 1.0)
+
+    def _static_priority(self, job_id):
+        # The priority without the fair-share factor and shifted by
+        # `age_weight * now`, which is the same for all jobs.
+        _, priority_weight, age_weight = self._weights
+        submitted_hours = self._job_info[job_id]["submitted"] / 3600.0
+
+        return (
+            priority_weight * self._jobs[job_id].priority - age_weight * submitted_hours
+        )
+
+    def _by_priority(self):
+        """Yields the pending jobs by decreasing priority.
+
+        The queues are left untouched, even if the generator is abandoned
+        early.
+        """
+        fair_share_weight = self._weights[0]
+        factors = self.fair_share_factors()
+
+        # Merge the queues, `heads[account]` is the position in the queue.
+        heads = {account: 0 for account in self._queues}
+        candidates = [
+            (neg_static - fair_share_weight * factors[account], job_id, account)
+            for account, queue in self._queues.items()
+            if queue
+            for neg_static, job_id in queue[:1]
+        ]
+        heapq.heapify(candidates)
+
+        # Walking a heap in order requires a second heap of its frontier.
+        frontiers = {account: [] for account in self._queues}
+
+        while candidates:
+            _, job_id, account = heapq.heappop(candidates)
+            if self._job_info[job_id]["started"] is None:
+                yield job_id
+
+            queue, frontier = self._queues[account], frontiers[account]
+            position = heads[account]
+            for child in [2 * position + 1, 2 * position + 2]:
+                if child < len(queue):
+                    heapq.heappush(frontier, (queue[child], child))
+
+            if frontier:
+                (neg_static, next_job_id), heads[account] = heapq.heappop(frontier)
+                offset = fair_share_weight * factors[account]
+                heapq.heappush(candidates, (neg_static - offset, next_job_id, account))
+
+    def _remove_pending(self, job_id):
+        # Started jobs are removed lazily, once they reach the top of the
+        # queue or the queue has become mostly garbage.
+        account = self._account(self._jobs[job_id])
+        queue = self._queues[account]
+
+        self._n_pending -= 1
+        self._n_pending_by_account[account] -= 1
+
+        while queue and self._job_info[queue[0][1]]["started"] is not None:
+            heapq.heappop(queue)
+
+        if len(queue) > 2 * self._n_pending_by_account[account] + 16:
+            queue[:] = [e for e in queue if self._job_info[e[1]]["started"] is None]
+            heapq.heapify(queue)
+
+    def _update_usage(self, now):
+        # Decay the past usage, then charge the running jobs for the
+        # core-seconds used since the last update.
+        dt = now - self._last_update
+        self._last_update = now
+
+        decay = 0.5 ** (dt / self._half_life) if self._half_life > 0 else 0.0
+        for account in self._usage:
+            self._usage[account] *= decay
+
+        for job_id in self._running:
+            job = self._jobs[job_id]
+            self._usage[self._account(job)] += job.resources.n_cores * dt
+
+
 class LocalResources:
     """Models the currently available resources.
 
@@ -100,11 +520,39 @@ class LocalResources:
           anything more efficient than linear searches to find eligible jobs.
     """
 
-    def __init__(self, cores=None):
+    def __init__(self, cores=None, memory=None):
+        """
+        Args:
+            cores:  Number of cores, defaults to all cores.
+            memory: Bytes of RAM available to jobs. If `None` memory isn't
+                    accounted for.
+        """
         if cores is None:
             cores = psutil.cpu_count()
 
         self._cores = cores
+        self._total_cores = cores
+        self._memory = memory
+        self._total_memory = memory
+
+    @property
+    def available_cores(self):
+        """Number of cores that can currently be acquired."""
+        return self._cores
+
+    def capacity(self):
+        """The total amount of each kind of resource, e.g. `{"cores": 16}`."""
+        return self._as_dict(self._total_cores, self._total_memory)
+
+    def available(self):
+        """The amount of each kind of resource which is currently available."""
+        return self._as_dict(self._cores, self._memory)
+
+    def _as_dict(self, cores, memory):
+        if memory is None:
+            return {"cores": cores}
+
+        return {"cores": cores, "memory": memory}
 
     def acquire(self, resources):
         """Try to acquire the requested resources.
@@ -119,27 +567,151 @@ class LocalResources:
 
         requested_cores = resources.n_cores
 
-        if self._cores >= requested_cores:
+        if self._cores < requested_cores:
+            return None
+
+        if self._memory is None:
             self._cores -= requested_cores
             return {"cores": requested_cores}
 
-        else:
+        requested_memory = resource_demand(resources)["memory"]
+        if self._memory < requested_memory:
             return None
 
+        self._cores -= requested_cores
+        self._memory -= requested_memory
+        return {"cores": requested_cores, "memory": requested_memory}
+
     def release(self, acquired_resources):
         """Return the acquired resources once they are no longer used."""
-        self._cores += acquired_resources["cores"]
-        acquired_resources.pop("cores", None)
+        self._cores += acquired_resources.pop("cores")
+
+        memory = acquired_resources.pop("memory", None)
+        if memory is not None:
+            self._memory += memory
+
+
+class CombinedLocalResources:
+    """Several kinds of local resources, e.g. cores and GPUs.
+
+    A job is only started if every pool can satisfy its request:
+
+        scibs.CombinedLocalResources(
+            [scibs.LocalResources(memory=64e9), scibs.LocalGPUResources()]
+        )
+
+    GPU pools are only asked for jobs which need GPUs.
+    """
+
+    def __init__(self, pools):
+        self._pools = pools
+
+    @property
+    def available_cores(self):
+        return sum(getattr(pool, "available_cores", 0) for pool in self._pools)
+
+    def capacity(self):
+        return self._merge([pool.capacity() for pool in self._pools])
+
+    def available(self):
+        return self._merge([pool.available() for pool in self._pools])
+
+    def acquire(self, resources):
+        acquired = []
+        for pool in self._applicable_pools(resources):
+            acquired_resources = pool.acquire(resources)
+
+            if acquired_resources is None:
+                for pool, a in acquired:
+                    pool.release(a)
+                return None
+
+            acquired.append((pool, acquired_resources))
+
+        return self._merge([a for _, a in acquired])
+
+    def release(self, acquired_resources):
+        for pool in self._pools:
+            is_gpu_pool = isinstance(pool, LocalGPUResources)
+            if is_gpu_pool and "gpu_ids" not in acquired_resources:
+                continue
+
+            pool.release(acquired_resources)
+
+    def _applicable_pools(self, resources):
+        return [
+            pool
+            for pool in self._pools
+            if resources.needs_gpus or not isinstance(pool, LocalGPUResources)
+        ]
+
+    def _merge(self, dicts):
+        merged = dict()
+        for d in dicts:
+            merged.update(d)
+
+        return merged
+
+
+def resource_demand(resources):
+    """The amount of each kind of resource requested, e.g.
+
+    {"cores": 4, "memory": 8e9, "gpus": 0.5}
+    """
+
+    memory_per_core = resources.memory_per_core
+    memory = 0 if memory_per_core is None else memory_per_core * resources.n_cores
+
+    if resources.needs_shared_gpu:
+        gpus = getattr(resources, "gpu_fraction", None)
+        if gpus is None:
+            # Without knowing the GPU, count it as a whole GPU.
+            gpus = 1.0
+
+    elif resources.needs_gpus:
+        gpus = resources.n_gpus_per_process
+
+    else:
+        gpus = 0
+
+    return {"cores": resources.n_cores, "memory": memory, "gpus": gpus}
 
 
 class LocalGPUResources:
-    def __init__(self, available_gpus=None):
+    """Models the GPUs of the local machine.
+
+    Multi-GPU jobs should run on GPUs which are closely connected. Therefore,
+    GPUs are allocated such that the GPUs of a job are as close as possible,
+    see `GPUTopology`. Ties are broken by choosing the allocation that leaves
+    the remaining GPUs least fragmented, i.e. a best-fit strategy.
+
+    Without a topology, GPUs are considered closer the closer they are in
+    `available_gpus`, which results in contiguous allocations.
+
+    Jobs requesting part of a GPU, see `SharedGPUResource`, are packed onto
+    GPUs that are already shared, as long as the GPU has capacity left. A GPU
+    is only used for whole-GPU jobs when nobody shares it.
+    """
+
+    # Above this number of candidate allocations a greedy heuristic is used.
+    _max_candidates = 5000
+
+    # Tolerance when adding up fractions of GPUs.
+    _eps = 1e-9
+
+    def __init__(self, available_gpus=None, topology=None, gpu_memory=None):
         """Create the available GPU resources.
 
         Arguments:
             available_gpus  Either a list of integers, or a comma separated
                             string, e.g., the environment variable
                             CUDA_VISIBLE_DEVICE.
+
+            topology        A `scibs.GPUTopology`, a path to a file accepted by
+                            `GPUTopology.from_file` or `None`.
+
+            gpu_memory      Bytes of memory of each GPU. Required for jobs
+                            which request GPU memory.
         """
 
         if available_gpus is None:
@@ -149,11 +721,32 @@ class LocalGPUResources:
             available_gpus = available_gpus.split(",")
             available_gpus = [int(gpu_id) for gpu_id in available_gpus]
 
-        self._gpus = available_gpus
+        if topology is None:
+            topology = scibs.GPUTopology.linear(available_gpus)
+
+        elif isinstance(topology, str):
+            topology = scibs.GPUTopology.from_file(topology)
+
+        self._gpus = list(available_gpus)
+        self._order = {gpu_id: k for k, gpu_id in enumerate(available_gpus)}
+        self._topology = topology
+        self._gpu_memory = gpu_memory
+
+        # The fraction of each shared GPU that's in use.
+        self._shared_load = dict()
+
+        # GPUs at most this far apart are considered part of the same block.
+        self._block_distance = min(
+            (topology.distance(i, j) for i, j in itertools.combinations(self._gpus, 2)),
+            default=0,
+        )
 
     def acquire(self, resources):
         assert resources.needs_gpus
 
+        if resources.needs_shared_gpu:
+            return self._acquire_shared(resources)
+
         n_requested_gpus = resources.n_gpus_per_process
         assert n_requested_gpus > 0
 
@@ -161,11 +754,131 @@ class LocalGPUResources:
         if n_requested_gpus > len(self._gpus):
             return None
 
-        gpu_ids = self._gpus[:n_requested_gpus]
-        self._gpus = self._gpus[n_requested_gpus:]
+        gpu_ids = self._choose_gpus(n_requested_gpus)
+        self._gpus = [gpu_id for gpu_id in self._gpus if gpu_id not in gpu_ids]
 
         return {"gpu_ids": gpu_ids}
 
     def release(self, acquired_resources):
-        self._gpus += acquired_resources["gpu_ids"]
-        acquired_resources.pop("gpu_ids", None)
+        gpu_ids = acquired_resources.pop("gpu_ids")
+        gpu_fraction = acquired_resources.pop("gpu_fraction", None)
+
+        if gpu_fraction is not None:
+            (gpu_id,) = gpu_ids
+            self._shared_load[gpu_id] -= gpu_fraction
+
+            if self._shared_load[gpu_id] > self._eps:
+                return
+
+            del self._shared_load[gpu_id]
+
+        self._gpus = sorted(self._gpus + gpu_ids, key=self._order.__getitem__)
+
+    def capacity(self):
+        return {"gpus": len(self._order)}
+
+    def available(self):
+        n_shared = sum(1.0 - load for load in self._shared_load.values())
+        return {"gpus": len(self._gpus) + n_shared}
+
+    def gpu_fraction(self, resources):
+        """The fraction of a GPU requested by a `SharedGPUResource`."""
+
+        if hasattr(resources, "gpu_fraction"):
+            return resources.gpu_fraction
+
+        if self._gpu_memory is None:
+            raise ValueError("Requesting GPU memory requires `gpu_memory`.")
+
+        return resources.gpu_memory / self._gpu_memory
+
+    def _acquire_shared(self, resources):
+        gpu_fraction = self.gpu_fraction(resources)
+        if gpu_fraction > 1.0 + self._eps:
+            return None
+
+        # Best fit: the fullest GPU that still has enough capacity.
+        candidates = [
+            (load, self._order[gpu_id], gpu_id)
+            for gpu_id, load in self._shared_load.items()
+            if load + gpu_fraction <= 1.0 + self._eps
+        ]
+
+        if candidates:
+            _, _, gpu_id = max(candidates, key=lambda c: (c[0], -c[1]))
+
+        elif self._gpus:
+            (gpu_id,) = self._choose_gpus(1)
+            self._gpus.remove(gpu_id)
+            self._shared_load[gpu_id] = 0.0
+
+        else:
+            return None
+
+        self._shared_load[gpu_id] += gpu_fraction
+        return {"gpu_ids": [gpu_id], "gpu_fraction": gpu_fraction}
+
+    def fragmentation(self, free_gpus=None):
+        """How fragmented are the free GPUs?
+
+        This is `1 - largest_block / n_free`, where a block is a set of free
+        GPUs which are closely connected. Zero means all free GPUs form one
+        block.
+        """
+
+        if free_gpus is None:
+            free_gpus = self._gpus
+
+        if not free_gpus:
+            return 0.0
+
+        largest_block = max(len(block) for block in self._blocks(free_gpus))
+        return 1.0 - largest_block / len(free_gpus)
+
+    def _blocks(self, gpu_ids):
+        blocks = []
+        unvisited = list(gpu_ids)
+
+        while unvisited:
+            block = [unvisited.pop(0)]
+            for gpu_id in block:
+                neighbours = [
+                    other
+                    for other in unvisited
+                    if self._topology.distance(gpu_id, other) <= self._block_distance
+                ]
+                for other in neighbours:
+                    unvisited.remove(other)
+
+                block += neighbours
+
+            blocks.append(block)
+
+        return blocks
+
+    def _choose_gpus(self, n):
+        if math.comb(len(self._gpus), n) > self._max_candidates:
+            candidates = self._greedy_candidates(n)
+        else:
+            candidates = itertools.combinations(self._gpus, n)
+
+        def score(gpu_ids):
+            remaining = [gpu_id for gpu_id in self._gpus if gpu_id not in gpu_ids]
+            return (
+                self._topology.span(gpu_ids),
+                self.fragmentation(remaining),
+                [self._order[gpu_id] for gpu_id in gpu_ids],
+            )
+
+        return list(min(candidates, key=score))
+
+    def _greedy_candidates(self, n):
+        # Starting from every free GPU, add the closest GPUs.
+        for first in self._gpus:
+            yield sorted(
+                self._gpus,
+                key=lambda gpu_id: (
+                    self._topology.distance(first, gpu_id),
+                    self._order[gpu_id],
+                ),
+            )[:n]
@@ -35,6 +35,13 @@ class SequentialLocalBS(scibs.SciBS):
         cmd = self.cmdline(job)
         self._submission_policy(cmd, cwd=job.cwd, env=job.env)
 
+        # The submission policy doesn't report the exit code.
+        return scibs.LocalJobHandle(self, None, state="UNKNOWN")
+
+    def cancel(self, handle):
+        # Jobs have finished by the time `submit` returns.
+        pass
+
     def cmdline(self, job):
         return self.wrap(job)
 
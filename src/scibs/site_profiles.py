@@ -0,0 +1,196 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import json
+import math
+
+
+class NodeType:
+    """The hardware of one kind of compute node of a cluster.
+
+    Memory is in bytes; `None` means it's not checked.
+    """
+
+    def __init__(
+        self,
+        name,
+        n_cores,
+        n_sockets=1,
+        memory=None,
+        n_gpus=0,
+        partitions=None,
+    ):
+        """
+        Args:
+            partitions: The SLURM partitions, or LSF queues, containing nodes
+                        of this type. `None` means the node is available in
+                        any partition, including the default one. Others are
+                        only used when a partition is requested explicitly.
+        """
+        self.name = name
+        self.n_cores = n_cores
+        self.n_sockets = n_sockets
+        self.memory = memory
+        self.n_gpus = n_gpus
+        self.partitions = partitions
+
+    def __repr__(self):
+        return f"NodeType({self.name!r}, n_cores={self.n_cores})"
+
+    @property
+    def n_cores_per_socket(self):
+        return self.n_cores // self.n_sockets
+
+    def max_tasks_per_node(self, cores_per_task, memory_per_task, gpus_per_task):
+        """How many tasks fit onto one node; 0 if not even one does."""
+
+        if cores_per_task > self.n_cores:
+            return 0
+
+        # Tasks that fit into a socket shouldn't straddle two sockets.
+        if cores_per_task <= self.n_cores_per_socket:
+            n_tasks = self.n_sockets * (self.n_cores_per_socket // cores_per_task)
+        else:
+            n_tasks = self.n_cores // cores_per_task
+
+        if memory_per_task and self.memory is not None:
+            n_tasks = min(n_tasks, int(self.memory // memory_per_task))
+
+        if gpus_per_task:
+            n_tasks = min(n_tasks, self.n_gpus // gpus_per_task)
+
+        return n_tasks
+
+
+class NodeLayout:
+    """How the tasks of a job are placed onto nodes."""
+
+    def __init__(self, node_type, n_nodes, n_tasks_per_node, cores_per_task):
+        self.node_type = node_type
+        self.n_nodes = n_nodes
+        self.n_tasks_per_node = n_tasks_per_node
+        self.cores_per_task = cores_per_task
+
+    def __repr__(self):
+        return (
+            f"NodeLayout({self.node_type.name!r}, n_nodes={self.n_nodes}, "
+            f"n_tasks_per_node={self.n_tasks_per_node}, "
+            f"cores_per_task={self.cores_per_task})"
+        )
+
+    @property
+    def ptile(self):
+        """The number of slots, i.e. cores, per node as understood by LSF."""
+        return self.n_tasks_per_node * self.cores_per_task
+
+
+class SiteProfile:
+    """Describes the nodes of a cluster.
+
+    The profile is used by `LSF` and `SLURM` to decide how many nodes a job
+    should use, and how many tasks to place on each node. The tasks are spread
+    evenly over the fewest nodes possible. Jobs that don't fit on any node type
+    are rejected with a `ValueError` before they're submitted. A profile
+    without any GPU nodes doesn't model GPUs, i.e. requests for GPUs aren't
+    checked.
+
+    A profile can be read from a JSON file, e.g.
+
+        {"node_types": [
+            {"name": "cpu", "n_cores": 128, "n_sockets": 2, "memory": 5.12e11},
+            {"name": "gpu", "n_cores": 64, "n_gpus": 8, "partitions": ["gpu"]}
+        ]}
+    """
+
+    def __init__(self, node_types):
+        self.node_types = list(node_types)
+
+    @staticmethod
+    def from_dict(profile):
+        return SiteProfile(
+            [NodeType(**node_type) for node_type in profile["node_types"]]
+        )
+
+    @staticmethod
+    def from_file(path):
+        with open(path, "r") as f:
+            return SiteProfile.from_dict(json.load(f))
+
+    @property
+    def models_gpus(self):
+        return any(node_type.n_gpus for node_type in self.node_types)
+
+    def node_types_in(self, partition=None):
+        if partition is None:
+            return [
+                node_type
+                for node_type in self.node_types
+                if node_type.partitions is None
+            ]
+
+        return [
+            node_type
+            for node_type in self.node_types
+            if node_type.partitions is None or partition in node_type.partitions
+        ]
+
+    def layout(self, resources, partition=None):
+        """The `NodeLayout` for `resources` touching the fewest nodes.
+
+        Raises a `ValueError` if the request can't be satisfied.
+        """
+        n_tasks, cores_per_task = _tasks(resources)
+
+        memory_per_task = None
+        if resources.memory_per_core is not None:
+            memory_per_task = resources.memory_per_core * cores_per_task
+
+        gpus_per_task = 0
+        if resources.needs_gpus and self.models_gpus:
+            gpus_per_task = resources.n_gpus_per_process
+
+        # Only MPI jobs can span several nodes.
+        max_nodes = math.inf if resources.needs_mpi else 1
+
+        candidates = []
+        for node_type in self.node_types_in(partition):
+            max_tasks = node_type.max_tasks_per_node(
+                cores_per_task, memory_per_task, gpus_per_task
+            )
+            if max_tasks == 0:
+                continue
+
+            n_nodes = math.ceil(n_tasks / max_tasks)
+            if n_nodes > max_nodes:
+                continue
+
+            # Spread the tasks evenly, instead of filling up all but the last.
+            n_tasks_per_node = math.ceil(n_tasks / n_nodes)
+            wasted_cores = n_nodes * node_type.n_cores - n_tasks * cores_per_task
+
+            candidates.append(
+                (
+                    (n_nodes, wasted_cores),
+                    NodeLayout(node_type, n_nodes, n_tasks_per_node, cores_per_task),
+                )
+            )
+
+        if not candidates:
+            where = "" if partition is None else f" in '{partition}'"
+            raise ValueError(
+                f"No node{where} can run {n_tasks} task(s) with {cores_per_task}"
+                f" core(s), {gpus_per_task} GPU(s) and {memory_per_task} bytes"
+                " of memory each."
+            )
+
+        return min(candidates, key=lambda candidate: candidate[0])[1]
+
+
+def _tasks(resources):
+    """The number of tasks and cores per task."""
+
+    if resources.needs_mpi:
+        n_tasks = resources.n_mpi_tasks
+        return n_tasks, max(1, resources.n_cores // n_tasks)
+
+    return 1, resources.n_cores
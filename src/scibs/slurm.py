@@ -2,15 +2,71 @@
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 # Copyright (c) 2022 Luc Grosheintz-Laval
 
+import asyncio
+import subprocess
+import weakref
+
 import scibs
 from scibs import SciBS
 
+# Keeps the command line well below `ARG_MAX`.
+_MAX_IDS_PER_CALL = 5000
+
+_SLURM_STATES = {
+    "PENDING": "PENDING",
+    "CONFIGURING": "PENDING",
+    "REQUEUED": "PENDING",
+    "RUNNING": "RUNNING",
+    "COMPLETING": "RUNNING",
+    "SUSPENDED": "RUNNING",
+    "COMPLETED": "COMPLETED",
+    "FAILED": "FAILED",
+    "CANCELLED": "FAILED",
+    "TIMEOUT": "FAILED",
+    "OUT_OF_MEMORY": "FAILED",
+    "NODE_FAIL": "FAILED",
+    "PREEMPTED": "FAILED",
+    "BOOT_FAIL": "FAILED",
+    "DEADLINE": "FAILED",
+}
+
+
+def parse_sacct_states(text):
+    """Parse `sacct --parsable2 -o JobID,State` output."""
+
+    states = dict()
+    for line in text.splitlines():
+        if not line:
+            continue
+
+        job_id, state = line.split("|")[:2]
+        # e.g. "CANCELLED by 1234"
+        state = state.split(" ")[0]
+        states[_job_id(job_id)] = _SLURM_STATES.get(state, "UNKNOWN")
+
+    return states
+
+
+def _job_id(text):
+    # Elements of job arrays, e.g. `1001_3` or `1001_[0-9%2]`, keep their
+    # textual ID.
+    return int(text) if text.isdigit() else text
+
 
 class SLURM(SciBS):
-    def __init__(self, submission_policy=None, wrap_policy=None):
+    max_concurrent_submissions = 16
+
+    def __init__(
+        self,
+        submission_policy=None,
+        wrap_policy=None,
+        journal=None,
+        site_profile=None,
+        partition=None,
+    ):
         if submission_policy is None:
             submission_policy = scibs.MultiSubmissionPolicy(
-                [scibs.StdOutSubmissionPolicy(), scibs.SubprocessSubmissionPolicy()]
+                [scibs.StdOutSubmissionPolicy(), scibs.SLURMSubmissionPolicy()]
             )
 
         if wrap_policy is None:
@@ -18,19 +74,160 @@ class SLURM(SciBS):
 
         self._submission_policy = submission_policy
         self._wrap_policy = wrap_policy
+        self._journal = journal
+        self._is_resuming = False
+        self._site_profile = site_profile
+        self._partition = partition
         self._dependency_policy = scibs.SLURMDependencyPolicy()
+        self._submission_semaphores = weakref.WeakKeyDictionary()
+        self._submitted_job_ids = scibs.utilities.ActiveJobIDs(self.query_states)
 
     def submit(self, job, dependency=None):
+        key = None
+        if self._journal is not None:
+            key = self._journal.key(job)
+            if self._is_resuming and self._journal.is_done(key):
+                return self._skipped_handle(key)
+
         cmd = self.cmdline(job, dependency=dependency)
-        self._submission_policy(cmd, cwd=job.cwd, env=job.env)
+        job_id = self._submission_policy(cmd, cwd=job.cwd, env=job.env)
+
+        return self._submitted(key, job_id)
+
+    async def submit_async(self, job, dependency=None):
+        """Like `submit`, but doesn't block the event loop.
+
+        At most `max_concurrent_submissions` submissions run concurrently.
+        """
+        key = None
+        if self._journal is not None:
+            key = self._journal.key(job)
+            if self._is_resuming and self._journal.is_done(key):
+                return self._skipped_handle(key)
+
+        cmd = self.cmdline(job, dependency=dependency)
+        async with self._semaphore():
+            job_id = await self._submission_policy.submit_async(
+                cmd, cwd=job.cwd, env=job.env
+            )
+
+        return self._submitted(key, job_id)
+
+    def cancel(self, handles):
+        """Cancel the jobs of `handles`, a handle or a list of handles.
+
+        All jobs are cancelled with a single call to `scancel`.
+        """
+        if isinstance(handles, scibs.JobHandle):
+            handles = [handles]
+
+        job_ids = [handle.job_id for handle in handles if handle.job_id is not None]
+        self._cancel_job_ids(job_ids, [])
+
+    def cancel_all(self, running=True):
+        """Cancel all jobs submitted through this object.
+
+        Unless `running`, only jobs that haven't started are cancelled.
+        """
+        flags = [] if running else ["--state=PENDING"]
+        self._cancel_job_ids(list(self._submitted_job_ids), flags)
+
+    def _cancel_job_ids(self, job_ids, flags):
+        # Jobs which have finished already, only cause a warning.
+        for k in range(0, len(job_ids), _MAX_IDS_PER_CALL):
+            ids = [str(job_id) for job_id in job_ids[k : k + _MAX_IDS_PER_CALL]]
+            subprocess.run(["scancel"] + flags + ids, check=False)
+
+    def _submitted(self, key, job_id):
+        return self._submitted_group([key], job_id)
+
+    def _submitted_group(self, keys, job_id):
+        # The jobs of `keys` were submitted as the single job `job_id`.
+        if job_id is not None:
+            self._submitted_job_ids.append(job_id)
+
+        if self._journal is not None:
+            for key in keys:
+                self._journal.record("submit", key, job_id=job_id)
+
+        return scibs.JobHandle(self, job_id)
+
+    def _skipped_handle(self, key):
+        # The job was either adopted or completed before.
+        job_id = self._journal.last_event(key).get("job_id")
+        return scibs.JobHandle(self, job_id)
+
+    def _semaphore(self):
+        # A semaphore is bound to the event loop it's first used in.
+        loop = asyncio.get_running_loop()
+        if loop not in self._submission_semaphores:
+            self._submission_semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrent_submissions
+            )
+
+        return self._submission_semaphores[loop]
+
+    def resume(self):
+        """Continue where a previous driver, using the same journal, stopped.
+
+        Jobs still known to SLURM are re-adopted; subsequent calls to `submit`
+        skip them. Requires a submission policy that reports job IDs, e.g.
+        `SLURMSubmissionPolicy`.
+        """
+        if self._journal is None:
+            raise RuntimeError("Resuming requires a journal.")
+
+        self._journal.reconcile(self.query_states)
+        self._is_resuming = True
+
+    def query_states(self, job_ids):
+        """Ask SLURM about the state of the jobs `job_ids`.
+
+        Returns a `dict` mapping job IDs to "PENDING", "RUNNING", "COMPLETED",
+        "FAILED" or "UNKNOWN".
+        """
+        cp = subprocess.run(
+            self._query_cmd(job_ids),
+            check=True,
+            capture_output=True,
+            encoding="utf-8",
+        )
+
+        return parse_sacct_states(cp.stdout)
+
+    async def query_states_async(self, job_ids):
+        stdout = await scibs.submission_policies.run_async(self._query_cmd(job_ids))
+        return parse_sacct_states(stdout)
+
+    def poll_states(self, job_ids, interval=30.0):
+        """An async iterator of `(job_id, state)`, see `scibs.utilities.poll_states`.
+
+        async for job_id, state in slurm.poll_states(job_ids):
+            ...
+        """
+        return scibs.utilities.poll_states(self.query_states_async, job_ids, interval)
+
+    def _query_cmd(self, job_ids):
+        ids = ",".join(map(str, job_ids))
+        cmd = ["sacct", "--noheader", "-X", "--parsable2", "-o", "JobID,State"]
+        return cmd + ["-j", ids]
 
     def cmdline(self, job, dependency):
-        r = job.resources
         c = [self.slurm_cmd]
 
         if dependency:
             c += [self._dependency_policy(dependency)]
 
+        c += self.options(job)
+        c += self.wrap(job)
+
+        return c
+
+    def options(self, job):
+        """The flags describing the resources of `job`."""
+        r = job.resources
+        c = []
+
         if job.name is not None:
             c += ["-J", job.name]
 
@@ -53,8 +250,24 @@ class SLURM(SciBS):
         if r.needs_gpus:
             raise NotImplementedError("Need to consider GPUs.")
 
+        if self._partition is not None:
+            c += [f"--partition={self._partition}"]
+
+        if self._site_profile is not None:
+            c += self.layout_flags(r)
+
         c += self.site_specific_flags(job)
-        c += self.wrap(job)
+
+        return c
+
+    def layout_flags(self, resources):
+        """Place the tasks onto the fewest nodes of the site profile."""
+
+        layout = self._site_profile.layout(resources, partition=self._partition)
+        c = [f"--nodes={layout.n_nodes}"]
+
+        if resources.needs_mpi:
+            c += [f"--ntasks-per-node={layout.n_tasks_per_node}"]
 
         return c
 
@@ -1,16 +1,63 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import asyncio
 import subprocess
 import re
 
 
 class SubmissionPolicy:
+    """Submits the command to the batch system.
+
+    Policies which can determine the job ID assigned by the batch system,
+    return it; all others return `None`.
+
+    `submit_async` is the coroutine version. By default, it runs the policy
+    in a thread, policies which run subprocesses should override it.
+    """
+
     def __call__(self, cmd, cwd, env):
         raise NotImplementedError(
             f"{self.__class__.__name__} hasn't implemented `__call__`."
         )
 
+    async def submit_async(self, cmd, cwd, env):
+        return await asyncio.to_thread(self, cmd, cwd, env)
+
+
+async def run_async(cmd, cwd=None, env=None):
+    """Run `cmd` without blocking the event loop; returns its stdout.
+
+    Like `subprocess.run(..., check=True)`, a non-zero exit code raises
+    `subprocess.CalledProcessError`.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate()
+
+    stdout = stdout.decode("utf-8")
+    stderr = stderr.decode("utf-8")
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+
+    return stdout
+
+
+class PartialSubmissionError(RuntimeError):
+    """Submitting several jobs at once failed part-way.
+
+    `job_ids` are the IDs of the leading jobs which were submitted.
+    """
+
+    def __init__(self, message, job_ids):
+        super().__init__(message)
+        self.job_ids = job_ids
+
 
 class SubprocessSubmissionPolicy(SubmissionPolicy):
     def __init__(self, subprocess_kwargs=None):
@@ -22,6 +69,9 @@ class SubprocessSubmissionPolicy(SubmissionPolicy):
     def __call__(self, cmd, cwd, env):
         subprocess.run(cmd, **self._kwargs, cwd=cwd, env=env)
 
+    async def submit_async(self, cmd, cwd, env):
+        await run_async(cmd, cwd=cwd, env=env)
+
 
 class StdOutSubmissionPolicy(SubmissionPolicy):
     def __call__(self, cmd, cwd, env):
@@ -30,6 +80,9 @@ class StdOutSubmissionPolicy(SubmissionPolicy):
         else:
             print(f"cd {cwd} && " + " ".join(cmd) + " && cd -")
 
+    async def submit_async(self, cmd, cwd, env):
+        return self(cmd, cwd, env)
+
 
 class DebugSubmissionPolicy(SubmissionPolicy):
     def __call__(self, cmd, cwd, env):
@@ -43,11 +96,32 @@ class MultiSubmissionPolicy(SubmissionPolicy):
         self._policies = policies
 
     def __call__(self, cmd, cwd, env):
+        job_id = None
+        for policy in self._policies:
+            job_id = policy(cmd, cwd, env) or job_id
+
+        return job_id
+
+    async def submit_async(self, cmd, cwd, env):
+        job_id = None
         for policy in self._policies:
-            policy(cmd, cwd, env)
+            job_id = await policy.submit_async(cmd, cwd, env) or job_id
+
+        return job_id
 
 
 class SLURMSubmissionPolicy(SubmissionPolicy):
+    """Submits via `sbatch` and returns the job ID.
+
+    `--parsable` is added to `sbatch` such that it prints only the job ID,
+    e.g. `408469` or `408469;cluster`. The traditional `Submitted batch job
+    408469` is understood as well.
+    """
+
+    _job_id_regex = re.compile(
+        r"^(?:Submitted batch job )?([0-9]+)(?:;\S*)?\s*$", re.MULTILINE
+    )
+
     def __init__(self, subprocess_kwargs=None):
         if subprocess_kwargs is None:
             subprocess_kwargs = dict()
@@ -57,20 +131,114 @@ class SLURMSubmissionPolicy(SubmissionPolicy):
         self._kwargs["capture_output"] = True
         self._kwargs["encoding"] = "utf-8"
 
-        self._job_ids = []
+        self._previous_job_id = None
 
     def __call__(self, cmd, cwd, env):
-        cp = subprocess.run(cmd, **self._kwargs, cwd=cwd, env=env)
-        self._job_ids.append(self.parse_stdout(cp.stdout))
+        cp = subprocess.run(self.parsable(cmd), **self._kwargs, cwd=cwd, env=env)
+        self._previous_job_id = self.parse_stdout(cp.stdout)
+
+        return self._previous_job_id
+
+    async def submit_async(self, cmd, cwd, env):
+        stdout = await run_async(self.parsable(cmd), cwd=cwd, env=env)
+        self._previous_job_id = self.parse_stdout(stdout)
+
+        return self._previous_job_id
+
+    def parsable(self, cmd):
+        if cmd[0].endswith("sbatch") and "--parsable" not in cmd:
+            return [cmd[0], "--parsable"] + cmd[1:]
+
+        return cmd
 
     def parse_stdout(self, str):
-        for line in str.split("\n"):
-            print(f"'{line}'")
-            m = re.match("^Submitted batch job ([0-9]*)$", line)
-            if m:
-                return int(m.group(1))
+        m = self._job_id_regex.search(str)
+        if m is None:
+            raise RuntimeError("Could not determine the job ID.")
 
-        raise RuntimeError("Could not determine the job ID.")
+        return int(m.group(1))
 
     def previous_job_id(self):
-        return self._job_ids[-1] if self._job_ids else None
+        return self._previous_job_id
+
+
+class LSFSubmissionPolicy(SubmissionPolicy):
+    """Submits via `bsub` and returns the job ID."""
+
+    _job_id_regex = re.compile(r"^Job <([0-9]+)> is submitted", re.MULTILINE)
+
+    def __init__(self, subprocess_kwargs=None):
+        if subprocess_kwargs is None:
+            subprocess_kwargs = dict()
+
+        self._kwargs = subprocess_kwargs
+        self._kwargs["check"] = True
+        self._kwargs["capture_output"] = True
+        self._kwargs["encoding"] = "utf-8"
+
+    def __call__(self, cmd, cwd, env):
+        cp = subprocess.run(cmd, **self._kwargs, cwd=cwd, env=env)
+        return self.parse_stdout(cp.stdout)
+
+    async def submit_async(self, cmd, cwd, env):
+        return self.parse_stdout(await run_async(cmd, cwd=cwd, env=env))
+
+    def parse_stdout(self, str):
+        job_ids = self.parse_all(str)
+        if not job_ids:
+            raise RuntimeError("Could not determine the job ID.")
+
+        return job_ids[0]
+
+    def parse_all(self, str):
+        """All job IDs in the output of `bsub`, in order."""
+        return [int(m) for m in self._job_id_regex.findall(str)]
+
+
+class LSFPackSubmissionPolicy(LSFSubmissionPolicy):
+    """Submits a pack file via `bsub -pack` and returns the list of job IDs.
+
+    If `bsub` fails, a `PartialSubmissionError` tells which jobs were
+    submitted regardless.
+    """
+
+    def __call__(self, cmd, cwd, env):
+        try:
+            cp = subprocess.run(cmd, **self._kwargs, cwd=cwd, env=env)
+        except subprocess.CalledProcessError as e:
+            raise self._partial_submission_error(e) from e
+
+        return self.parse_all(cp.stdout)
+
+    async def submit_async(self, cmd, cwd, env):
+        try:
+            stdout = await run_async(cmd, cwd=cwd, env=env)
+        except subprocess.CalledProcessError as e:
+            raise self._partial_submission_error(e) from e
+
+        return self.parse_all(stdout)
+
+    def parse_leading(self, str):
+        """The job IDs reported before the first error, in order."""
+
+        job_ids = []
+        for line in str.splitlines():
+            m = self._job_id_regex.match(line)
+            if m is None and line.strip():
+                break
+
+            if m is not None:
+                job_ids.append(int(m.group(1)))
+
+        return job_ids
+
+    def _partial_submission_error(self, e):
+        # Only the leading IDs can be attributed to the lines of the pack.
+        job_ids = self.parse_leading(e.stdout or "")
+        all_job_ids = self.parse_all(e.stdout or "")
+
+        return PartialSubmissionError(
+            f"`bsub -pack` failed with exit code {e.returncode}: {e.stderr};"
+            f" submitted jobs: {all_job_ids}",
+            job_ids,
+        )
@@ -1,6 +1,11 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import asyncio
+import subprocess
+
+_FINAL_STATES = {"COMPLETED", "FAILED"}
+
 
 def _split_timedelta(t):
     days = t.days
@@ -18,3 +23,74 @@ def hhmm(t):
 def hhmmss(t):
     days, hours, minutes, seconds = _split_timedelta(t)
     return "{:02d}:{:02d}:{:02d}".format(24 * days + hours, minutes, seconds)
+
+
+async def poll_states(query_states_async, job_ids, interval, max_unknown_polls=3):
+    """Yield `(job_id, state)` whenever the state of a job changes.
+
+    The states are queried every `interval` seconds using the coroutine
+    `query_states_async(job_ids)`. Once a job has completed or failed, it's no
+    longer queried; the iterator ends once all jobs are done. Jobs which are
+    "UNKNOWN", or missing from the answer, for `max_unknown_polls` consecutive
+    polls are given up on as well.
+    """
+    states = dict()
+    n_unknown = dict()
+    remaining = set(job_ids)
+
+    while remaining:
+        answer = await query_states_async(sorted(remaining, key=str))
+
+        for job_id in sorted(remaining, key=str):
+            state = answer.get(job_id, "UNKNOWN")
+            if states.get(job_id) != state:
+                states[job_id] = state
+                yield job_id, state
+
+            n_unknown[job_id] = (
+                n_unknown.get(job_id, 0) + 1 if state == "UNKNOWN" else 0
+            )
+            if state in _FINAL_STATES or n_unknown[job_id] >= max_unknown_polls:
+                remaining.discard(job_id)
+
+        if remaining:
+            await asyncio.sleep(interval)
+
+
+class ActiveJobIDs:
+    """The IDs of the submitted jobs that might not have finished yet.
+
+    To stay bounded, whenever the number of IDs has doubled, the batch system
+    is asked via `query_states(job_ids)` which jobs have completed or failed;
+    those are dropped. If the query fails, the IDs are kept.
+    """
+
+    def __init__(self, query_states, min_size=1024):
+        self._query_states = query_states
+        self._min_size = min_size
+        self._max_size = min_size
+        self._job_ids = []
+
+    def append(self, job_id):
+        self._job_ids.append(job_id)
+        if len(self._job_ids) > self._max_size:
+            self.prune()
+
+    def prune(self):
+        try:
+            states = self._query_states(self._job_ids)
+        except (OSError, subprocess.CalledProcessError):
+            states = dict()
+
+        self._job_ids = [
+            job_id
+            for job_id in self._job_ids
+            if states.get(job_id) not in _FINAL_STATES
+        ]
+        self._max_size = max(self._min_size, 2 * len(self._job_ids))
+
+    def __iter__(self):
+        return iter(self._job_ids)
+
+    def __len__(self):
+        return len(self._job_ids)
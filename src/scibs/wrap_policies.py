@@ -1,6 +1,15 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import hashlib
+import json
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+
 
 class WrapPolicy:
     def __call__(self, job):
@@ -8,6 +17,18 @@ class WrapPolicy:
             f"{self.__class__.__name__} hasn't implemented `__call__`."
         )
 
+    def argv(self, job):
+        """Wrap the job without requiring a shell.
+
+        Returns a tuple `(argv, env)` where `argv` is a list of strings which
+        can be executed directly and `env` the changes to the environment
+        required by the job. An entry `None` in `env` means the variable must
+        be unset, see also `Environment.update_delta`.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `argv`."
+        )
+
 
 class DefaultWrapPolicy(WrapPolicy):
     """Linux friendly defaults for running simple jobs."""
@@ -43,6 +64,37 @@ class DefaultWrapPolicy(WrapPolicy):
     def wrap_cmd_default(self, job):
         return " ".join(job.cmd)
 
+    def argv(self, job):
+        r = job.resources
+
+        if r.needs_mpi and not r.needs_omp:
+            return self.argv_mpi(job)
+
+        elif r.needs_mpi and r.needs_omp:
+            return self.argv_mpi_omp(job)
+
+        elif not r.needs_mpi and r.needs_omp:
+            return self.argv_omp(job)
+
+        else:
+            return self.argv_default(job)
+
+    def argv_mpi(self, job):
+        r = job.resources
+        return ["mpirun", "-np", str(r.n_mpi_tasks)] + job.cmd, {}
+
+    def argv_mpi_omp(self, job):
+        raise NotImplementedError(
+            f"{self.__class__.__name__} hasn't implemented `argv_mpi_omp`."
+        )
+
+    def argv_omp(self, job):
+        r = job.resources
+        return list(job.cmd), {"OMP_NUM_THREADS": str(r.n_omp_threads)}
+
+    def argv_default(self, job):
+        return list(job.cmd), {}
+
 
 class SBatchWrapPolicy(WrapPolicy):
     """Used when submitting sbatch files.
@@ -59,6 +111,9 @@ class SBatchWrapPolicy(WrapPolicy):
     def __call__(self, job):
         return job.cmd
 
+    def argv(self, job):
+        return list(job.cmd), {}
+
 
 class EulerWrapPolicy(DefaultWrapPolicy):
     def wrap_cmd_mpi_omp(self, job):
@@ -73,3 +128,434 @@ class EulerWrapPolicy(DefaultWrapPolicy):
             ]
             + cmd
         )
+
+    def argv_mpi_omp(self, job):
+        r = job.resources
+        mpirun = [
+            "mpirun",
+            "-np",
+            str(r.n_mpi_tasks),
+            "--map-by",
+            f"node:PE={r.n_omp_threads}",
+        ]
+        env = {"OMP_NUM_THREADS": str(r.n_omp_threads), "LSF_AFFINITY_HOSTFILE": None}
+
+        return mpirun + job.cmd, env
+
+
+class HybridWrapPolicy(DefaultWrapPolicy):
+    """Pin MPI ranks and their OpenMP threads to cores.
+
+    The MPI launcher, `flavor`, is one of
+        - "openmpi": `mpirun --map-by slot:PE=k --bind-to core`,
+        - "mpich": `mpiexec -bind-to core:k`,
+        - "intel": `mpirun` with `I_MPI_PIN_DOMAIN=omp`,
+        - "srun": `srun --cpus-per-task=k --cpu-bind=cores`.
+
+    The number of cores `k` of each rank is derived from the `CU` of a
+    `CUResource`: the cores of a CU are split evenly among its MPI tasks, and
+    each rank runs one OpenMP thread per core. The threads are pinned through
+    `OMP_PLACES` and `OMP_PROC_BIND`.
+
+    Pure MPI jobs are bound to one core per rank, with `OMP_NUM_THREADS=1`.
+
+    If `ranks_per_node` is given, the ranks are distributed evenly across
+    nodes, e.g. `--map-by ppr:n:node:PE=k`.
+    """
+
+    _flavors = ["openmpi", "mpich", "intel", "srun"]
+
+    def __init__(
+        self,
+        flavor="openmpi",
+        ranks_per_node=None,
+        omp_places="cores",
+        omp_proc_bind="close",
+    ):
+        if flavor not in self._flavors:
+            raise ValueError(f"Unknown MPI flavor: {flavor}")
+
+        self._flavor = flavor
+        self._ranks_per_node = ranks_per_node
+        self._omp_places = omp_places
+        self._omp_proc_bind = omp_proc_bind
+
+    def wrap_cmd_mpi(self, job):
+        return _shell_cmd(*self.argv_mpi(job))
+
+    def wrap_cmd_mpi_omp(self, job):
+        return _shell_cmd(*self.argv_mpi_omp(job))
+
+    def argv_mpi(self, job):
+        return self._argv_hybrid(job, job.resources.n_mpi_tasks, 1)
+
+    def argv_mpi_omp(self, job):
+        r = job.resources
+        return self._argv_hybrid(job, r.n_mpi_tasks, self.cores_per_rank(r))
+
+    def cores_per_rank(self, resources):
+        cu = resources.cu
+        return max(1, cu.n_cores_per_cu // cu.n_mpi_tasks)
+
+    def _argv_hybrid(self, job, n_ranks, n_threads):
+        ppn = self._ranks_per_node
+        env = {
+            "OMP_NUM_THREADS": str(n_threads),
+            "OMP_PLACES": self._omp_places,
+            "OMP_PROC_BIND": self._omp_proc_bind,
+        }
+
+        if self._flavor == "openmpi":
+            mapping = "slot" if ppn is None else f"ppr:{ppn}:node"
+            launcher = ["mpirun", "-np", str(n_ranks)]
+            launcher += ["--map-by", f"{mapping}:PE={n_threads}", "--bind-to", "core"]
+
+        elif self._flavor == "mpich":
+            launcher = ["mpiexec", "-n", str(n_ranks)]
+            launcher += [] if ppn is None else ["-ppn", str(ppn)]
+            launcher += ["-bind-to", f"core:{n_threads}"]
+
+        elif self._flavor == "intel":
+            launcher = ["mpirun", "-n", str(n_ranks)]
+            launcher += [] if ppn is None else ["-ppn", str(ppn)]
+            env.update({"I_MPI_PIN": "1", "I_MPI_PIN_DOMAIN": "omp"})
+
+        else:
+            launcher = ["srun", f"--ntasks={n_ranks}", f"--cpus-per-task={n_threads}"]
+            if ppn is not None:
+                launcher += [f"--ntasks-per-node={ppn}"]
+            launcher += ["--cpu-bind=cores"]
+
+        return launcher + job.cmd, env
+
+
+class StagingWrapPolicy(WrapPolicy):
+    """Run jobs in node-local scratch instead of the shared filesystem.
+
+    The files `job.stage_in` are copied to a fresh directory below
+    `scratch_dir`, the command produced by `wrap_policy` is run there, and the
+    files matching `job.stage_out` are copied back to the original working
+    directory. Finally, the scratch directory is removed. The exit code is
+    that of the job, or 1 if staging failed.
+
+    The files are copied with
+        - "cp": `cp -r --parents`,
+        - "tar": streaming `tar c | tar x`, good for many small files,
+        - "parallel": up to `n_parallel` concurrent `cp`, good for a few large
+          files.
+
+    Jobs without staged files are passed through unchanged. The result is a
+    single shell command, hence this works for `LocalBS`, `LSF` and `SLURM`
+    alike, e.g.
+
+        scibs.LSF(wrap_policy=scibs.StagingWrapPolicy(scibs.EulerWrapPolicy()))
+
+    NOTE: The scratch directory is node-local, therefore this only makes sense
+          for jobs running on a single node.
+    """
+
+    def __init__(self, wrap_policy=None, scratch_dir=None, method="cp", n_parallel=4):
+        """
+        Args:
+            scratch_dir: The default is `${TMPDIR:-/tmp}`, consider `/dev/shm`.
+        """
+        if wrap_policy is None:
+            wrap_policy = DefaultWrapPolicy()
+
+        if method not in ["cp", "tar", "parallel"]:
+            raise ValueError(f"Unknown copy method: {method}")
+
+        self._wrap_policy = wrap_policy
+        self._scratch_dir = scratch_dir
+        self._method = method
+        self._n_parallel = n_parallel
+
+    def __call__(self, job):
+        cmd = self._wrap_policy(job)
+        if not self.needs_staging(job):
+            return cmd
+
+        return self.wrap_staging(job, cmd)
+
+    def argv(self, job):
+        argv, env = self._wrap_policy.argv(job)
+        if not self.needs_staging(job):
+            return argv, env
+
+        return ["sh", "-c", self.wrap_staging(job, shlex.join(argv))], env
+
+    def needs_staging(self, job):
+        return bool(job.stage_in or job.stage_out)
+
+    def wrap_staging(self, job, cmd):
+        if self._scratch_dir is None:
+            scratch_dir = '"${TMPDIR:-/tmp}"'
+        else:
+            scratch_dir = shlex.quote(self._scratch_dir)
+
+        # The inputs are literal paths, the outputs are patterns.
+        stage_in = " ".join(shlex.quote(path) for path in job.stage_in)
+        stage_out = " ".join(job.stage_out)
+
+        # The traps are set first, such that a job killed while creating the
+        # scratch directory doesn't leave it behind.
+        lines = [
+            "scibs_cwd=$(pwd)",
+            "scibs_scratch=",
+            'trap \'cd /; [ -z "$scibs_scratch" ] || rm -rf "$scibs_scratch"\' EXIT',
+            # Unlike bash, dash doesn't run the EXIT trap when killed.
+            "trap 'exit 129' HUP",
+            "trap 'exit 130' INT",
+            "trap 'exit 143' TERM",
+            # `mktemp` itself must not be killed before reporting the name.
+            f"scibs_scratch=$(trap '' HUP INT TERM; mktemp -d {scratch_dir}/scibs.XXXXXX)"
+            " || exit 1",
+        ]
+
+        if stage_in:
+            copy_in = self._copy(stage_in, '"$scibs_scratch"')
+            lines += [f"{copy_in} || exit 1"]
+
+        lines += ['cd "$scibs_scratch" || exit 1', f"( {cmd} )", "scibs_rc=$?"]
+
+        if stage_out:
+            copy_out = self._copy(stage_out, '"$scibs_cwd"')
+            lines += [f"{copy_out} || {{ [ $scibs_rc -ne 0 ] || scibs_rc=1; }}"]
+
+        lines += ["exit $scibs_rc"]
+
+        # A subshell, such that `exit` and `trap` don't affect anything else.
+        return "( " + "; ".join(lines) + " )"
+
+    def _copy(self, paths, dest):
+        if self._method == "tar":
+            # Without `pipefail`, the exit code of `tar -c` is passed out of
+            # the pipeline through fd 3.
+            return (
+                f"{{ scibs_tar_rc=$( {{ {{ tar -cf - {paths}; echo $? >&3; }}"
+                f" | tar -C {dest} -xf - >&4; }} 3>&1 )"
+                ' && [ "$scibs_tar_rc" -eq 0 ]; } 4>&1'
+            )
+
+        if self._method == "parallel":
+            return (
+                f"printf '%s\\n' {paths}"
+                f" | xargs -P {self._n_parallel} -I{{}} cp -r --parents {{}} {dest}/"
+            )
+
+        return f"cp -r --parents {paths} {dest}/"
+
+
+class ModuleWrapPolicy(WrapPolicy):
+    """Load environment modules once, instead of once per job.
+
+    Running `module load` takes seconds. Instead, the modules are loaded once
+    in a throw-away shell, and the resulting changes to the environment are
+    applied to every job, by `argv` as part of the environment delta, or by
+    `__call__` as `export`/`unset` in front of the command, e.g. inside batch
+    jobs.
+
+    The changes are cached in `cache_dir` as JSON, keyed by the modules, the
+    `load_cmd` and the state of Lmod, i.e. `MODULEPATH` (including the
+    modification time of its directories), the loaded modules and the version
+    of Lmod. Hence, they are only recomputed if one of those changes. Since
+    modules often prepend to variables such as `PATH`, the cached changes are
+    also recomputed if any variable they touch had a different value before
+    loading the modules.
+
+    The modules are loaded by running `load_cmd` with `shell`. The string
+    `{modules}` is replaced by the space separated list of modules, e.g.
+
+        scibs.LSF(
+            wrap_policy=scibs.ModuleWrapPolicy(
+                ["gcc/9.3.0", "openmpi"], wrap_policy=scibs.EulerWrapPolicy()
+            )
+        )
+
+    NOTE: The changes are computed where the policy is used, e.g. on the login
+          node, and assume compute nodes have the same module system.
+    """
+
+    _lmod_state_variables = [
+        "MODULEPATH",
+        "LOADEDMODULES",
+        "_LMFILES_",
+        "LMOD_VERSION",
+        "LMOD_SYSTEM_NAME",
+    ]
+
+    # Set by the shell itself, not by the modules.
+    _ignored_variables = {"_", "SHLVL", "PWD", "OLDPWD"}
+
+    def __init__(
+        self,
+        modules,
+        wrap_policy=None,
+        cache_dir=None,
+        load_cmd="module load {modules}",
+        shell="bash",
+    ):
+        """
+        Args:
+            cache_dir: The default is `~/.cache/scibs/modules`; `False`
+                       disables the on-disk cache.
+        """
+        if wrap_policy is None:
+            wrap_policy = DefaultWrapPolicy()
+
+        if cache_dir is None:
+            cache_dir = os.path.join(
+                os.path.expanduser("~"), ".cache", "scibs", "modules"
+            )
+
+        self._modules = list(modules)
+        self._wrap_policy = wrap_policy
+        self._cache_dir = cache_dir
+        self._load_cmd = load_cmd
+        self._shell = shell
+
+        self._env_delta = None
+        self._lock = threading.Lock()
+
+    def __call__(self, job):
+        cmd = self._wrap_policy(job)
+        exports = self.shell_exports()
+
+        return f"{exports} {cmd}" if exports else cmd
+
+    def argv(self, job):
+        argv, env = self._wrap_policy.argv(job)
+
+        # The job's own settings, e.g. `OMP_NUM_THREADS`, take precedence.
+        return argv, {**self.env_delta(), **env}
+
+    def shell_exports(self):
+        exports = []
+        for key, value in sorted(self.env_delta().items()):
+            if not _is_shell_variable(key):
+                # e.g. exported shell functions `BASH_FUNC_ml%%`.
+                continue
+
+            if value is None:
+                exports.append(f"unset {key};")
+            else:
+                exports.append(f"export {key}={shlex.quote(value)};")
+
+        return " ".join(exports)
+
+    def env_delta(self):
+        """The changes to the environment caused by loading the modules.
+
+        An entry `None` means the variable must be unset.
+        """
+        with self._lock:
+            if self._env_delta is None:
+                self._env_delta = self._cached_env_delta()
+
+            return self._env_delta
+
+    def cache_key(self):
+        state = {key: os.environ.get(key) for key in self._lmod_state_variables}
+
+        # Installing new modules changes the modification time.
+        modulepath = os.environ.get("MODULEPATH", "")
+        state["mtimes"] = [_mtime(d) for d in modulepath.split(":") if d]
+
+        key = json.dumps([self._modules, self._load_cmd, state], sort_keys=True)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _cached_env_delta(self):
+        if self._cache_dir is False:
+            return self.resolve()
+
+        path = os.path.join(self._cache_dir, f"{self.cache_key()}.json")
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+
+            if entry["before"] == _current_values(entry["env_delta"]):
+                return entry["env_delta"]
+
+        except (OSError, ValueError, KeyError):
+            pass
+
+        env_delta = self.resolve()
+        entry = {
+            "modules": self._modules,
+            "env_delta": env_delta,
+            "before": _current_values(env_delta),
+        }
+
+        # Jobs might resolve the same modules concurrently, hence the file is
+        # written atomically.
+        os.makedirs(self._cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+        return env_delta
+
+    def resolve(self):
+        """Load the modules and compute the changes to the environment."""
+
+        load_cmd = self._load_cmd.format(modules=shlex.join(self._modules))
+
+        cp = subprocess.run(
+            [self._shell, "-c", f"{load_cmd} 1>&2 && env -0"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+
+        if cp.returncode != 0:
+            stderr = cp.stderr.decode(errors="replace")
+            raise RuntimeError(f"Failed to load modules {self._modules}:\n{stderr}")
+
+        before = os.environ
+        after = _parse_env0(cp.stdout)
+
+        env_delta = {
+            key: value
+            for key, value in after.items()
+            if before.get(key) != value and key not in self._ignored_variables
+        }
+
+        for key in before:
+            if key not in after and key not in self._ignored_variables:
+                env_delta[key] = None
+
+        return env_delta
+
+
+def _current_values(env_delta):
+    return {key: os.environ.get(key) for key in env_delta}
+
+
+def _is_shell_variable(key):
+    return re.fullmatch("[A-Za-z_][A-Za-z0-9_]*", key) is not None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _parse_env0(stdout):
+    env = dict()
+    for entry in stdout.decode(errors="surrogateescape").split("\0"):
+        if "=" in entry:
+            key, value = entry.split("=", 1)
+            env[key] = value
+
+    return env
+
+
+def _shell_cmd(argv, env):
+    exports = [
+        f"unset {key};" if value is None else f"export {key}={shlex.quote(value)};"
+        for key, value in env.items()
+    ]
+    return " ".join(exports + argv)
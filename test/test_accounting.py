@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import datetime
+import os
+
+import scibs
+from scibs import accounting
+
+import pytest
+
+_DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _read(filename):
+    with open(os.path.join(_DATA, filename), "r") as f:
+        return f.read()
+
+
+def test_parse_sacct():
+    records = {r.job_id: r for r in accounting.parse_sacct(_read("sacct.txt"))}
+
+    assert sorted(records) == ["1001", "1002", "1003", "1004", "1005"]
+
+    sim = records["1001"]
+    assert (sim.name, sim.state, sim.n_cores) == ("sim", "COMPLETED", 8)
+    assert sim.elapsed == 600
+    assert sim.max_rss == 2 * 1024**3
+    assert sim.cpu_efficiency == pytest.approx(4800 / (600 * 8))
+
+    assert records["1003"].state == "FAILED"
+    assert records["1004"].elapsed == 86400
+    assert records["1005"].max_rss is None
+
+
+def test_parse_bacct():
+    records = accounting.parse_bacct(_read("bacct.txt"))
+    assert [r.job_id for r in records] == ["2001", "2002"]
+
+    sim = records[0]
+    assert (sim.name, sim.state, sim.n_cores) == ("sim", "COMPLETED", 4)
+    assert sim.elapsed == 1800
+    assert sim.max_rss is None
+    assert sim.total_rss == 3 * 1024**3
+    assert sim.cpu_efficiency == pytest.approx(6000 / (1800 * 4))
+
+    assert records[1].state == "FAILED"
+    assert records[1].n_cores == 2
+
+
+def test_parse_bhist():
+    records = accounting.parse_bhist(_read("bhist.txt"))
+    assert [r.job_id for r in records] == ["3001", "3002"]
+
+    sim = records[0]
+    assert (sim.name, sim.state, sim.n_cores) == ("sim", "COMPLETED", 4)
+    assert sim.elapsed == 1800
+    assert sim.total_rss == 3 * 1024**3
+    assert sim.cpu_efficiency == pytest.approx(6000 / (1800 * 4))
+
+    failed = records[1]
+    assert (failed.state, failed.n_cores) == ("FAILED", 2)
+    assert failed.elapsed == 60
+    assert failed.cpu_time == 50
+    assert failed.total_rss == 512 * 1024**2
+
+
+def test_summarize():
+    records = accounting.parse_sacct(_read("sacct.txt"))
+    summary = accounting.summarize(records, percentiles=(50, 100))
+
+    # Failed and cancelled jobs aren't considered.
+    assert summary["sim"]["n_jobs"] == 2
+    assert summary["sim"]["max_rss"][50] == 3 * 1024**3
+    assert summary["sim"]["elapsed"][100] == 1200
+    assert summary["post"]["n_jobs"] == 1
+
+
+def test_right_sizing():
+    records = accounting.parse_sacct(_read("sacct.txt"))
+    right_size = scibs.RightSizing(
+        accounting.summarize(records), percentile=100, margin=1.5, min_jobs=2
+    )
+
+    cu = scibs.CU(n_mpi_tasks=2, n_omp_threads=4)
+    r = scibs.CUResource(cu, n_cus=1, wall_clock=datetime.timedelta(hours=24))
+    job = right_size(scibs.Job(["sim"], r, name="sim"))
+
+    assert job.resources.wall_clock == datetime.timedelta(minutes=30)
+    assert job.resources.mem_per_cu == 2 * 6 * 1024**3
+    assert r.wall_clock == datetime.timedelta(hours=24)
+
+    # Too few samples.
+    r = scibs.OMPResource(n_omp_threads=1, wall_clock=datetime.timedelta(hours=48))
+    job = right_size(scibs.Job(["post"], r, name="post"))
+    assert job.resources is r
+
+
+def test_right_sizing_lsf():
+    records = accounting.parse_bacct(_read("bacct.txt"))
+    summary = accounting.summarize(records, percentiles=(100,))
+    right_size = scibs.RightSizing(summary, percentile=100, margin=1.0, min_jobs=1)
+
+    # The memory of the whole job is split among its tasks.
+    job = right_size(scibs.Job(["sim"], scibs.MPIResource(n_mpi_tasks=4), name="sim"))
+    assert job.resources.mem_per_task == 3 * 1024**3 // 4
+
+    job = right_size(scibs.Job(["sim"], scibs.OMPResource(n_omp_threads=4), name="sim"))
+    assert job.resources.total_memory == 3 * 1024**3
+
+
+def test_right_sizing_missing_percentile():
+    records = accounting.parse_sacct(_read("sacct.txt"))
+    summary = accounting.summarize(records, percentiles=(50, 100))
+
+    with pytest.raises(ValueError, match="95"):
+        scibs.RightSizing(summary)
@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import scibs
+from scibs.admission_policies import parse_psi
+
+
+class FakeSampler:
+    def __init__(self, samples):
+        self._samples = list(samples)
+
+    def __call__(self):
+        if len(self._samples) > 1:
+            return self._samples.pop(0)
+
+        return self._samples[0]
+
+
+def test_pressure_admission_hysteresis():
+    sample = FakeSampler([{"load": 0.5}, {"load": 1.2}, {"load": 0.95}, {"load": 0.85}])
+    policy = scibs.PressureAdmissionPolicy(max_load=1.0, hysteresis=0.1, sample=sample)
+
+    assert policy() is None
+    assert "load" in policy()
+
+    # Below the threshold, but not by enough.
+    assert policy() is not None
+    assert policy() is None
+
+
+def test_pressure_admission_psi_and_memory():
+    policy = scibs.PressureAdmissionPolicy(
+        min_available_memory=2e9,
+        sample=lambda: {"available_memory": 1e9},
+    )
+    assert "memory" in policy()
+
+    policy = scibs.PressureAdmissionPolicy(
+        max_psi={"io": 20.0},
+        sample=lambda: {"psi_io": 30.0, "psi_cpu": 90.0},
+    )
+    assert "io" in policy()
+
+
+def test_parse_psi():
+    text = (
+        "some avg10=1.50 avg60=0.80 avg300=0.20 total=12345\n"
+        "full avg10=0.50 avg60=0.10 avg300=0.00 total=2345\n"
+    )
+    assert parse_psi(text) == 1.5
+    assert parse_psi("") is None
+
+
+def test_local_bs_admission(tmp_path):
+    samples = [{"load": 2.0}] * 3 + [{"load": 0.0}]
+    policy = scibs.PressureAdmissionPolicy(
+        max_load=1.0, poll_interval=0.01, sample=FakeSampler(samples)
+    )
+
+    r = scibs.JustCoresResource()
+    with scibs.LocalBS(admission_policy=policy) as bs:
+        for k in range(3):
+            bs.submit(scibs.Job(["touch", f"job-{k}"], r, cwd=str(tmp_path)))
+
+    assert policy.reason is None
+    assert all((tmp_path / f"job-{k}").exists() for k in range(3))
+
+
+def test_pressure_admission_own_jobs():
+    # A machine with 4 CPUs, fully loaded by our own jobs.
+    busy = {"n_cpus": 4, "load": 1.0, "cpu_percent": 100.0, "psi_cpu": 0.5}
+
+    policy = scibs.PressureAdmissionPolicy(sample=lambda: busy)
+    assert policy() is None
+
+    policy = scibs.PressureAdmissionPolicy(
+        max_load=0.9, max_cpu_percent=90.0, sample=lambda: busy
+    )
+    assert policy(own_cores=4) is None
+    assert policy(own_cores=0) is not None
+
+
+def test_pressure_admission_per_cpu():
+    # Two of eight CPUs are saturated, the average is only 25%.
+    busy = {"n_cpus": 8, "cpu_percents": [100.0, 100.0] + [0.0] * 6}
+
+    policy = scibs.PressureAdmissionPolicy(max_cpu_percent=90.0, sample=lambda: busy)
+    assert policy(own_cores=0) is not None
+    assert policy(own_cores=1) is not None
+    assert policy(own_cores=2) is None
+
+    assert "cpu_percents" in scibs.admission_policies.sample_pressure()
+
+
+def test_local_bs_admission_own_jobs(tmp_path):
+    class OwnLoad(scibs.AdmissionPolicy):
+        poll_interval = 0.01
+
+        def __init__(self):
+            self.own_cores = []
+
+        def __call__(self, own_cores=0):
+            self.own_cores.append(own_cores)
+            return None
+
+    policy = OwnLoad()
+    r = scibs.JustCoresResource(n_cores=2)
+    with scibs.LocalBS(
+        local_resources=scibs.LocalResources(cores=4), admission_policy=policy
+    ) as bs:
+        for k in range(4):
+            bs.submit(scibs.Job(["sleep", "0.05"], r, cwd=str(tmp_path)))
+
+    assert policy.own_cores[:2] == [0, 2]
+    assert max(policy.own_cores) == 4
@@ -0,0 +1,180 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import datetime
+import os
+import subprocess
+
+import scibs
+
+import pytest
+
+
+@pytest.fixture
+def just_cores_resource():
+    return scibs.JustCoresResource(wall_clock=datetime.timedelta(hours=1))
+
+
+@pytest.fixture
+def omp_resources():
+    return scibs.OMPResource(
+        n_omp_threads=4,
+        total_memory=40 * 10**6,
+        wall_clock=datetime.timedelta(hours=1),
+    )
+
+
+def test_script_slurm(tmp_path, omp_resources):
+    job = scibs.Job(["foo", "--bar"], omp_resources, name="foo_bar", cwd="wd")
+
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    slurm = scibs.ScriptSLURM(submission_policy=dbg_policy, script_dir=str(tmp_path))
+    slurm.submit(job, dependency=scibs.AfterOK(123))
+
+    path = tmp_path / "foo_bar-1.sbatch"
+    assert dbg_policy.cmd == ["sbatch", "--dependency=afterok:123", str(path)]
+
+    expected = "\n".join(
+        [
+            "#!/bin/bash",
+            "#SBATCH -J foo_bar",
+            "#SBATCH --time 01:00:00",
+            "#SBATCH --mem-per-cpu=10",
+            "#SBATCH --cpus-per-task=4",
+            "",
+            f"cd {os.path.abspath('wd')} && export OMP_NUM_THREADS=4; foo --bar",
+            "",
+        ]
+    )
+    assert path.read_text() == expected
+
+    # Scripts of earlier submissions aren't overwritten.
+    slurm = scibs.ScriptSLURM(submission_policy=dbg_policy, script_dir=str(tmp_path))
+    slurm.submit(job)
+    assert dbg_policy.cmd == ["sbatch", str(tmp_path / "foo_bar-2.sbatch")]
+
+
+def test_script_slurm_submit_all(tmp_path, omp_resources):
+    jobs = [scibs.Job(["foo", str(k)], omp_resources) for k in range(3)]
+
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    slurm = scibs.ScriptSLURM(submission_policy=dbg_policy, script_dir=str(tmp_path))
+    slurm.submit_all(jobs)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"job-{k}.sbatch" for k in range(1, 4)
+    ]
+    assert dbg_policy.cmd == ["sbatch", str(tmp_path / "job-3.sbatch")]
+
+
+def test_script_lsf_group(tmp_path, omp_resources):
+    jobs = [scibs.Job(["foo", str(k)], omp_resources) for k in range(3)]
+
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    lsf = scibs.ScriptLSF(submission_policy=dbg_policy, script_dir=str(tmp_path))
+    lsf.submit_group(jobs, name="foos")
+
+    path = tmp_path / "foos-1.lsf"
+    assert dbg_policy.cmd == ["sh", "-c", f"bsub < {path}"]
+
+    lines = path.read_text().splitlines()
+    assert "#BSUB -J foos" in lines
+    assert "#BSUB -W 03:00" in lines
+    assert "#BSUB -R 'rusage[mem=10]'" in lines
+    assert lines[-3:] == [f"(export OMP_NUM_THREADS=4; foo {k})" for k in range(3)]
+
+
+def test_script_group_cwd(tmp_path, just_cores_resource, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    jobs = [
+        scibs.Job(["pwd", ">", "pwd-0"], just_cores_resource, cwd="a"),
+        scibs.Job(["pwd", ">", "pwd-1"], just_cores_resource, cwd="a/b"),
+        scibs.Job(["pwd", ">", "pwd-2"], just_cores_resource),
+    ]
+
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    slurm = scibs.ScriptSLURM(submission_policy=dbg_policy, script_dir=str(tmp_path))
+    slurm.submit_group(jobs, name="pwds")
+
+    subprocess.run(["bash", str(tmp_path / "pwds-1.sbatch")], cwd=tmp_path, check=True)
+
+    assert (tmp_path / "a" / "pwd-0").exists()
+    assert (tmp_path / "a" / "b" / "pwd-1").exists()
+    assert (tmp_path / "pwd-2").exists()
+
+
+class BashSubmissionPolicy(scibs.SubmissionPolicy):
+    """Runs the script right away, instead of `sbatch`."""
+
+    def __call__(self, cmd, cwd, env):
+        subprocess.run(["bash"] + cmd[1:], cwd=cwd, env=env, check=True)
+
+
+def test_script_slurm_relative_paths(tmp_path, just_cores_resource, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "wd").mkdir()
+
+    job = scibs.Job(["pwd", ">", "pwd.txt"], just_cores_resource, cwd="wd")
+    slurm = scibs.ScriptSLURM(submission_policy=BashSubmissionPolicy())
+    slurm.submit(job)
+
+    assert (tmp_path / "job-1.sbatch").exists()
+    assert (tmp_path / "wd" / "pwd.txt").read_text() == f"{tmp_path / 'wd'}\n"
+
+
+def test_script_slurm_submit_all_resume(tmp_path, just_cores_resource, monkeypatch):
+    jobs = [scibs.Job(["foo", str(k)], just_cores_resource) for k in range(3)]
+
+    path = tmp_path / "journal"
+    with scibs.Journal(path) as journal:
+        journal.record("complete", journal.key(jobs[1]), returncode=0)
+
+    with scibs.Journal(path) as journal:
+        dbg_policy = scibs.DebugSubmissionPolicy()
+        slurm = scibs.ScriptSLURM(
+            submission_policy=dbg_policy,
+            journal=journal,
+            script_dir=str(tmp_path / "scripts"),
+        )
+        slurm.resume()
+        slurm.submit_all(jobs)
+
+    # No script is written for the job that's done.
+    scripts = sorted((tmp_path / "scripts").iterdir())
+    assert [p.read_text().splitlines()[-1] for p in scripts] == ["foo 0", "foo 2"]
+
+
+def test_script_group_resume(tmp_path, just_cores_resource, monkeypatch):
+    jobs = [scibs.Job(["foo", str(k)], just_cores_resource) for k in range(3)]
+
+    class CountingSubmissionPolicy(scibs.DebugSubmissionPolicy):
+        def __call__(self, cmd, cwd, env):
+            super().__call__(cmd, cwd, env)
+            return 1234
+
+    path = tmp_path / "journal"
+    with scibs.Journal(path) as journal:
+        slurm = scibs.ScriptSLURM(
+            submission_policy=CountingSubmissionPolicy(),
+            journal=journal,
+            script_dir=str(tmp_path),
+        )
+        slurm.submit_group(jobs[:2], name="foos")
+
+    with scibs.Journal(path) as journal:
+        slurm = scibs.ScriptSLURM(
+            submission_policy=CountingSubmissionPolicy(),
+            journal=journal,
+            script_dir=str(tmp_path),
+        )
+        states = {1234: "RUNNING"}
+        monkeypatch.setattr(scibs.SLURM, "query_states", lambda self, ids: states)
+        slurm.resume()
+
+        handle = slurm.submit_group(jobs, name="foos")
+
+    assert handle.job_id == 1234
+    lines = (tmp_path / "foos-2.sbatch").read_text().splitlines()
+    assert lines[-1] == "foo 2"
+    assert "foo 0" not in lines
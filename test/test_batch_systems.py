@@ -1,6 +1,8 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import asyncio
+
 import scibs
 import datetime
 
@@ -315,3 +317,306 @@ def test_bb5_afterok(mpi_omp_resources):
     bb5.submit(job, dependency=scibs.AfterOK(job_id=123))
     assert dbg_policy.cmd == expected
     assert dbg_policy.cwd == wd
+
+
+class FakePackSubmissionPolicy(scibs.SubmissionPolicy):
+    def __init__(self):
+        self.packs = []
+
+    def __call__(self, cmd, cwd, env):
+        assert cmd[:2] == ["bsub", "-pack"]
+        with open(cmd[2]) as f:
+            lines = f.read().splitlines()
+
+        self.packs.append(lines)
+        n_submitted = sum(len(pack) for pack in self.packs)
+        return list(range(n_submitted - len(lines), n_submitted))
+
+
+def test_lsf_pack(mpi_resources):
+    jobs = [
+        scibs.Job(["foo", f"{k}"], mpi_resources, name=f"foo_{k}", cwd="wd")
+        for k in range(5)
+    ]
+
+    pack_policy = FakePackSubmissionPolicy()
+    with scibs.LSF(pack_size=2, pack_submission_policy=pack_policy) as lsf:
+        handles = [lsf.submit(job) for job in jobs]
+
+        assert len(pack_policy.packs) == 2
+        assert handles[4].job_id is None
+
+    assert [len(pack) for pack in pack_policy.packs] == [2, 2, 1]
+    assert pack_policy.packs[0][0] == (
+        "-cwd wd -J foo_0 -W 03:00 -R 'rusage[mem=50]' -n 10 'mpirun -np 10 foo 0'"
+    )
+    assert lsf.job_ids == list(zip(jobs, range(5)))
+    assert [handle.job_id for handle in handles] == list(range(5))
+
+
+def test_lsf_pack_envs(just_cores_resource):
+    envs = [None, {"A": "1"}, None, {"A": "1"}, {"A": "2"}]
+    jobs = [scibs.Job(["foo"], just_cores_resource, env=env) for env in envs]
+
+    pack_policy = FakePackSubmissionPolicy()
+    with scibs.LSF(pack_size=10, pack_submission_policy=pack_policy) as lsf:
+        for job in jobs:
+            lsf.submit(job)
+
+    assert [len(pack) for pack in pack_policy.packs] == [2, 2, 1]
+
+
+def test_lsf_pack_partial_failure(just_cores_resource, tmp_path):
+    class FailingPackSubmissionPolicy(scibs.SubmissionPolicy):
+        def __call__(self, cmd, cwd, env):
+            raise scibs.PartialSubmissionError("bsub failed", [100, 101])
+
+    jobs = [scibs.Job(["foo", str(k)], just_cores_resource) for k in range(4)]
+
+    with scibs.Journal(tmp_path / "journal") as journal:
+        lsf = scibs.LSF(
+            pack_size=10,
+            pack_submission_policy=FailingPackSubmissionPolicy(),
+            journal=journal,
+        )
+        handles = [lsf.submit(job) for job in jobs]
+        with pytest.raises(scibs.PartialSubmissionError):
+            lsf.flush()
+
+    assert [handle.job_id for handle in handles] == [100, 101, None, None]
+
+    with scibs.Journal(tmp_path / "journal") as journal:
+        assert sorted(journal.submitted_job_ids().values()) == [100, 101]
+
+
+def test_submit_async(just_cores_resource):
+    n_running = 0
+    max_running = 0
+
+    class SlowSubmissionPolicy(scibs.SubmissionPolicy):
+        def __init__(self):
+            self.n_submitted = 0
+
+        async def submit_async(self, cmd, cwd, env):
+            nonlocal n_running, max_running
+
+            n_running += 1
+            max_running = max(max_running, n_running)
+            await asyncio.sleep(0.01)
+            n_running -= 1
+
+            self.n_submitted += 1
+            return 1000 + self.n_submitted
+
+    lsf = scibs.LSF(submission_policy=SlowSubmissionPolicy())
+    lsf.max_concurrent_submissions = 3
+
+    async def submit_all():
+        jobs = [scibs.Job(["foo"], just_cores_resource) for _ in range(10)]
+        return await asyncio.gather(*(lsf.submit_async(job) for job in jobs))
+
+    job_ids = [handle.job_id for handle in asyncio.run(submit_all())]
+
+    assert sorted(job_ids) == list(range(1001, 1011))
+    assert max_running == 3
+
+    # Every call of `asyncio.run` has its own event loop.
+    job_ids = [handle.job_id for handle in asyncio.run(submit_all())]
+    assert sorted(job_ids) == list(range(1011, 1021))
+
+
+def test_submit_async_subprocess():
+    policy = scibs.LSFSubmissionPolicy()
+    cmd = ["echo", "Job <42> is submitted to queue <normal>."]
+
+    assert asyncio.run(policy.submit_async(cmd, cwd=None, env=None)) == 42
+
+
+def test_poll_states():
+    history = [
+        {1: "PENDING", 2: "PENDING"},
+        {1: "RUNNING", 2: "PENDING"},
+        {1: "COMPLETED", 2: "FAILED"},
+    ]
+    queried = []
+
+    async def query_states_async(job_ids):
+        queried.append(job_ids)
+        return history[len(queried) - 1]
+
+    async def collect():
+        poll = scibs.utilities.poll_states(query_states_async, [1, 2], interval=0)
+        return [event async for event in poll]
+
+    assert asyncio.run(collect()) == [
+        (1, "PENDING"),
+        (2, "PENDING"),
+        (1, "RUNNING"),
+        (1, "COMPLETED"),
+        (2, "FAILED"),
+    ]
+    assert len(queried) == 3
+
+
+def test_poll_states_unknown():
+    async def query_states_async(job_ids):
+        return {1: "UNKNOWN"}
+
+    async def collect():
+        poll = scibs.utilities.poll_states(
+            query_states_async, [1, 2], interval=0, max_unknown_polls=3
+        )
+        return [event async for event in poll]
+
+    assert asyncio.run(collect()) == [(1, "UNKNOWN"), (2, "UNKNOWN")]
+
+
+def test_active_job_ids():
+    states = {k: "COMPLETED" if k % 4 else "RUNNING" for k in range(16)}
+    job_ids = scibs.utilities.ActiveJobIDs(lambda ids: states, min_size=8)
+
+    for k in range(16):
+        job_ids.append(k)
+
+    # Pruned after adding jobs 8 and 14; the running jobs and 15 remain.
+    assert list(job_ids) == [0, 4, 8, 12, 15]
+
+    def broken(ids):
+        raise FileNotFoundError("sacct")
+
+    job_ids = scibs.utilities.ActiveJobIDs(broken, min_size=2)
+    for k in range(4):
+        job_ids.append(k)
+
+    assert len(job_ids) == 4
+
+
+def test_default_submission_policies_report_job_ids():
+    # Without job IDs, handles can't be waited for or cancelled.
+    for bs in [scibs.SBatchBB5(), scibs.LSF()]:
+        policies = bs._submission_policy._policies
+        assert isinstance(policies[0], scibs.StdOutSubmissionPolicy)
+        assert isinstance(
+            policies[1], (scibs.SLURMSubmissionPolicy, scibs.LSFSubmissionPolicy)
+        )
+
+    handle = scibs.JobHandle(scibs.SBatchBB5(), None)
+    with pytest.raises(RuntimeError):
+        handle.wait(poll_interval=0)
+
+
+def test_job_handle(monkeypatch, just_cores_resource):
+    class FakeSubmissionPolicy(scibs.SubmissionPolicy):
+        def __call__(self, cmd, cwd, env):
+            return 42
+
+    history = [{}, {42: "RUNNING"}, {42: "COMPLETED"}]
+    monkeypatch.setattr(scibs.SLURM, "query_states", lambda self, ids: history.pop(0))
+
+    bb5 = scibs.SBatchBB5(submission_policy=FakeSubmissionPolicy())
+    handle = bb5.submit(scibs.Job(["foo.sbatch"], just_cores_resource))
+
+    assert handle.backend is bb5
+    assert handle.job_id == 42
+    assert handle.status() == "UNKNOWN"
+    assert handle.wait(poll_interval=0) == "COMPLETED"
+    assert history == []
+
+
+def test_fail_fast_policy():
+    policy = scibs.FailFastPolicy(
+        max_failures=None, max_failure_ratio=0.5, min_finished=4
+    )
+
+    assert policy(True) is None
+    assert policy(True) is None
+    assert policy(False) is None
+    assert policy(False) is None
+    assert policy(True) == "cancel_pending"
+
+
+def test_slurm_cancel(monkeypatch, just_cores_resource):
+    class FakeSubmissionPolicy(scibs.SubmissionPolicy):
+        def __init__(self):
+            self.n_submitted = 0
+
+        def __call__(self, cmd, cwd, env):
+            self.n_submitted += 1
+            return 1000 + self.n_submitted
+
+    cmds = []
+    monkeypatch.setattr(
+        scibs.slurm.subprocess, "run", lambda cmd, **kwargs: cmds.append(cmd)
+    )
+
+    bb5 = scibs.SBatchBB5(submission_policy=FakeSubmissionPolicy())
+    handles = [
+        bb5.submit(scibs.Job(["foo.sbatch"], just_cores_resource)) for _ in range(3)
+    ]
+
+    bb5.cancel(handles[:2])
+    handles[2].cancel()
+    bb5.cancel_all(running=False)
+
+    assert cmds == [
+        ["scancel", "1001", "1002"],
+        ["scancel", "1003"],
+        ["scancel", "--state=PENDING", "1001", "1002", "1003"],
+    ]
+
+
+def test_watch_failures():
+    class FakeBackend:
+        def __init__(self):
+            self.history = [{1: "RUNNING", 2: "PENDING"}, {1: "FAILED", 2: "PENDING"}]
+            self.cancelled = None
+
+        def query_states(self, job_ids):
+            return self.history.pop(0)
+
+        def cancel_all(self, running=True):
+            self.cancelled = running
+
+    backend = FakeBackend()
+    handles = [scibs.JobHandle(backend, job_id) for job_id in [1, 2]]
+    policy = scibs.FailFastPolicy(max_failures=1)
+
+    action = scibs.watch_failures(backend, handles, policy, poll_interval=0)
+    assert action == "cancel_pending"
+    assert backend.cancelled is False
+
+
+def test_watch_failures_unknown():
+    class FakeBackend:
+        def __init__(self):
+            self.n_queries = 0
+
+        def query_states(self, job_ids):
+            self.n_queries += 1
+            return {1: "COMPLETED", 2: "UNKNOWN"}
+
+    backend = FakeBackend()
+    handles = [scibs.JobHandle(backend, job_id) for job_id in [1, 2, 3]]
+    policy = scibs.FailFastPolicy(max_failures=1)
+
+    action = scibs.watch_failures(
+        backend, handles, policy, poll_interval=0, max_unknown_polls=2
+    )
+    assert action is None
+    assert backend.n_queries == 2
+    assert policy.n_finished == 1
+
+
+def test_watch_failures_timeout():
+    class FakeBackend:
+        def query_states(self, job_ids):
+            return {job_id: "RUNNING" for job_id in job_ids}
+
+    backend = FakeBackend()
+    handles = [scibs.JobHandle(backend, 1)]
+    policy = scibs.FailFastPolicy()
+
+    action = scibs.watch_failures(
+        backend, handles, policy, poll_interval=0.01, timeout=0.05
+    )
+    assert action is None
@@ -0,0 +1,121 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import datetime
+import json
+import subprocess
+
+import scibs
+from scibs import cli, job_specs
+
+import pytest
+
+
+class CountingSubmissionPolicy(scibs.DebugSubmissionPolicy):
+    def __init__(self):
+        self.cmds = []
+
+    def __call__(self, cmd, cwd, env):
+        self.cmds.append(cmd)
+        return 1000 + len(self.cmds)
+
+
+class BashSubmissionPolicy(scibs.SubmissionPolicy):
+    def __call__(self, cmd, cwd, env):
+        subprocess.run(["bash"] + cmd[1:], cwd=cwd, env=env, check=True)
+        return 1001
+
+
+def test_job_from_spec():
+    spec = {
+        "cmd": "foo --bar 'a b'",
+        "name": "foo",
+        "resources": {"type": "omp", "n_omp_threads": 4, "wall_clock": "01:30:00"},
+    }
+    job = job_specs.job_from_spec(spec)
+
+    assert job.cmd == ["foo", "--bar", "a b"]
+    assert job.name == "foo"
+    assert job.resources.n_omp_threads == 4
+    assert job.resources.wall_clock == datetime.timedelta(hours=1, minutes=30)
+
+    with pytest.raises(ValueError):
+        job_specs.job_from_spec({"cmd": ["foo"], "resources": {"type": "nope"}})
+
+
+def test_csv_row_to_spec():
+    row = {"cmd": "foo --bar", "resources": "mpi", "n_mpi_tasks": "8", "cwd": ""}
+    spec = job_specs.csv_row_to_spec(row)
+
+    assert spec == {
+        "cmd": ["foo", "--bar"],
+        "resources": {"type": "mpi", "n_mpi_tasks": "8"},
+    }
+    assert job_specs.job_from_spec(spec).resources.n_mpi_tasks == 8
+
+
+def test_cu_from_csv():
+    row = {
+        "cmd": "foo",
+        "resources": "cu",
+        "cu": '{"n_mpi_tasks": 2, "n_omp_threads": 4}',
+        "n_cus": "3",
+    }
+    resources = job_specs.job_from_spec(job_specs.csv_row_to_spec(row)).resources
+
+    assert resources.n_mpi_tasks == 6
+    assert resources.n_omp_threads == 4
+
+    for cu in ["2", "{n_mpi_tasks: 2}", '{"n_cores": 2}']:
+        with pytest.raises(ValueError):
+            job_specs.resources_from_spec({"type": "cu", "cu": cu, "n_cus": 1})
+
+
+def test_cli_run_slurm_cwd(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scibs, "SLURMSubmissionPolicy", BashSubmissionPolicy)
+    (tmp_path / "run-1").mkdir()
+
+    path = tmp_path / "jobs.jsonl"
+    path.write_text(json.dumps({"cmd": ["touch", "done"], "cwd": "run-1"}) + "\n")
+
+    cli.main(["run", str(path), "--backend", "slurm"])
+    assert (tmp_path / "run-1" / "done").exists()
+
+
+def test_cli_run_local(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    with open(path, "w") as f:
+        for k in range(3):
+            spec = {"cmd": ["touch", f"job-{k}"], "cwd": str(tmp_path)}
+            f.write(json.dumps(spec) + "\n")
+
+    cli.main(["run", str(path), "--backend", "local", "--cores", "1"])
+
+    assert all((tmp_path / f"job-{k}").exists() for k in range(3))
+
+
+def test_cli_run_local_csv(tmp_path):
+    path = tmp_path / "jobs.csv"
+    path.write_text(f"cmd,cwd,resources,n_cores\ntouch done,{tmp_path},cores,1\n")
+
+    cli.main(["run", str(path), "--cores", "1"])
+    assert (tmp_path / "done").exists()
+
+
+def test_submit_specs_dependencies(tmp_path):
+    specs = [
+        {"cmd": ["prepare"], "name": "prepare"},
+        {"cmd": ["compute"], "after_ok": "prepare"},
+    ]
+
+    policy = CountingSubmissionPolicy()
+    bs = scibs.ScriptSLURM(submission_policy=policy, script_dir=str(tmp_path))
+    cli.submit_specs(bs, specs)
+    assert "--dependency=afterok:1001" in policy.cmds[1]
+
+    with pytest.raises(ValueError):
+        cli.submit_specs(bs, [{"cmd": ["compute"], "after_ok": "missing"}])
+
+    with pytest.raises(ValueError):
+        cli.submit_specs(scibs.LSF(submission_policy=policy), specs)
@@ -0,0 +1,104 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import socket
+import struct
+import threading
+
+import scibs
+
+import pytest
+
+
+@pytest.fixture
+def agents():
+    agents = [
+        scibs.WorkerAgent(local_resources=scibs.LocalResources(cores=n))
+        for n in [1, 2, 3]
+    ]
+
+    threads = [threading.Thread(target=agent.serve_forever) for agent in agents]
+    for thread in threads:
+        thread.start()
+
+    yield agents
+
+    for agent in agents:
+        agent.shutdown()
+
+    for thread in threads:
+        thread.join()
+
+
+def test_remote_resources():
+    hosts = [scibs.LocalResources(cores=2), scibs.LocalResources(cores=4)]
+    remote = scibs.RemoteResources(hosts)
+
+    r1 = remote.acquire(scibs.JustCoresResource(n_cores=3))
+    r2 = remote.acquire(scibs.JustCoresResource(n_cores=2))
+    r3 = remote.acquire(scibs.JustCoresResource(n_cores=2))
+
+    assert r1["host"] == 1
+    assert r2["host"] == 0
+    assert r3 is None
+
+    remote.release(r1)
+    assert hosts[1].available_cores == 4
+
+
+def test_distributed_bs(agents, tmp_path):
+    addresses = [agent.address for agent in agents]
+
+    jobs = []
+    for k in range(12):
+        cwd = tmp_path / f"job-{k}"
+        cwd.mkdir()
+
+        r = scibs.JustCoresResource(n_cores=1 + k % 3)
+        jobs.append(scibs.Job(["echo", f"{k}"], r, cwd=str(cwd)))
+
+    with scibs.DistributedBS(addresses) as dbs:
+        handles = [dbs.submit(job) for job in jobs]
+
+    for k in range(12):
+        assert (tmp_path / f"job-{k}" / "cout").read_text() == f"{k}\n"
+
+    assert all(handle.status() == "COMPLETED" for handle in handles)
+
+    # The agents can serve a second coordinator.
+    with scibs.DistributedBS(addresses) as dbs:
+        dbs.submit(jobs[0])
+
+
+def test_distributed_bs_missing_cwd(agents, tmp_path):
+    addresses = [agent.address for agent in agents]
+
+    missing = scibs.Job(
+        ["echo", "0"], scibs.JustCoresResource(), cwd=str(tmp_path / "missing")
+    )
+    existing = scibs.Job(["echo", "1"], scibs.JustCoresResource(), cwd=str(tmp_path))
+
+    with scibs.DistributedBS(addresses) as dbs:
+        h_missing = dbs.submit(missing)
+        h_existing = dbs.submit(existing)
+
+    assert h_missing.status() == "FAILED"
+    assert h_existing.status() == "COMPLETED"
+
+
+def test_worker_agent_survives_bad_coordinators(agents, tmp_path):
+    agent = agents[0]
+
+    # An unexpected message, a truncated line and a connection reset.
+    for payload in [b'{"type": "shutdown"}\n', b'{"type": "lau']:
+        with socket.create_connection(agent.address) as sock:
+            sock.sendall(payload)
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+
+    job = scibs.Job(["echo", "0"], scibs.JustCoresResource(), cwd=str(tmp_path))
+    with scibs.DistributedBS([agent.address]) as dbs:
+        handle = dbs.submit(job)
+
+    assert handle.status() == "COMPLETED"
@@ -0,0 +1,161 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import datetime
+import os
+import subprocess
+import time
+
+import scibs
+from scibs import emulator
+
+import pytest
+
+
+@pytest.fixture
+def emu(tmp_path, monkeypatch):
+    with emulator.Emulator(tmp_path / "state", cores=4) as emu:
+        monkeypatch.setenv("PATH", f"{emu.bin_dir}:{os.environ['PATH']}")
+        monkeypatch.chdir(tmp_path)
+        yield emu
+
+
+def _run(cmd):
+    return subprocess.run(cmd, check=True, capture_output=True, encoding="utf-8")
+
+
+def _wait_all(emu, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jobs = emu.query()
+        if all(job["state"] not in ("PENDING", "RUNNING") for job in jobs):
+            return {emulator._format_job_id(job): job["state"] for job in jobs}
+
+        time.sleep(0.05)
+
+    raise TimeoutError()
+
+
+def test_emulator_slurm_dependencies(emu, tmp_path):
+    r = scibs.JustCoresResource(wall_clock=datetime.timedelta(minutes=5))
+    slurm = scibs.ScriptSLURM(
+        submission_policy=scibs.SLURMSubmissionPolicy(),
+        script_dir=str(tmp_path / "scripts"),
+    )
+
+    with slurm:
+        first = slurm.submit(
+            scibs.Job(["echo", "first", ">", "log"], r, cwd=str(tmp_path))
+        )
+        second = slurm.submit(
+            scibs.Job(["echo", "second", ">>", "log"], r, cwd=str(tmp_path)),
+            dependency=scibs.AfterOK(first.job_id),
+        )
+        failing = slurm.submit(scibs.Job(["false"], r, cwd=str(tmp_path)))
+        never = slurm.submit(
+            scibs.Job(["touch", "never"], r, cwd=str(tmp_path)),
+            dependency=scibs.AfterOK(failing.job_id),
+        )
+
+    assert second.wait(poll_interval=0.05, timeout=30) == "COMPLETED"
+    assert never.wait(poll_interval=0.05, timeout=30) == "FAILED"
+    assert failing.status() == "FAILED"
+
+    assert (tmp_path / "log").read_text() == "first\nsecond\n"
+    assert not (tmp_path / "never").exists()
+
+    cp = _run(
+        ["sacct", "--parsable2", "-X", "-o", "JobID,State", "-j", str(never.job_id)]
+    )
+    assert cp.stdout.splitlines()[1] == f"{never.job_id}|CANCELLED"
+
+
+def test_emulator_lsf_pack(emu, tmp_path):
+    r = scibs.JustCoresResource()
+    lsf = scibs.LSF(
+        submission_policy=scibs.LSFSubmissionPolicy(),
+        pack_size=3,
+        pack_submission_policy=scibs.LSFPackSubmissionPolicy(),
+    )
+
+    with lsf:
+        handles = [
+            lsf.submit(scibs.Job(["touch", f"job-{k}"], r, cwd=str(tmp_path)))
+            for k in range(5)
+        ]
+
+    assert all(handle.wait(poll_interval=0.05) == "COMPLETED" for handle in handles)
+    assert sorted(os.listdir(tmp_path)) == [f"job-{k}" for k in range(5)] + ["state"]
+
+
+def test_emulator_arrays_and_limits(emu, tmp_path):
+    cp = _run(
+        [
+            "sbatch",
+            "--array=0-3%2",
+            "-o",
+            "out-%a",
+            "--wrap",
+            "echo $SLURM_ARRAY_TASK_ID",
+        ]
+    )
+    array_id = cp.stdout.split()[-1]
+
+    timeout = _run(["sbatch", "--parsable", "--time=0:1", "--wrap", "sleep 30"])
+    oom = _run(
+        [
+            "sbatch",
+            "--parsable",
+            "--mem=100M",
+            "--wrap",
+            "python3 -c 'bytearray(500 * 2**20)'",
+        ]
+    )
+    cancelled = _run(["sbatch", "--parsable", "--wrap", "sleep 30"])
+    _run(["scancel", cancelled.stdout.strip()])
+
+    states = _wait_all(emu)
+    assert [states[f"{array_id}_{k}"] for k in range(4)] == ["COMPLETED"] * 4
+    assert (tmp_path / "out-2").read_text() == "2\n"
+    assert states[timeout.stdout.strip()] == "TIMEOUT"
+    assert states[oom.stdout.strip()] == "FAILED"
+    assert states[cancelled.stdout.strip()] == "CANCELLED"
+
+    cp = _run(["bjobs", "-noheader", "-o", "jobid stat", cancelled.stdout.strip()])
+    assert cp.stdout.split() == [cancelled.stdout.strip(), "EXIT"]
+
+
+def test_emulator_failure_injection(tmp_path, monkeypatch):
+    with emulator.Emulator(tmp_path, cores=4, failure_rate=1.0, seed=0) as emu:
+        monkeypatch.setenv("PATH", f"{emu.bin_dir}:{os.environ['PATH']}")
+
+        cp = _run(["sbatch", "--parsable", "-c", "2", "--wrap", "true"])
+        assert _wait_all(emu) == {cp.stdout.strip(): "NODE_FAIL"}
+
+        cp = subprocess.run(
+            ["sbatch", "-c", "1000", "--wrap", "true"],
+            capture_output=True,
+            encoding="utf-8",
+        )
+        assert cp.returncode != 0
+        assert cp.stdout == ""
+        assert "sbatch: error" in cp.stderr
+
+
+def test_emulator_singleton(emu, tmp_path):
+    cmd = "echo start >> log; sleep 0.2; echo end >> log"
+    for _ in range(3):
+        _run(["sbatch", "-J", "single", "--dependency=singleton", "--wrap", cmd])
+
+    assert set(_wait_all(emu).values()) == {"COMPLETED"}
+    assert (tmp_path / "log").read_text() == "start\nend\n" * 3
+
+
+def test_emulator_missing_cwd(emu, tmp_path):
+    broken = _run(["sbatch", "--parsable", "-D", "/nonexistent", "--wrap", "true"])
+    fine = _run(["sbatch", "--parsable", "--wrap", "touch fine"])
+
+    states = _wait_all(emu)
+    assert states[broken.stdout.strip()] == "FAILED"
+    assert states[fine.stdout.strip()] == "COMPLETED"
+    assert (tmp_path / "fine").exists()
@@ -0,0 +1,82 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import json
+import os
+
+import scibs
+
+
+def test_environment_overlay():
+    base = {"PATH": "/bin", "HOME": "/home/foo"}
+
+    env = scibs.Environment(base)
+    env["OMP_NUM_THREADS"] = "4"
+    del env["HOME"]
+
+    assert env["PATH"] == "/bin"
+    assert "HOME" not in env
+    assert sorted(env) == ["OMP_NUM_THREADS", "PATH"]
+    assert len(env) == 2
+    assert env.delta == {"OMP_NUM_THREADS": "4", "HOME": None}
+    assert env.materialize() == {"PATH": "/bin", "OMP_NUM_THREADS": "4"}
+
+    # The base is shared, not modified.
+    assert base == {"PATH": "/bin", "HOME": "/home/foo"}
+
+
+def test_environment_on_top_of():
+    shared = scibs.Environment({"PATH": "/bin"}, {"FOO": "1"})
+
+    a = scibs.Environment.on_top_of(shared)
+    b = scibs.Environment.on_top_of(shared)
+    a["FOO"] = "a"
+    b.update_delta({"FOO": None, "BAR": "b"})
+
+    assert a.base is shared.base
+    assert shared["FOO"] == "1"
+    assert a.materialize() == {"PATH": "/bin", "FOO": "a"}
+    assert b.materialize() == {"PATH": "/bin", "BAR": "b"}
+
+    env = scibs.Environment.on_top_of(None)
+    assert env.base is os.environ
+
+
+def test_environment_on_top_of_dict():
+    shared = {"PATH": "/bin"}
+
+    a = scibs.Environment.on_top_of(shared)
+    b = scibs.Environment.on_top_of(shared)
+    assert a.base is b.base
+
+    # Changes to the `dict` are seen by later layers only.
+    shared["FOO"] = "1"
+    c = scibs.Environment.on_top_of(shared)
+    assert c.base is not a.base
+    assert "FOO" in c and "FOO" not in a
+
+
+def test_environment_sees_os_environ(monkeypatch):
+    env = scibs.Environment.on_top_of(None)
+    env["SCIBS_BAR"] = "bar"
+
+    monkeypatch.setenv("SCIBS_FOO", "foo")
+    assert env.materialize()["SCIBS_FOO"] == "foo"
+    assert env.materialize()["SCIBS_BAR"] == "bar"
+
+    assert scibs.launch_policies._apply_env_delta(None, {})["SCIBS_FOO"] == "foo"
+
+
+def test_gpu_resource_policy_shares_environment():
+    r = scibs.JustGPUsResource(n_gpus=1)
+    jobs = [scibs.Job(["foo"], r) for _ in range(2)]
+
+    policy = scibs.GPUResourcePolicy()
+    for k, job in enumerate(jobs):
+        policy(job, {"gpu_ids": [k]})
+
+    assert jobs[0].env.base is jobs[1].env.base
+    assert jobs[0].env.delta == {"CUDA_VISIBLE_DEVICES": "0"}
+
+    env = scibs.environment.materialize(jobs[1].env)
+    assert json.loads(json.dumps(env))["CUDA_VISIBLE_DEVICES"] == "1"
@@ -0,0 +1,170 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import scibs
+
+import pytest
+
+
+class CountingSubmissionPolicy(scibs.DebugSubmissionPolicy):
+    def __init__(self):
+        self.n_submitted = 0
+
+    def __call__(self, cmd, cwd, env):
+        super().__call__(cmd, cwd, env)
+        self.n_submitted += 1
+        return 1000 + self.n_submitted
+
+
+def test_journal_keys(tmp_path):
+    job = scibs.Job(["foo"], scibs.JustCoresResource())
+    other = scibs.Job(["foo"], scibs.JustCoresResource(), cwd="bar")
+
+    with scibs.Journal(tmp_path / "journal") as journal:
+        keys = [journal.key(job), journal.key(job), journal.key(other)]
+
+    assert keys[0] != keys[1]
+    assert keys[0].split("-")[0] == keys[1].split("-")[0]
+    assert keys[0] != keys[2]
+
+
+def test_journal_torn_write(tmp_path):
+    path = tmp_path / "journal"
+
+    with scibs.Journal(path) as journal:
+        journal.record("complete", "a-0", returncode=0)
+
+    with open(path, "a") as f:
+        f.write('{"event": "compl')
+
+    with scibs.Journal(path) as journal:
+        assert journal.is_finished("a-0")
+        journal.record("complete", "b-0", returncode=0)
+
+    with scibs.Journal(path) as journal:
+        assert journal.is_finished("a-0")
+        assert journal.is_finished("b-0")
+
+
+def test_local_bs_resume(tmp_path):
+    path = tmp_path / "journal"
+    r = scibs.JustCoresResource()
+
+    def make_jobs():
+        jobs = []
+        for k in range(4):
+            cwd = tmp_path / f"job-{k}"
+            cwd.mkdir(exist_ok=True)
+            cmd = ["false"] if k == 3 else ["echo", str(k), ">>", "count"]
+            jobs.append(scibs.Job(cmd, r, cwd=str(cwd)))
+
+        return jobs
+
+    with scibs.Journal(path) as journal:
+        with scibs.LocalBS(journal=journal) as bs:
+            for job in make_jobs()[:2]:
+                bs.submit(job)
+
+    with scibs.Journal(path) as journal:
+        bs = scibs.LocalBS(journal=journal)
+        bs.resume()
+
+        with bs:
+            for job in make_jobs():
+                bs.submit(job)
+
+    assert (tmp_path / "job-0" / "count").read_text() == "0\n"
+    assert (tmp_path / "job-2" / "count").read_text() == "2\n"
+
+    with scibs.Journal(path) as journal:
+        keys = [journal.key(job) for job in make_jobs()]
+        assert [journal.is_finished(key) for key in keys] == [True] * 3 + [False]
+
+
+def test_slurm_resume(tmp_path, monkeypatch):
+    path = tmp_path / "journal"
+    jobs = [
+        scibs.Job(["foo.sbatch", str(k)], scibs.JustCoresResource()) for k in range(4)
+    ]
+
+    policy = CountingSubmissionPolicy()
+    with scibs.Journal(path) as journal:
+        bb5 = scibs.SBatchBB5(submission_policy=policy, journal=journal)
+        for job in jobs[:3]:
+            bb5.submit(job)
+
+    assert policy.n_submitted == 3
+
+    states = {1001: "COMPLETED", 1002: "FAILED", 1003: "PENDING"}
+    monkeypatch.setattr(scibs.SLURM, "query_states", lambda self, ids: states)
+
+    policy = CountingSubmissionPolicy()
+    with scibs.Journal(path) as journal:
+        bb5 = scibs.SBatchBB5(submission_policy=policy, journal=journal)
+        bb5.resume()
+
+        for job in jobs:
+            bb5.submit(job)
+
+    # Only the failed and the new job are submitted.
+    assert policy.n_submitted == 2
+
+
+def test_resume_requires_journal():
+    with pytest.raises(RuntimeError):
+        scibs.LocalBS().resume()
+
+
+def test_parse_states():
+    sacct = "408469|COMPLETED\n408470|CANCELLED by 1234\n408471|PENDING\n"
+    assert scibs.slurm.parse_sacct_states(sacct) == {
+        408469: "COMPLETED",
+        408470: "FAILED",
+        408471: "PENDING",
+    }
+
+    bjobs = "123 DONE\n124 EXIT\n125 RUN\nJob <126> is not found\n"
+    assert scibs.lsf.parse_bjobs_states(bjobs) == {
+        123: "COMPLETED",
+        124: "FAILED",
+        125: "RUNNING",
+    }
+
+
+def test_parse_array_states():
+    sacct = "1001_0|COMPLETED\n1001_[1-9%2]|PENDING\n1002|RUNNING\n"
+    assert scibs.slurm.parse_sacct_states(sacct) == {
+        "1001_0": "COMPLETED",
+        "1001_[1-9%2]": "PENDING",
+        1002: "RUNNING",
+    }
+
+
+def test_resume_without_job_ids(tmp_path):
+    path = tmp_path / "journal"
+    job = scibs.Job(["foo.sbatch"], scibs.JustCoresResource())
+
+    with scibs.Journal(path) as journal:
+        policy = scibs.DebugSubmissionPolicy()
+        scibs.SBatchBB5(submission_policy=policy, journal=journal).submit(job)
+
+    with scibs.Journal(path) as journal:
+        bb5 = scibs.SBatchBB5(journal=journal)
+        with pytest.raises(RuntimeError):
+            bb5.resume()
+
+
+def test_journal_keys_env_and_args(tmp_path):
+    r = scibs.JustCoresResource()
+    jobs = [
+        scibs.Job(["foo"], r),
+        scibs.Job(["foo"], r, env={"A": "1"}),
+        scibs.Job(["foo"], r, env={"A": "2"}),
+        scibs.PythonJob(sum, r, args=([0] * 2000 + [1],)),
+        scibs.PythonJob(sum, r, args=([0] * 2000 + [2],)),
+    ]
+
+    with scibs.Journal(tmp_path / "journal") as journal:
+        digests = {journal.key(job).split("-")[0] for job in jobs}
+
+    assert len(digests) == len(jobs)
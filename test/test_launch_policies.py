@@ -0,0 +1,192 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
+
+import os
+import sys
+
+import scibs
+
+import pytest
+
+
+def test_needs_shell():
+    policy = scibs.SpawnLaunchPolicy()
+
+    def job(cmd):
+        return scibs.Job(cmd, scibs.JustCoresResource())
+
+    assert not policy.needs_shell(job(["foo", "--bar"]))
+    assert not policy.needs_shell(job(["foo", "a file.txt"]))
+    assert policy.needs_shell(job(["foo --bar"]))
+    assert policy.needs_shell(job(["echo", "${HOME}"]))
+    assert policy.needs_shell(job(["foo", ">", "out.txt"]))
+
+
+@pytest.mark.parametrize("with_cwd", [True, False])
+def test_spawn_launch_policy(tmp_path, monkeypatch, with_cwd):
+    script = "import os, sys; print(sys.argv[1], os.environ['OMP_NUM_THREADS'])"
+    r = scibs.OMPResource(n_omp_threads=3)
+
+    if with_cwd:
+        job = scibs.Job([sys.executable, "-c", script, "a b"], r, cwd=str(tmp_path))
+    else:
+        monkeypatch.chdir(tmp_path)
+        job = scibs.Job([sys.executable, "-c", script, "a b"], r)
+
+    policy = scibs.SpawnLaunchPolicy()
+    with open(tmp_path / "cout", "w") as stdout, open(tmp_path / "cerr", "w") as stderr:
+        proc = policy(job, scibs.DefaultWrapPolicy(), stdout, stderr)
+        assert proc.wait() == 0
+
+    assert (tmp_path / "cout").read_text() == "a b 3\n"
+
+
+def test_local_bs_spawn(tmp_path):
+    r = scibs.JustCoresResource()
+    jobs = [
+        scibs.Job(["echo", "a  b"], r, cwd=str(tmp_path / "argv")),
+        scibs.Job(["echo 'c  d'"], r, cwd=str(tmp_path / "shell")),
+    ]
+
+    with scibs.LocalBS(launch_policy=scibs.SpawnLaunchPolicy()) as bs:
+        for job in jobs:
+            (tmp_path / job.cwd).mkdir()
+            bs.submit(job)
+
+    assert (tmp_path / "argv" / "cout").read_text() == "a  b\n"
+    assert (tmp_path / "shell" / "cout").read_text() == "c  d\n"
+
+
+def test_limited_launch_policy_rlimits(tmp_path):
+    script = (
+        "import os\n"
+        "print(len(os.sched_getaffinity(0)))\n"
+        "try:\n"
+        "    x = bytearray(2 * 10**9)\n"
+        "except MemoryError:\n"
+        "    print('MemoryError')\n"
+    )
+    r = scibs.JustCoresResource(n_cores=1, total_memory=500 * 10**6)
+    job = scibs.Job([sys.executable, "-c", f'"{script}"'], r, cwd=str(tmp_path))
+
+    policy = scibs.LimitedLaunchPolicy(use_cgroups=False)
+    assert not policy.uses_cgroups
+
+    with open(tmp_path / "cout", "w") as stdout, open(tmp_path / "cerr", "w") as stderr:
+        proc = policy(job, scibs.DefaultWrapPolicy(), stdout, stderr)
+        assert proc.wait() == 0
+        assert not proc.oom_killed
+
+    assert (tmp_path / "cout").read_text() == "1\nMemoryError\n"
+
+
+def test_limited_launch_policy_releases_cpus(tmp_path):
+    policy = scibs.LimitedLaunchPolicy(use_cgroups=False)
+    n_cpus = len(os.sched_getaffinity(0))
+
+    r = scibs.JustCoresResource(n_cores=n_cpus)
+    with scibs.LocalBS(launch_policy=policy) as bs:
+        for k in range(3):
+            bs.submit(scibs.Job(["true"], r, cwd=str(tmp_path)))
+
+    assert policy._acquire_cpus(n_cpus) is not None
+
+
+def test_limited_launch_policy_cgroup(tmp_path, monkeypatch):
+    # A plain directory stands in for a delegated cgroup.
+    monkeypatch.setattr(scibs.launch_policies, "_enable_controllers", lambda r: True)
+    root = tmp_path / "cgroup"
+    root.mkdir()
+
+    r = scibs.OMPResource(n_omp_threads=2, total_memory=10**9)
+    job = scibs.Job(["true"], r, cwd=str(tmp_path))
+
+    policy = scibs.LimitedLaunchPolicy(cgroup_root=str(root))
+    cgroup = policy._make_cgroup(scibs.resource_demand(job.resources))
+
+    with open(os.path.join(cgroup, "cpu.max")) as f:
+        assert f.read() == "200000 100000"
+
+    with open(os.path.join(cgroup, "memory.max")) as f:
+        assert f.read() == str(10**9)
+
+
+def test_spawn_launch_policy_environment(tmp_path):
+    env = scibs.Environment({"PATH": os.environ["PATH"]}, {"SCIBS_FOO": "foo"})
+    r = scibs.OMPResource(n_omp_threads=2)
+    job = scibs.Job(["env"], r, env=env)
+
+    with open(tmp_path / "cout", "w") as cout:
+        proc = scibs.SpawnLaunchPolicy()(job, scibs.DefaultWrapPolicy(), cout, cout)
+        assert proc.wait() == 0
+
+    lines = (tmp_path / "cout").read_text().splitlines()
+    assert "SCIBS_FOO=foo" in lines
+    assert "OMP_NUM_THREADS=2" in lines
+    assert "OMP_NUM_THREADS" not in env
+
+
+def test_limited_launch_policy_oom(tmp_path, monkeypatch):
+    # A plain directory stands in for a delegated cgroup. The job pretends to
+    # have been killed by the OOM killer.
+    monkeypatch.setattr(scibs.launch_policies, "_enable_controllers", lambda r: True)
+    root = tmp_path / "cgroup"
+    root.mkdir()
+
+    policy = scibs.LimitedLaunchPolicy(cgroup_root=str(root))
+    assert policy.uses_cgroups
+
+    cgroup = root / f"scibs-{os.getpid()}-0"
+    cmd = ["echo", "oom_kill 1", ">", str(cgroup / "memory.events")]
+    job = scibs.Job(cmd, scibs.JustCoresResource(total_memory=10**9))
+
+    with open(tmp_path / "cerr", "w") as stderr:
+        proc = policy(job, scibs.DefaultWrapPolicy(), stderr, stderr)
+        proc.wait()
+
+    assert proc.oom_killed
+    assert "OOM killer" in (tmp_path / "cerr").read_text()
+    assert (cgroup / "cgroup.procs").read_text() == str(proc.pid)
+
+
+def test_delegate_own_cgroup(tmp_path, monkeypatch):
+    own = tmp_path / "cgroup"
+    own.mkdir()
+    (own / "cgroup.controllers").write_text("cpuset cpu io memory pids\n")
+    monkeypatch.setattr(scibs.launch_policies, "_own_cgroup", lambda: str(own))
+
+    leaf = own / f"scibs-{os.getpid()}-driver"
+
+    # Something else lives in our cgroup, hence nothing must change.
+    monkeypatch.setattr(scibs.launch_policies, "_enable_controllers", lambda r: False)
+    assert scibs.launch_policies._delegate_own_cgroup() is None
+    assert (own / "cgroup.procs").read_text() == str(os.getpid())
+
+    # Unlike a real cgroup, the plain directory can't be removed.
+    (leaf / "cgroup.procs").unlink()
+    leaf.rmdir()
+
+    monkeypatch.setattr(scibs.launch_policies, "_enable_controllers", lambda r: True)
+    assert scibs.launch_policies._delegate_own_cgroup() == str(own)
+    assert (leaf / "cgroup.procs").read_text() == str(os.getpid())
+
+
+def test_limited_launch_policy_restores_own_cgroup(tmp_path, monkeypatch):
+    own = tmp_path / "cgroup"
+    own.mkdir()
+    (own / "cgroup.controllers").write_text("cpu memory\n")
+    monkeypatch.setattr(scibs.launch_policies, "_own_cgroup", lambda: str(own))
+    monkeypatch.setattr(scibs.launch_policies, "_enable_controllers", lambda r: True)
+
+    leaf = own / f"scibs-{os.getpid()}-driver"
+
+    with scibs.LimitedLaunchPolicy() as policy:
+        assert policy.uses_cgroups
+        assert (leaf / "cgroup.procs").read_text() == str(os.getpid())
+
+        # Unlike a real cgroup, the plain directory can't be removed.
+        (leaf / "cgroup.procs").unlink()
+
+    assert not leaf.exists()
+    assert (own / "cgroup.procs").read_text() == str(os.getpid())
+    assert (own / "cgroup.subtree_control").read_text() == "-cpu -memory"
@@ -1,3 +1,7 @@
+import functools
+import os
+import time
+
 import scibs
 import pytest
 
@@ -16,3 +20,193 @@ def test_local_bs_with_gpus():
     with scibs.LocalBS(**local_bs_kwargs) as queue:
         for k in range(10):
             queue.submit(j)
+
+
+def _square(x):
+    return x * x
+
+
+def _fail(msg):
+    raise ValueError(msg)
+
+
+def test_local_bs_python_jobs(tmp_path):
+    r = scibs.JustCoresResource(n_cores=1)
+    shell_job = scibs.Job(["echo", "shell"], r, cwd=str(tmp_path))
+
+    with scibs.LocalBS(local_resources=scibs.LocalResources(cores=2)) as bs:
+        handles = [bs.submit(scibs.PythonJob(_square, r, args=(k,))) for k in range(5)]
+        shell_handle = bs.submit(shell_job)
+        failing = bs.submit(scibs.PythonJob(_fail, r, kwargs={"msg": "bad input"}))
+
+    assert [h.result() for h in handles] == [k * k for k in range(5)]
+    assert (tmp_path / "cout").read_text() == "shell\n"
+    assert shell_handle.future is None
+    assert shell_handle.status() == "COMPLETED"
+    assert failing.status() == "FAILED"
+
+    with pytest.raises(ValueError, match="bad input"):
+        failing.result()
+
+
+def test_local_bs_cancelled_python_job():
+    r = scibs.JustCoresResource(n_cores=1)
+
+    with scibs.LocalBS(local_resources=scibs.LocalResources(cores=1)) as bs:
+        cancelled = bs.submit(scibs.PythonJob(_square, r, args=(2,)))
+        handle = bs.submit(scibs.PythonJob(_square, r, args=(3,)))
+        assert cancelled.future.cancel()
+
+    # The cores of the cancelled job were released.
+    assert cancelled.future.cancelled()
+    assert cancelled.status() == "FAILED"
+    assert handle.result() == 9
+
+
+def test_gpu_resource_policy_mps():
+    r = scibs.SharedGPUResource(gpu_memory=20 * 10**9)
+    job = scibs.Job(["foo"], r)
+
+    policy = scibs.GPUResourcePolicy(mps=True)
+    policy(job, {"gpu_ids": [3], "gpu_fraction": 0.25})
+
+    assert job.env["CUDA_VISIBLE_DEVICES"] == "3"
+    assert job.env["CUDA_MPS_ACTIVE_THREAD_PERCENTAGE"] == "25"
+    assert job.env["CUDA_MPS_PINNED_DEVICE_MEM_LIMIT"] == "0=20000M"
+
+
+def test_local_bs_submit_all(tmp_path):
+    r = scibs.JustCoresResource()
+    jobs = (scibs.Job(["touch", f"job-{k}"], r, cwd=str(tmp_path)) for k in range(20))
+
+    with scibs.LocalBS(
+        local_resources=scibs.LocalResources(cores=2),
+        schedule=functools.partial(scibs.LookaheadSchedule, lookahead=4),
+    ) as bs:
+        bs.submit(scibs.Job(["touch", "single"], r, cwd=str(tmp_path)))
+        bs.submit_all(jobs)
+
+    assert (tmp_path / "single").exists()
+    assert all((tmp_path / f"job-{k}").exists() for k in range(20))
+
+
+def test_local_job_handles(tmp_path):
+    r = scibs.JustCoresResource()
+
+    with scibs.LocalBS(local_resources=scibs.LocalResources(cores=1)) as bs:
+        ok = bs.submit(scibs.Job(["true"], r, cwd=str(tmp_path)))
+        failing = bs.submit(scibs.Job(["false"], r, cwd=str(tmp_path)))
+        cancelled = bs.submit(scibs.Job(["touch", "cancelled"], r, cwd=str(tmp_path)))
+
+        assert ok.status() == "PENDING"
+        cancelled.cancel()
+
+    assert ok.wait() == "COMPLETED"
+    assert failing.wait() == "FAILED"
+    assert cancelled.wait() == "FAILED"
+    assert cancelled.is_cancelled
+    assert not (tmp_path / "cancelled").exists()
+
+
+def test_local_bs_fail_fast(tmp_path):
+    r = scibs.JustCoresResource()
+    policy = scibs.FailFastPolicy(max_failures=1)
+
+    with scibs.LocalBS(
+        local_resources=scibs.LocalResources(cores=1), failure_policy=policy
+    ) as bs:
+        failing = bs.submit(scibs.Job(["false"], r, cwd=str(tmp_path)))
+        others = [
+            bs.submit(scibs.Job(["touch", f"job-{k}"], r, cwd=str(tmp_path)))
+            for k in range(5)
+        ]
+
+    assert failing.status() == "FAILED"
+    assert all(handle.is_cancelled for handle in others)
+    assert not any((tmp_path / f"job-{k}").exists() for k in range(5))
+
+
+def test_local_bs_cancel_running(tmp_path):
+    r = scibs.JustCoresResource()
+    policy = scibs.FailFastPolicy(max_failures=1, cancel_running=True)
+
+    t0 = time.monotonic()
+    with scibs.LocalBS(
+        local_resources=scibs.LocalResources(cores=2), failure_policy=policy
+    ) as bs:
+        # The shell forks `sleep`, which must be killed too.
+        slow = bs.submit(scibs.Job(["sleep 30; true"], r, cwd=str(tmp_path)))
+        bs.submit(scibs.Job(["sleep 0.2; false"], r, cwd=str(tmp_path)))
+
+    assert time.monotonic() - t0 < 10.0
+    assert slow.is_cancelled
+    assert slow.status() == "FAILED"
+
+
+def test_prefetcher(tmp_path, monkeypatch):
+    prefetched = []
+    monkeypatch.setattr(scibs.prefetch, "_prefetch_file", prefetched.append)
+
+    r = scibs.JustCoresResource()
+    jobs = []
+    for k in range(4):
+        (tmp_path / f"input-{k}").write_bytes(b"x" * 1000)
+        jobs.append(scibs.Job(["foo"], r, cwd=str(tmp_path), inputs=[f"input-{k}"]))
+
+    schedule = scibs.GreedySchedule(jobs, scibs.LocalResources(cores=1))
+
+    # Only the first two jobs fit into the budget.
+    with scibs.Prefetcher(lookahead=3, memory_budget=2500, n_threads=1) as prefetcher:
+        prefetcher(schedule.upcoming(prefetcher.lookahead))
+        prefetcher._planning.result()
+
+        schedule.next_job()
+        prefetcher(schedule.upcoming(prefetcher.lookahead))
+        prefetcher._planning.result()
+
+        prefetcher._pool.shutdown(wait=True)
+
+    names = [os.path.basename(path) for path in prefetched]
+    assert names == ["input-0", "input-1", "input-2"]
+
+
+def test_prefetcher_recovers_from_errors(tmp_path, monkeypatch):
+    prefetched = []
+    monkeypatch.setattr(scibs.prefetch, "_prefetch_file", prefetched.append)
+
+    class FlakyPrefetcher(scibs.Prefetcher):
+        n_calls = 0
+
+        def input_files(self, job):
+            self.n_calls += 1
+            if self.n_calls == 1:
+                raise ValueError("flaky")
+
+            return super().input_files(job)
+
+    (tmp_path / "input").write_text("42\n")
+    r = scibs.JustCoresResource()
+    job = scibs.Job(["foo"], r, cwd=str(tmp_path), inputs=["input"])
+
+    with FlakyPrefetcher(memory_budget=1000, n_threads=1) as prefetcher:
+        prefetcher([job])
+        prefetcher._planning.result()
+        assert not prefetcher._is_planning
+
+        prefetcher([job])
+        prefetcher._planning.result()
+        prefetcher._pool.shutdown(wait=True)
+
+    assert prefetched == [str(tmp_path / "input")]
+
+
+def test_local_bs_prefetcher(tmp_path):
+    (tmp_path / "input").write_text("42\n")
+    r = scibs.JustCoresResource()
+
+    with scibs.LocalBS(prefetcher=scibs.Prefetcher(lookahead=2)) as bs:
+        for k in range(3):
+            job = scibs.Job(["cat", "input"], r, cwd=str(tmp_path), inputs=["input"])
+            bs.submit(job)
+
+    assert (tmp_path / "cout").read_text() == "42\n"
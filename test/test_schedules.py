@@ -48,3 +48,343 @@ def test_local_gpu_resource():
     # lr.release(r7)
 
     assert sorted(lr._gpus) == sorted(available_gpus)
+
+
+NVIDIA_SMI_TOPO = """
+        GPU0    GPU1    GPU2    GPU3    CPU Affinity    NUMA Affinity
+GPU0     X      NV4     PIX     SYS     0-15            0
+GPU1    NV4      X      PIX     SYS     0-15            0
+GPU2    PIX     PIX      X      NV2     16-31           1
+GPU3    SYS     SYS     NV2      X      16-31           1
+
+Legend:
+
+  X    = Self
+  SYS  = Connection traversing PCIe as well as the SMP interconnect
+"""
+
+
+def test_gpu_topology_nvidia_smi():
+    topology = scibs.GPUTopology.from_nvidia_smi_output(NVIDIA_SMI_TOPO)
+
+    assert topology.distance(0, 1) < topology.distance(2, 3)
+    assert topology.distance(2, 3) < topology.distance(0, 2)
+    assert topology.distance(0, 2) < topology.distance(0, 3)
+    assert topology.span([0, 1, 2]) == topology.distance(0, 2)
+
+
+def test_gpu_topology_from_file(tmp_path):
+    path = tmp_path / "topology.json"
+    path.write_text('{"groups": [[0, 1], [2, 3]]}')
+
+    topology = scibs.GPUTopology.from_file(str(path))
+    assert topology.distance(0, 1) == 1
+    assert topology.distance(1, 2) == 2
+
+    path = tmp_path / "topology.txt"
+    path.write_text(NVIDIA_SMI_TOPO)
+    topology = scibs.GPUTopology.from_file(str(path))
+    assert topology.distance(0, 1) < topology.distance(0, 2)
+
+    path = tmp_path / "groups.json"
+    path.write_text('{"gpus": [[0, 1]]}')
+    with pytest.raises(ValueError, match="groups"):
+        scibs.GPUTopology.from_file(str(path))
+
+
+def test_local_gpu_resources_best_fit():
+    topology = scibs.GPUTopology.from_groups([[0, 1, 2, 3], [4, 5, 6, 7]])
+    lr = scibs.LocalGPUResources(list(range(8)), topology=topology)
+
+    one_gpu = scibs.JustGPUsResource(n_gpus=1)
+    two_gpus = scibs.JustGPUsResource(n_gpus=2)
+    four_gpus = scibs.JustGPUsResource(n_gpus=4)
+
+    r1 = lr.acquire(one_gpu)
+    r2 = lr.acquire(two_gpus)
+    assert r1["gpu_ids"] == [0]
+    assert r2["gpu_ids"] == [1, 2]
+    assert lr.fragmentation() == pytest.approx(1.0 - 4 / 5)
+
+    # The 4-GPU job must get the intact NVLink island.
+    r4 = lr.acquire(four_gpus)
+    assert r4["gpu_ids"] == [4, 5, 6, 7]
+
+    lr.release(r1)
+    lr.release(r4)
+    assert lr._gpus == [0, 3, 4, 5, 6, 7]
+    assert lr.fragmentation() == pytest.approx(1.0 - 4 / 6)
+
+
+def test_local_gpu_resources_contiguous():
+    lr = scibs.LocalGPUResources(list(range(4)))
+    one_gpu = scibs.JustGPUsResource(n_gpus=1)
+    two_gpus = scibs.JustGPUsResource(n_gpus=2)
+
+    r = [lr.acquire(one_gpu) for _ in range(4)]
+    lr.release(r[0])
+    lr.release(r[2])
+    lr.release(r[3])
+
+    # Without topology, prefer adjacent GPUs.
+    assert lr.acquire(two_gpus)["gpu_ids"] == [2, 3]
+
+
+def test_local_gpu_resources_shared():
+    lr = scibs.LocalGPUResources([0, 1], gpu_memory=80 * 10**9)
+
+    quarter = scibs.SharedGPUResource(gpu_fraction=0.25)
+    half = scibs.SharedGPUResource(gpu_memory=40 * 10**9)
+    whole = scibs.JustGPUsResource(n_gpus=1)
+
+    shares = [lr.acquire(quarter) for _ in range(4)]
+    assert all(r["gpu_ids"] == [0] for r in shares)
+
+    r_half = lr.acquire(half)
+    assert r_half == {"gpu_ids": [1], "gpu_fraction": 0.5}
+
+    # GPU 1 is shared, no whole GPU is left.
+    assert lr.acquire(whole) is None
+    assert lr.acquire(quarter)["gpu_ids"] == [1]
+
+    lr.release(r_half)
+    for r in shares:
+        lr.release(r)
+
+    assert lr.acquire(whole) == {"gpu_ids": [0]}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_fair_share_schedule():
+    r = scibs.JustCoresResource(n_cores=1)
+    jobs = [scibs.Job(["a"], r, account="alice") for _ in range(6)]
+    jobs += [scibs.Job(["b"], r, account="bob") for _ in range(3)]
+
+    clock = FakeClock()
+    schedule = scibs.FairShareSchedule(
+        jobs,
+        scibs.LocalResources(cores=1),
+        shares={"alice": 2.0, "bob": 1.0},
+        clock=clock,
+    )
+
+    accounts = []
+    while not schedule.empty():
+        job_id, job, _ = schedule.next_job()
+        assert schedule.next_job() is None
+
+        accounts.append(job.account)
+        clock.now += 60.0
+        schedule.complete(job_id)
+
+    # Bob isn't starved by Alice's sweep, and Alice gets about twice the share.
+    assert accounts[:3].count("bob") == 1
+    assert accounts[:6].count("bob") == 2
+
+    stats = schedule.stats()
+    assert stats["alice"]["completed"] == 6
+    assert stats["bob"]["pending"] == 0
+    assert stats["alice"]["share"] == 2.0
+
+
+def test_fair_share_priority():
+    r = scibs.JustCoresResource(n_cores=1)
+    jobs = [
+        scibs.Job(["low"], r, priority=0),
+        scibs.Job(["high"], r, priority=10),
+    ]
+
+    schedule = scibs.FairShareSchedule(jobs, scibs.LocalResources(cores=1))
+    _, job, _ = schedule.next_job()
+    assert job.cmd == ["high"]
+
+
+def test_fair_share_aging():
+    r = scibs.JustCoresResource(n_cores=1)
+    hour = 3600.0
+    jobs = [
+        scibs.Job(["old"], r, priority=0, submit_time=0.0),
+        scibs.Job(["new"], r, priority=2, submit_time=3 * hour),
+        scibs.Job(["newer"], r, priority=2, submit_time=1 * hour),
+    ]
+
+    clock = FakeClock()
+    clock.now = 4 * hour
+    schedule = scibs.FairShareSchedule(jobs, scibs.LocalResources(cores=1), clock=clock)
+
+    # The old job has waited 3 hours longer, which outweighs the priority.
+    assert [job.cmd for job in schedule.upcoming(3)] == [["newer"], ["old"], ["new"]]
+
+    job_id, job, _ = schedule.next_job()
+    assert job.cmd == ["newer"]
+    schedule.complete(job_id)
+
+    _, job, _ = schedule.next_job()
+    assert job.cmd == ["old"]
+
+
+def test_fair_share_order():
+    r = scibs.JustCoresResource(n_cores=1)
+    jobs = [
+        scibs.Job([str(k)], r, account=f"a{k % 3}", priority=(7 * k) % 5)
+        for k in range(40)
+    ]
+
+    clock = FakeClock()
+    schedule = scibs.FairShareSchedule(jobs, scibs.LocalResources(cores=2), clock=clock)
+
+    started = []
+    while not schedule.empty():
+        factors = schedule.fair_share_factors()
+        expected = sorted(
+            (job for job in jobs if job not in started),
+            key=lambda job: -(factors[job.account] + job.priority),
+        )
+        assert schedule.upcoming(5) == expected[:5]
+
+        job_id, job, _ = schedule.next_job()
+        started.append(job)
+        clock.now += 10.0
+        schedule.complete(job_id)
+
+
+def test_local_bs_fair_share(tmp_path):
+    r = scibs.JustCoresResource(n_cores=1)
+    jobs = [
+        scibs.Job(["echo", account, ">>", str(tmp_path / "log")], r, account=account)
+        for account in ["alice"] * 4 + ["bob"] * 2
+    ]
+
+    with scibs.LocalBS(
+        local_resources=scibs.LocalResources(cores=1),
+        schedule=scibs.FairShareSchedule,
+    ) as bs:
+        for job in jobs:
+            bs.submit(job)
+
+    log = (tmp_path / "log").read_text().split()
+    assert sorted(log) == ["alice"] * 4 + ["bob"] * 2
+    assert "bob" in log[:2]
+
+
+def test_local_resources_memory():
+    lr = scibs.LocalResources(cores=4, memory=10)
+    assert lr.capacity() == {"cores": 4, "memory": 10}
+
+    r = lr.acquire(scibs.JustCoresResource(n_cores=2, total_memory=8))
+    assert r == {"cores": 2, "memory": 8}
+    assert lr.acquire(scibs.JustCoresResource(n_cores=1, total_memory=4)) is None
+    assert lr.available() == {"cores": 2, "memory": 2}
+
+    lr.release(r)
+    assert lr.available() == {"cores": 4, "memory": 10}
+
+
+def test_combined_local_resources():
+    lr = scibs.CombinedLocalResources(
+        [scibs.LocalResources(cores=2), scibs.LocalGPUResources([0])]
+    )
+    assert lr.capacity() == {"cores": 2, "gpus": 1}
+
+    r_gpu = lr.acquire(scibs.JustGPUsResource(n_gpus=1))
+    assert r_gpu == {"cores": 1, "gpu_ids": [0]}
+
+    # No GPU left, the core must not leak.
+    assert lr.acquire(scibs.JustGPUsResource(n_gpus=1)) is None
+    assert lr.available() == {"cores": 1, "gpus": 0}
+
+    r_cpu = lr.acquire(scibs.JustCoresResource())
+    lr.release(r_cpu)
+    lr.release(r_gpu)
+    assert lr.available() == {"cores": 2, "gpus": 1}
+
+
+def test_best_fit_schedule():
+    def job(n_cores, memory):
+        return scibs.Job(["foo"], scibs.JustCoresResource(n_cores, total_memory=memory))
+
+    # The two memory-heavy jobs can't run together. Best fit pairs a
+    # memory-heavy job with a light one, which fills the node exactly.
+    jobs = [job(2, 2), job(2, 6), job(2, 6), job(2, 2)]
+
+    lr = scibs.LocalResources(cores=4, memory=8)
+    schedule = scibs.BestFitSchedule(jobs, lr)
+
+    started = []
+    while (next_job := schedule.next_job()) is not None:
+        started.append(next_job[0])
+
+    assert sorted(started) in [[0, 1], [0, 2], [1, 3], [2, 3]]
+    assert lr.available() == {"cores": 0, "memory": 0}
+
+    for job_id in started:
+        schedule.complete(job_id)
+
+    assert not schedule.empty()
+
+
+def test_dominant_resource_score():
+    capacity = {"cores": 4, "memory": 8}
+    small = {"cores": 1, "memory": 1}
+    memory_heavy = {"cores": 1, "memory": 6}
+
+    assert scibs.dominant_resource_score(
+        memory_heavy, capacity, capacity
+    ) > scibs.dominant_resource_score(small, capacity, capacity)
+
+
+def test_lookahead_schedule():
+    n_generated = 0
+
+    def jobs():
+        nonlocal n_generated
+        for k in range(10):
+            n_generated += 1
+            yield scibs.Job([str(k)], scibs.JustCoresResource(n_cores=1 + k % 2))
+
+    schedule = scibs.LookaheadSchedule(
+        jobs(), scibs.LocalResources(cores=2), lookahead=3
+    )
+    assert n_generated == 0
+
+    # Within the window, the larger job goes first.
+    job_id, job, _ = schedule.next_job()
+    assert job.cmd == ["1"]
+    assert n_generated == 3
+
+    # The window is refilled after a job was started.
+    assert schedule.next_job() is None
+    assert n_generated == 4
+
+    cmds = [job.cmd]
+    while not schedule.empty():
+        schedule.complete(job_id)
+
+        job_id, job, _ = schedule.next_job()
+        cmds.append(job.cmd)
+        assert n_generated <= len(cmds) + 3
+
+    assert sorted(cmds) == sorted([str(k)] for k in range(10))
+
+
+def test_upcoming():
+    jobs = [scibs.Job([str(k)], scibs.JustCoresResource()) for k in range(5)]
+
+    for schedule in [
+        scibs.GreedySchedule(jobs, scibs.LocalResources(cores=1)),
+        scibs.LookaheadSchedule(jobs, scibs.LocalResources(cores=1), lookahead=2),
+        scibs.FairShareSchedule(jobs, scibs.LocalResources(cores=1)),
+    ]:
+        _, job, _ = schedule.next_job()
+        upcoming = schedule.upcoming(3)
+
+        assert job not in upcoming
+        assert 0 < len(upcoming) <= 3
+        assert upcoming[0] is schedule.next_job() or schedule.next_job() is None
@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: MIT
+# Copyright (c) 2022 Luc Grosheintz-Laval
+
+import json
+
+import scibs
+
+import pytest
+
+
+@pytest.fixture
+def site_profile():
+    return scibs.SiteProfile(
+        [
+            scibs.NodeType("small", n_cores=24, n_sockets=2, memory=96 * 10**9),
+            scibs.NodeType("large", n_cores=128, n_sockets=2, memory=512 * 10**9),
+            scibs.NodeType("gpu", n_cores=32, n_gpus=4, partitions=["gpu"]),
+        ]
+    )
+
+
+def test_site_profile_layout(site_profile):
+    # 20 ranks with 6 cores each: 5 large nodes, spread evenly.
+    cu = scibs.CU(n_mpi_tasks=1, n_omp_threads=6)
+    layout = site_profile.layout(scibs.CUResource(cu, n_cus=100))
+    assert layout.node_type.name == "large"
+    assert layout.n_nodes == 5
+    assert layout.n_tasks_per_node == 20
+    assert layout.ptile == 120
+
+    # Fits on either, but wastes fewer cores on a small node.
+    layout = site_profile.layout(scibs.JustCoresResource(n_cores=20))
+    assert (layout.node_type.name, layout.n_nodes, layout.ptile) == ("small", 1, 20)
+
+    # Ranks with 16 cores don't straddle the 12-core sockets of small nodes.
+    cu = scibs.CU(n_mpi_tasks=1, n_omp_threads=16)
+    layout = site_profile.layout(scibs.CUResource(cu, n_cus=2))
+    assert layout.node_type.name == "large"
+
+
+def test_site_profile_unsatisfiable(site_profile):
+    with pytest.raises(ValueError, match="No node"):
+        site_profile.layout(scibs.OMPResource(n_omp_threads=256))
+
+    with pytest.raises(ValueError, match="No node"):
+        site_profile.layout(scibs.JustGPUsResource(n_gpus=2))
+
+    layout = site_profile.layout(scibs.JustGPUsResource(n_gpus=2), partition="gpu")
+    assert layout.node_type.name == "gpu"
+
+    r = scibs.OMPResource(n_omp_threads=8, total_memory=10**12)
+    with pytest.raises(ValueError, match="memory"):
+        site_profile.layout(r)
+
+
+def test_site_profile_from_file(tmp_path):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps({"node_types": [{"name": "cpu", "n_cores": 64}]}))
+
+    profile = scibs.SiteProfile.from_file(path)
+    assert profile.node_types[0].n_cores == 64
+
+
+def test_slurm_site_profile(site_profile):
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    bb5 = scibs.SBatchBB5(
+        submission_policy=dbg_policy, site_profile=site_profile, partition="prod"
+    )
+
+    job = scibs.Job(["foo.sbatch"], scibs.MPIResource(n_mpi_tasks=200))
+    bb5.submit(job)
+    assert dbg_policy.cmd[1:5] == [
+        "--ntasks=200",
+        "--partition=prod",
+        "--nodes=2",
+        "--ntasks-per-node=100",
+    ]
+
+    with pytest.raises(ValueError):
+        bb5.submit(scibs.Job(["foo.sbatch"], scibs.JustCoresResource(n_cores=200)))
+
+
+def test_eulerlsf_site_profile():
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    lsf = scibs.EulerLSF(submission_policy=dbg_policy)
+
+    lsf.submit(scibs.Job(["foo"], scibs.MPIResource(n_mpi_tasks=200)))
+    assert dbg_policy.cmd[3:5] == ["-R", "span[ptile=100]"]
+
+    with pytest.raises(ValueError):
+        lsf.submit(scibs.Job(["foo"], scibs.OMPResource(n_omp_threads=200)))
+
+
+def test_eulerlsf_site_profile_gpus():
+    dbg_policy = scibs.DebugSubmissionPolicy()
+    lsf = scibs.EulerLSF(submission_policy=dbg_policy)
+
+    # The default profile doesn't know about GPUs.
+    lsf.submit(scibs.Job(["foo"], scibs.JustGPUsResource(1)))
+    assert "rusage[ngpus_excl_p=1]" in dbg_policy.cmd
+    assert "span[ptile=1]" in dbg_policy.cmd
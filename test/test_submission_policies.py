@@ -83,3 +83,44 @@ Submitted batch job 408469
     policy = scibs.SLURMSubmissionPolicy()
     job_id = policy.parse_stdout(output)
     assert job_id == 408469
+
+
+def test_lsf_submission_policy_parse():
+    output = "Job <1234> is submitted to queue <normal.4h>.\n"
+    pack_output = output + "Job <1235> is submitted to queue <normal.4h>.\n"
+
+    policy = scibs.LSFSubmissionPolicy()
+    assert policy.parse_stdout(output) == 1234
+    assert policy.parse_all(pack_output) == [1234, 1235]
+
+    with pytest.raises(RuntimeError):
+        policy.parse_stdout("Request aborted by esub.\n")
+
+
+def test_lsf_pack_submission_policy_partial(tmp_path):
+    bsub = tmp_path / "bsub"
+    bsub.write_text(
+        "#!/bin/sh\n"
+        "echo 'Job <1234> is submitted to queue <normal.4h>.'\n"
+        "echo 'Request aborted by esub.'\n"
+        "echo 'Job <1236> is submitted to queue <normal.4h>.'\n"
+        "exit 1\n"
+    )
+    bsub.chmod(0o755)
+
+    policy = scibs.LSFPackSubmissionPolicy()
+    with pytest.raises(scibs.PartialSubmissionError) as e:
+        policy([str(bsub), "-pack", "jobs.pack"], cwd=None, env=None)
+
+    assert e.value.job_ids == [1234]
+
+
+def test_slurm_submission_policy_parsable():
+    policy = scibs.SLURMSubmissionPolicy()
+
+    assert policy.parse_stdout("408469\n") == 408469
+    assert policy.parse_stdout("408469;daint\n") == 408469
+
+    cmd = ["sbatch", "--time", "01:00:00", "foo.sbatch"]
+    assert policy.parsable(cmd) == ["sbatch", "--parsable"] + cmd[1:]
+    assert policy.parsable(["sh", "-c", "sbatch"]) == ["sh", "-c", "sbatch"]
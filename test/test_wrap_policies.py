@@ -1,6 +1,11 @@
 # SPDX-License-Identifier: MIT
 # Copyright (c) 2021 ETH Zurich, Luc Grosheintz-Laval
 
+import os
+import signal
+import subprocess
+import time
+
 import scibs
 import datetime
 
@@ -79,3 +84,240 @@ def test_incomplete_wrap_policy():
     incomplete_wrap_policy = IncompleteWrapPolicy()
     with pytest.raises(NotImplementedError):
         incomplete_wrap_policy(job)
+
+
+def test_default_wrap_policy_argv(mpi_resources, omp_resources, default_wrap_policy):
+    job = scibs.Job(["foo", "--bar", "a b"], mpi_resources)
+    argv, env = default_wrap_policy.argv(job)
+    assert argv == ["mpirun", "-np", "10", "foo", "--bar", "a b"]
+    assert env == {}
+
+    job = scibs.Job(["foo", "--bar"], omp_resources)
+    argv, env = default_wrap_policy.argv(job)
+    assert argv == ["foo", "--bar"]
+    assert env == {"OMP_NUM_THREADS": "6"}
+
+
+def test_euler_wrap_policy_argv(mpi_omp_resources):
+    job = scibs.Job(["foo", "--bar"], mpi_omp_resources)
+    argv, env = scibs.EulerWrapPolicy().argv(job)
+
+    assert argv == ["mpirun", "-np", "3", "--map-by", "node:PE=4", "foo", "--bar"]
+    assert env == {"OMP_NUM_THREADS": "4", "LSF_AFFINITY_HOSTFILE": None}
+
+
+@pytest.mark.parametrize(
+    "flavor,launcher",
+    [
+        (
+            "openmpi",
+            ["mpirun", "-np", "6", "--map-by", "slot:PE=2", "--bind-to", "core"],
+        ),
+        ("mpich", ["mpiexec", "-n", "6", "-bind-to", "core:2"]),
+        ("intel", ["mpirun", "-n", "6"]),
+        ("srun", ["srun", "--ntasks=6", "--cpus-per-task=2", "--cpu-bind=cores"]),
+    ],
+)
+def test_hybrid_wrap_policy(flavor, launcher):
+    # Two ranks per CU, sharing the four cores of the CU.
+    cu = scibs.CU(n_mpi_tasks=2, n_omp_threads=4)
+    job = scibs.Job(["foo", "--bar"], scibs.CUResource(cu, n_cus=3))
+
+    policy = scibs.HybridWrapPolicy(flavor)
+    argv, env = policy.argv(job)
+
+    assert argv == launcher + ["foo", "--bar"]
+    assert env["OMP_NUM_THREADS"] == "2"
+    assert env["OMP_PLACES"] == "cores"
+    assert env["OMP_PROC_BIND"] == "close"
+    assert ("I_MPI_PIN_DOMAIN" in env) == (flavor == "intel")
+
+    assert policy(job).startswith("export OMP_NUM_THREADS=2;")
+    assert policy(job).endswith(" ".join(argv))
+
+
+def test_hybrid_wrap_policy_quotes_exports(tmp_path):
+    cu = scibs.CU(n_mpi_tasks=1, n_omp_threads=4)
+    job = scibs.Job(["true"], scibs.CUResource(cu, n_cus=1))
+
+    policy = scibs.HybridWrapPolicy("srun", omp_places="{0}:4 ; touch oops")
+    cmd = policy(job)
+    assert "export OMP_PLACES='{0}:4 ; touch oops';" in cmd
+
+    cmd = cmd.replace("srun ", "echo ")
+    cp = subprocess.run(cmd, shell=True, cwd=tmp_path, capture_output=True)
+    assert cp.returncode == 0
+    assert not (tmp_path / "oops").exists()
+
+
+def test_hybrid_wrap_policy_ranks_per_node(mpi_omp_resources, mpi_resources):
+    job = scibs.Job(["foo"], mpi_omp_resources)
+    argv, _ = scibs.HybridWrapPolicy("openmpi", ranks_per_node=2).argv(job)
+    assert argv[3:5] == ["--map-by", "ppr:2:node:PE=4"]
+
+    job = scibs.Job(["foo"], mpi_resources)
+    argv, env = scibs.HybridWrapPolicy("srun", ranks_per_node=5).argv(job)
+    assert argv[:5] == [
+        "srun",
+        "--ntasks=10",
+        "--cpus-per-task=1",
+        "--ntasks-per-node=5",
+        "--cpu-bind=cores",
+    ]
+    assert env["OMP_NUM_THREADS"] == "1"
+
+    with pytest.raises(ValueError):
+        scibs.HybridWrapPolicy("lam")
+
+
+@pytest.mark.parametrize("method", ["cp", "tar", "parallel"])
+def test_staging_wrap_policy(tmp_path, method):
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "input.txt").write_text("42\n")
+
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    r = scibs.OMPResource(n_omp_threads=2)
+    job = scibs.Job(
+        ["cat data/input.txt > out-$OMP_NUM_THREADS.txt; pwd > where.txt"],
+        r,
+        cwd=str(tmp_path),
+        stage_in=["data/input.txt"],
+        stage_out=["out-*.txt"],
+    )
+
+    policy = scibs.StagingWrapPolicy(scratch_dir=str(scratch), method=method)
+    cmd = policy(job)
+
+    cp = subprocess.run(cmd, shell=True, cwd=tmp_path)
+    assert cp.returncode == 0
+
+    assert (tmp_path / "out-2.txt").read_text() == "42\n"
+    assert not (tmp_path / "where.txt").exists()
+    assert list(scratch.iterdir()) == []
+
+
+def test_staging_wrap_policy_exit_code(tmp_path):
+    r = scibs.JustCoresResource()
+    policy = scibs.StagingWrapPolicy(scratch_dir=str(tmp_path))
+
+    job = scibs.Job(["exit 3"], r, stage_out=["missing"])
+    assert subprocess.run(policy(job), shell=True, cwd=tmp_path).returncode == 3
+
+    job = scibs.Job(["true"], r, stage_out=["missing"])
+    assert subprocess.run(policy(job), shell=True, cwd=tmp_path).returncode == 1
+
+    job = scibs.Job(["foo"], r)
+    assert policy(job) == "foo"
+
+
+def test_staging_wrap_policy_killed(tmp_path):
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    r = scibs.JustCoresResource()
+    job = scibs.Job(["sleep 10"], r, cwd=str(tmp_path), stage_out=["out.txt"])
+    policy = scibs.StagingWrapPolicy(scratch_dir=str(scratch))
+
+    proc = subprocess.Popen(policy(job), shell=True, start_new_session=True)
+    while not list(scratch.iterdir()):
+        time.sleep(0.01)
+
+    # Like cancelling the job, or the batch system enforcing the wall-clock.
+    os.killpg(proc.pid, signal.SIGTERM)
+    proc.wait()
+
+    # The outer shell dies right away, the cleanup happens in the subshell.
+    deadline = time.monotonic() + 10.0
+    while list(scratch.iterdir()) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert list(scratch.iterdir()) == []
+
+
+def test_staging_wrap_policy_tar_failure(tmp_path):
+    r = scibs.JustCoresResource()
+    job = scibs.Job(["touch ran"], r, stage_in=["missing"], stage_out=["ran"])
+    policy = scibs.StagingWrapPolicy(scratch_dir=str(tmp_path), method="tar")
+
+    cp = subprocess.run(policy(job), shell=True, cwd=tmp_path)
+    assert cp.returncode == 1
+    assert not (tmp_path / "ran").exists()
+
+
+@pytest.fixture
+def fake_module(tmp_path, monkeypatch):
+    # Like `module`, this is a shell function which modifies the environment.
+    script = tmp_path / "fake_module.sh"
+    script.write_text(
+        "fake_module() {\n"
+        '  echo "$*" >> "$FAKE_MODULE_LOG"\n'
+        '  export FAKE_MODULES="$*"\n'
+        '  export PATH="/opt/fake/bin:$PATH"\n'
+        "  unset SCIBS_UNSET_ME\n"
+        "}\n"
+    )
+
+    monkeypatch.setenv("FAKE_MODULE_LOG", str(tmp_path / "log"))
+    monkeypatch.setenv("SCIBS_UNSET_ME", "1")
+
+    return f". {script} && fake_module {{modules}}"
+
+
+def test_module_wrap_policy(tmp_path, fake_module):
+    r = scibs.OMPResource(n_omp_threads=2)
+    job = scibs.Job(["echo", "$FAKE_MODULES", "$OMP_NUM_THREADS"], r)
+
+    def make_policy(modules):
+        return scibs.ModuleWrapPolicy(
+            modules, cache_dir=tmp_path / "cache", load_cmd=fake_module, shell="sh"
+        )
+
+    policy = make_policy(["gcc/9.3.0", "openmpi"])
+    argv, env = policy.argv(job)
+    assert argv == job.cmd
+    assert env["FAKE_MODULES"] == "gcc/9.3.0 openmpi"
+    assert env["PATH"].startswith("/opt/fake/bin:")
+    assert env["SCIBS_UNSET_ME"] is None
+    assert env["OMP_NUM_THREADS"] == "2"
+
+    cp = subprocess.run(policy(job), shell=True, capture_output=True, text=True)
+    assert cp.stdout == "gcc/9.3.0 openmpi 2\n"
+
+    # Resolved from the cache.
+    assert make_policy(["gcc/9.3.0", "openmpi"]).env_delta() == policy.env_delta()
+    assert (tmp_path / "log").read_text() == "gcc/9.3.0 openmpi\n"
+
+    make_policy(["gcc/9.3.0"]).env_delta()
+    assert (tmp_path / "log").read_text().splitlines()[-1] == "gcc/9.3.0"
+
+
+def test_module_wrap_policy_cache_prepends(tmp_path, fake_module, monkeypatch):
+    def env_delta():
+        policy = scibs.ModuleWrapPolicy(
+            ["gcc/9.3.0"], cache_dir=tmp_path / "cache", load_cmd=fake_module
+        )
+        return policy.env_delta()
+
+    monkeypatch.setenv("PATH", "/usr/bin:/bin")
+    assert env_delta()["PATH"] == "/opt/fake/bin:/usr/bin:/bin"
+
+    # The cached `PATH` is based on the old `PATH`.
+    monkeypatch.setenv("PATH", "/usr/local/bin:/usr/bin:/bin")
+    assert env_delta()["PATH"] == "/opt/fake/bin:/usr/local/bin:/usr/bin:/bin"
+    assert len((tmp_path / "log").read_text().splitlines()) == 2
+
+
+def test_module_wrap_policy_shell_exports():
+    policy = scibs.ModuleWrapPolicy(["foo"], cache_dir=False)
+    policy._env_delta = {"BASH_FUNC_ml%%": "() { module ml $*\n}", "FOO": "a b"}
+
+    assert policy.shell_exports() == "export FOO='a b';"
+
+
+def test_module_wrap_policy_failure(tmp_path):
+    policy = scibs.ModuleWrapPolicy(["foo"], cache_dir=False, load_cmd="false")
+
+    with pytest.raises(RuntimeError, match="foo"):
+        policy.env_delta()